@@ -1,8 +1,216 @@
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
 
+sys.path.append('../')
+from track_export import find_columnar_tracks, read_track_columns
+
+SPEED_COLUMNS = ["track_id", "frame_num", "speed_kmh"]
+
+
+def load_player_speeds(segment_dir: str):
+    """
+    Per-frame player speeds of a segment: only the speed columns of the
+    player rows are read from tracks.parquet / tracks.arrow when the
+    segment has one, otherwise full_speed_distance.csv is parsed.
+    """
+    path = find_columnar_tracks(segment_dir)
+    if path is not None:
+        df = read_track_columns(path, columns=SPEED_COLUMNS, object_type="players")
+        return df.dropna(subset=["speed_kmh"]), path
+
+    path = os.path.join(segment_dir, "full_speed_distance.csv")
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Missing tracks.parquet or full_speed_distance.csv in {segment_dir}")
+
+    df = pd.read_csv(path, usecols=lambda column: column in SPEED_COLUMNS)
+    return df, path
+
+
+class SpeedBandAnalyzer:
+    """
+    Per-player intensity metrics from per-frame speeds, for any number of
+    segments.
+
+    Speeds are binned with np.digitize into integer band codes
+    (`speed_thresholds_kmh`, one more band than thresholds, lower bound
+    inclusive), and all aggregation is bincount / reduceat over rows
+    sorted by (track, frame); no per-row Python or string columns. Per
+    (segment, track) it reports:
+        - distance in every speed band and every acceleration band
+        - sprint / acceleration / deceleration counts: runs of consecutive
+          frames at or above the sprint speed / beyond the outer
+          acceleration thresholds that last at least the minimum duration
+        - peak rolling intensity: most distance covered in any
+          `rolling_window_s` window, in m/min
+
+    Acceleration is the speed change over `accel_window_s` (the speed
+    estimator holds one value per frame window, so frame-to-frame
+    differences would only see the window steps).
+
+    Segments are loaded and analyzed one at a time (tracks never span
+    segments), so memory is bounded by the largest segment, and
+    `num_workers` spreads them over processes for a season of matches.
+    """
+
+    def __init__(self, fps=24, speed_thresholds_kmh=(20.0, 25.0),
+                 speed_band_names=("low_speed", "hsr", "sprint"),
+                 accel_thresholds=(-3.0, -1.5, 1.5, 3.0),
+                 accel_band_names=("high_decel", "decel", "steady", "accel", "high_accel"),
+                 sprint_speed_kmh=None, min_sprint_s=1.0, min_accel_s=0.5,
+                 accel_window_s=0.5, rolling_window_s=60.0):
+        _check_bands(speed_thresholds_kmh, speed_band_names, "speed")
+        _check_bands(accel_thresholds, accel_band_names, "acceleration")
+
+        self.fps = fps
+        self.speed_thresholds_kmh = np.asarray(speed_thresholds_kmh, dtype=np.float64)
+        self.speed_band_names = tuple(speed_band_names)
+        self.accel_thresholds = np.asarray(accel_thresholds, dtype=np.float64)
+        self.accel_band_names = tuple(accel_band_names)
+        self.sprint_speed_kmh = speed_thresholds_kmh[-1] if sprint_speed_kmh is None else sprint_speed_kmh
+        self.min_sprint_frames = max(1, round(min_sprint_s * fps))
+        self.min_accel_frames = max(1, round(min_accel_s * fps))
+        self.accel_window_frames = max(1, round(accel_window_s * fps))
+        self.rolling_window_s = rolling_window_s
+        self.rolling_window_frames = max(1, round(rolling_window_s * fps))
+
+    def columns(self):
+        return (
+            ["track_id", "frames", "distance_m"]
+            + [f"{name}_distance_m" for name in self.speed_band_names]
+            + [f"{name}_distance_m" for name in self.accel_band_names]
+            + ["sprint_count", "acceleration_count", "deceleration_count", "peak_m_per_min"]
+        )
+
+    # -----------------------------------------------------------
+    # ENGINE
+    # -----------------------------------------------------------
+    def analyze_arrays(self, track_id, frame_num, speed_kmh):
+        """
+        Metrics for one segment from aligned per-row arrays (rows in any
+        order, NaN speeds ignored). Returns {column: array}, one entry per track.
+        """
+        track_id = np.asarray(track_id, dtype=np.int64)
+        frame_num = np.asarray(frame_num, dtype=np.int64)
+        speed = np.asarray(speed_kmh, dtype=np.float64)
+
+        keep = ~np.isnan(speed)
+        track_id, frame_num, speed = track_id[keep], frame_num[keep], speed[keep]
+        n = len(speed)
+        if n == 0:
+            return {column: np.zeros(0) for column in self.columns()}
+
+        order = np.lexsort((frame_num, track_id))
+        track_id, frame_num, speed = track_id[order], frame_num[order], speed[order]
+
+        new_track = np.ones(n, dtype=bool)
+        new_track[1:] = track_id[1:] != track_id[:-1]
+        starts = np.flatnonzero(new_track)
+        group = np.cumsum(new_track) - 1
+        num_groups = len(starts)
+
+        # row i directly follows row i-1 of the same track
+        follows = np.zeros(n, dtype=bool)
+        follows[1:] = ~new_track[1:] & (frame_num[1:] - frame_num[:-1] == 1)
+
+        # (track, frame) as one sorted key; the stride keeps frame offsets
+        # of up to max_offset inside their track
+        max_offset = max(self.accel_window_frames, self.rolling_window_frames)
+        key = group * (int(frame_num.max()) + max_offset + 1) + frame_num
+
+        distance = speed / 3.6 / self.fps
+
+        speed_band = np.digitize(speed, self.speed_thresholds_kmh)
+        speed_band_distance = _band_sums(group, speed_band, distance, num_groups, len(self.speed_band_names))
 
-def compute_speed_bands_from_full_csv(
+        accel = self.acceleration(key, speed)
+        has_accel = ~np.isnan(accel)
+        accel_band = np.digitize(accel[has_accel], self.accel_thresholds)
+        accel_band_distance = _band_sums(
+            group[has_accel], accel_band, distance[has_accel], num_groups, len(self.accel_band_names)
+        )
+
+        with np.errstate(invalid="ignore"):
+            sprinting = speed >= self.sprint_speed_kmh
+            accelerating = accel >= self.accel_thresholds[-1]
+            decelerating = accel <= self.accel_thresholds[0]
+
+        result = {
+            "track_id": track_id[starts],
+            "frames": np.diff(np.append(starts, n)),
+            "distance_m": np.bincount(group, weights=distance, minlength=num_groups),
+        }
+        for i, name in enumerate(self.speed_band_names):
+            result[f"{name}_distance_m"] = speed_band_distance[:, i]
+        for i, name in enumerate(self.accel_band_names):
+            result[f"{name}_distance_m"] = accel_band_distance[:, i]
+        result["sprint_count"] = _count_runs(sprinting, follows, group, num_groups, self.min_sprint_frames)
+        result["acceleration_count"] = _count_runs(accelerating, follows, group, num_groups, self.min_accel_frames)
+        result["deceleration_count"] = _count_runs(decelerating, follows, group, num_groups, self.min_accel_frames)
+        result["peak_m_per_min"] = self.rolling_peak(key, distance, starts) * 60 / self.rolling_window_s
+        return result
+
+    def acceleration(self, key, speed):
+        """
+        m/s^2 over accel_window_frames, NaN where the track has no speed
+        that many frames earlier. `key` is the sorted (track, frame) key.
+        """
+        w = self.accel_window_frames
+        earlier = np.searchsorted(key, key - w)
+        found = earlier < len(key)
+        found[found] = key[earlier[found]] == key[found] - w
+
+        accel = np.full(len(speed), np.nan)
+        accel[found] = (speed[found] - speed[earlier[found]]) / 3.6 / (w / self.fps)
+        return accel
+
+    def rolling_peak(self, key, distance, starts):
+        """
+        Per track, the largest distance covered within any window of
+        rolling_window_frames frames (gaps in the frames count as standing still).
+        """
+        window_start = np.searchsorted(key, key - self.rolling_window_frames + 1)
+
+        cumulative = np.concatenate(([0.0], np.cumsum(distance)))
+        window_distance = cumulative[1:] - cumulative[window_start]
+        return np.maximum.reduceat(window_distance, starts)
+
+    # -----------------------------------------------------------
+    # SEGMENTS
+    # -----------------------------------------------------------
+    def analyze_segment(self, segment_name, segment_dir):
+        df, path = load_player_speeds(segment_dir)
+        missing = set(SPEED_COLUMNS) - set(df.columns)
+        if missing:
+            raise ValueError(f"Missing columns {missing} in {path}")
+
+        result = pd.DataFrame(self.analyze_arrays(
+            df["track_id"].to_numpy(), df["frame_num"].to_numpy(), df["speed_kmh"].to_numpy()
+        ), columns=self.columns())
+        result.insert(0, "segment", segment_name)
+        return result
+
+    def analyze(self, segments, num_workers=None):
+        """
+        `segments` is a list of (name, segment_dir) pairs. Returns one
+        DataFrame with a row per (segment, track_id), in segment order.
+        """
+        segments = list(segments)
+        if num_workers is not None and num_workers > 1 and len(segments) > 1:
+            with ProcessPoolExecutor(max_workers=num_workers) as pool:
+                results = list(pool.map(self.analyze_segment, *zip(*segments)))
+        else:
+            results = [self.analyze_segment(name, segment_dir) for name, segment_dir in segments]
+
+        if not results:
+            return pd.DataFrame(columns=["segment"] + self.columns())
+        return pd.concat(results, ignore_index=True)
+
+
+def compute_speed_bands(
     segment_name: str,
     segment_dir: str,
     fps: int = 24
@@ -12,51 +220,53 @@ def compute_speed_bands_from_full_csv(
       - low speed (<20 km/h)
       - high-speed running (20–25 km/h)
       - sprinting (>=25 km/h)
+    plus the other SpeedBandAnalyzer metrics, and saves them to
+    player_speed_bands.csv in the segment directory.
 
-    Uses full_speed_distance.csv exported by SpeedAndDistance_Estimator
+    Uses the columnar tracks or full_speed_distance.csv exported by the
+    pipeline (see load_player_speeds).
     """
 
-    path = os.path.join(segment_dir, "full_speed_distance.csv")
-    if not os.path.exists(path):
-        raise FileNotFoundError(f"Missing full_speed_distance.csv in {segment_dir}")
-
-    df = pd.read_csv(path)
-
-    required = {"track_id", "frame_num", "speed_kmh"}
-    missing = required - set(df.columns)
-    if missing:
-        raise ValueError(f"Missing columns {missing} in {path}")
-
-    # Distance covered per frame (meters)
-    df["distance_m"] = df["speed_kmh"] * 1000 / 3600 / fps
-
-    # Speed bands
-    df["band"] = "low"
-    df.loc[df["speed_kmh"] >= 20, "band"] = "hsr"
-    df.loc[df["speed_kmh"] >= 25, "band"] = "sprint"
-
-    # Aggregate per player
-    bands = (
-        df.groupby(["track_id", "band"], as_index=False)
-          .agg(distance_m=("distance_m", "sum"))
-          .pivot(index="track_id", columns="band", values="distance_m")
-          .fillna(0)
-          .reset_index()
-    )
-
-    bands.rename(
-        columns={
-            "low": "low_speed_distance_m",
-            "hsr": "hsr_distance_m",
-            "sprint": "sprint_distance_m",
-        },
-        inplace=True,
-    )
-
-    bands["segment"] = segment_name
+    bands = SpeedBandAnalyzer(fps=fps).analyze_segment(segment_name, segment_dir)
+
+    # segment stays the last column, as in earlier versions of this file
+    bands = bands[[column for column in bands.columns if column != "segment"] + ["segment"]]
 
     out_path = os.path.join(segment_dir, "player_speed_bands.csv")
     bands.to_csv(out_path, index=False)
 
     print(f"📊 Speed bands saved: {out_path}")
     return out_path
+
+
+# kept for callers of the CSV-only entry point
+compute_speed_bands_from_full_csv = compute_speed_bands
+
+
+def _check_bands(thresholds, names, kind):
+    if len(names) != len(thresholds) + 1:
+        raise ValueError(f"{len(thresholds)} {kind} thresholds need {len(thresholds) + 1} band names, got {len(names)}")
+    if np.any(np.diff(thresholds) <= 0):
+        raise ValueError(f"{kind} thresholds must be strictly increasing, got {tuple(thresholds)}")
+
+
+def _band_sums(group, band, values, num_groups, num_bands):
+    """
+    (num_groups, num_bands) sums of `values` per (group, band code).
+    """
+    sums = np.bincount(group * num_bands + band, weights=values, minlength=num_groups * num_bands)
+    return sums.reshape(num_groups, num_bands)
+
+
+def _count_runs(mask, follows, group, num_groups, min_frames):
+    """
+    Per group, the number of runs of consecutive frames where `mask` holds
+    that last at least `min_frames` frames.
+    """
+    run_start = mask.copy()
+    run_start[1:] &= ~(mask[:-1] & follows[1:])
+    run_id = np.cumsum(run_start) - 1
+
+    lengths = np.bincount(run_id[mask], minlength=int(run_start.sum()))
+    long_runs = lengths >= min_frames
+    return np.bincount(group[run_start][long_runs], minlength=num_groups)
@@ -0,0 +1 @@
+from .annotation_renderer import AnnotationRenderer, render_frame, frame_annotations
\ No newline at end of file
@@ -0,0 +1,256 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+import sys
+sys.path.append('../')
+from utils import get_center_of_bbox, get_bbox_width, get_foot_position
+
+
+# -----------------------------------------------------------
+# DRAWING PRIMITIVES
+# -----------------------------------------------------------
+def draw_ellipse(frame, bbox, color, track_id=None):
+    y2 = int(bbox[3])
+    x_center, _ = get_center_of_bbox(bbox)
+    width = get_bbox_width(bbox)
+
+    cv2.ellipse(
+        frame,
+        center=(x_center, y2),
+        axes=(int(width), int(0.35 * width)),
+        angle=0.0,
+        startAngle=-45,
+        endAngle=235,
+        color=color,
+        thickness=2,
+        lineType=cv2.LINE_4
+    )
+
+    # ID rectangle
+    if track_id is not None:
+        w, h = 40, 20
+        x1 = x_center - w // 2
+        y1 = y2 + 15 - h // 2
+        x2 = x_center + w // 2
+        y2_ = y2 + 15 + h // 2
+
+        cv2.rectangle(frame, (x1, y1), (x2, y2_), color, cv2.FILLED)
+
+        cv2.putText(
+            frame,
+            f"{track_id}",
+            (x1 + 12, y1 + 15),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.6,
+            (0, 0, 0),
+            2
+        )
+    return frame
+
+
+def draw_triangle(frame, bbox, color):
+    y = int(bbox[1])
+    x, _ = get_center_of_bbox(bbox)
+
+    pts = np.array([
+        [x, y],
+        [x - 10, y - 20],
+        [x + 10, y - 20]
+    ])
+
+    cv2.drawContours(frame, [pts], 0, color, cv2.FILLED)
+    cv2.drawContours(frame, [pts], 0, (0, 0, 0), 2)
+    return frame
+
+
+def draw_translucent_box(frame, top_left, bottom_right, alpha):
+    """
+    Blends a white filled rectangle into the frame with weight `alpha`.
+    Same result as drawing it on a full-frame overlay copy and calling
+    addWeighted on the whole frame, but only touches the box region.
+    """
+    x1, y1 = max(top_left[0], 0), max(top_left[1], 0)
+    x2, y2 = min(bottom_right[0] + 1, frame.shape[1]), min(bottom_right[1] + 1, frame.shape[0])
+    if x1 >= x2 or y1 >= y2:
+        return frame
+
+    roi = frame[y1:y2, x1:x2]
+    white = np.full_like(roi, 255)
+    cv2.addWeighted(white, alpha, roi, 1 - alpha, 0, roi)
+    return frame
+
+
+# -----------------------------------------------------------
+# SINGLE-FRAME FUSED RENDER
+# -----------------------------------------------------------
+def render_frame(frame, annotations):
+    """
+    Draws every overlay for one frame in a single pass, in the same order
+    as Tracker.draw_annotations -> CameraMovementEstimator.draw_camera_movement
+    -> SpeedAndDistance_Estimator.draw_speed_and_distance. Draws in place.
+    """
+    # players
+    for track_id, bbox, color, has_ball, _, _ in annotations["players"]:
+        draw_ellipse(frame, bbox, color, track_id)
+        if has_ball:
+            draw_triangle(frame, bbox, (0, 0, 255))
+
+    # referees
+    for bbox in annotations["referees"]:
+        draw_ellipse(frame, bbox, (0, 255, 255))
+
+    # ball
+    for bbox in annotations["ball"]:
+        draw_triangle(frame, bbox, (0, 255, 0))
+
+    # team ball control HUD
+    pct1, pct2 = annotations["ball_control"]
+    draw_translucent_box(frame, (1350, 850), (1900, 970), 0.4)
+    cv2.putText(frame, f"Team 1 Ball Control: {pct1*100:.1f}%", (1400, 900),
+                cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 3)
+    cv2.putText(frame, f"Team 2 Ball Control: {pct2*100:.1f}%", (1400, 950),
+                cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 3)
+
+    # camera movement HUD
+    x_movement, y_movement = annotations["camera_movement"]
+    draw_translucent_box(frame, (0, 0), (500, 100), 0.6)
+    cv2.putText(frame, f"Camera Movement X: {x_movement:.2f}", (10, 30),
+                cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 3)
+    cv2.putText(frame, f"Camera Movement Y: {y_movement:.2f}", (10, 60),
+                cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 3)
+
+    # speed + distance labels
+    for _, bbox, _, _, speed, distance in annotations["players"]:
+        if speed is None:
+            continue
+        pos = list(get_foot_position(bbox))
+        pos[1] += 40
+        pos = tuple(map(int, pos))
+
+        cv2.putText(frame, f"{speed:.2f} km/h", pos,
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 2)
+        cv2.putText(frame, f"{distance:.2f} m", (pos[0], pos[1] + 20),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 2)
+
+    return frame
+
+
+def frame_annotations(players, referees, ball, ball_control, camera_movement, speeds=None):
+    """
+    Small, picklable description of everything drawn on one frame, from
+    that frame's track dicts, (team1, team2) ball control shares and
+    camera movement. `speeds` optionally gives (speed, distance) or None
+    per player in dict order (see SpeedWindows.frame_values) instead of
+    the dicts' "speed" / "distance".
+    """
+    if speeds is None:
+        speeds = [
+            (info["speed"], info["distance"]) if "speed" in info and "distance" in info else None
+            for info in players.values()
+        ]
+
+    player_annotations = []
+    for (track_id, info), speed in zip(players.items(), speeds):
+        player_annotations.append((
+            track_id,
+            info["bbox"],
+            info.get("team_color", (0, 0, 255)),
+            info.get("has_ball", False),
+            speed[0] if speed is not None else None,
+            speed[1] if speed is not None else None,
+        ))
+
+    return {
+        "players": player_annotations,
+        "referees": [info["bbox"] for info in referees.values()],
+        "ball": [info["bbox"] for info in ball.values()],
+        "ball_control": tuple(ball_control),
+        "camera_movement": tuple(camera_movement),
+    }
+
+
+def _render_chunk(frames, annotations):
+    return [render_frame(frame, ann) for frame, ann in zip(frames, annotations)]
+
+
+def _init_worker():
+    # one OpenCV thread per worker process; the pool provides the parallelism
+    cv2.setNumThreads(1)
+
+
+class AnnotationRenderer:
+    """
+    Fused annotation stage: ellipses, triangles, possession HUD, camera HUD
+    and speed labels are drawn in one pass per frame. `ball_control` is the
+    possession series from utils.get_ball_control_series; player speeds
+    are looked up in `speed_windows` (SpeedWindows) when given, otherwise
+    read from the track dicts.
+
+    Frames are rendered in chunks of `chunk_size` on a pool of `num_workers`
+    processes (num_workers <= 1 renders in the calling process). At most
+    `max_pending_chunks` chunks are in flight (so at most
+    chunk_size * max_pending_chunks frames are held), and output frames are
+    yielded in input order, so render() can feed a VideoWriter directly.
+    """
+
+    def __init__(self, tracks, ball_control, camera_movement_per_frame,
+                 num_workers=None, chunk_size=8, max_pending_chunks=None, speed_windows=None):
+        self.tracks = tracks
+        self.speed_windows = speed_windows
+        self.camera_movement_per_frame = camera_movement_per_frame
+        self.num_workers = os.cpu_count() if num_workers is None else num_workers
+        self.chunk_size = chunk_size
+        self.max_pending_chunks = max_pending_chunks or self.num_workers + 2
+
+        self.ball_control = ball_control[["team1_ball_control", "team2_ball_control"]].to_numpy()
+
+    def frame_annotations(self, frame_num):
+        """
+        Small, picklable description of everything drawn on one frame.
+        """
+        players = self.tracks["players"][frame_num]
+        speeds = None
+        if self.speed_windows is not None:
+            speeds = self.speed_windows.frame_values(frame_num, players.keys())
+
+        return frame_annotations(
+            players,
+            self.tracks["referees"][frame_num],
+            self.tracks["ball"][frame_num],
+            self.ball_control[frame_num].tolist(),
+            self.camera_movement_per_frame[frame_num],
+            speeds,
+        )
+
+    def _chunks(self, frames, start_frame):
+        chunk, annotations = [], []
+        for frame_num, frame in enumerate(frames, start=start_frame):
+            chunk.append(frame)
+            annotations.append(self.frame_annotations(frame_num))
+            if len(chunk) == self.chunk_size:
+                yield chunk, annotations
+                chunk, annotations = [], []
+        if chunk:
+            yield chunk, annotations
+
+    def render(self, frames, start_frame=0):
+        """
+        Yields annotated copies of `frames` (any iterable) in order.
+        """
+        if self.num_workers <= 1:
+            for frame_num, frame in enumerate(frames, start=start_frame):
+                yield render_frame(frame.copy(), self.frame_annotations(frame_num))
+            return
+
+        with ProcessPoolExecutor(max_workers=self.num_workers, initializer=_init_worker) as pool:
+            pending = deque()
+            for chunk, annotations in self._chunks(frames, start_frame):
+                if len(pending) >= self.max_pending_chunks:
+                    yield from pending.popleft().result()
+                pending.append(pool.submit(_render_chunk, chunk, annotations))
+
+            while pending:
+                yield from pending.popleft().result()
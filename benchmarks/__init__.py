@@ -0,0 +1,2 @@
+from .synthetic import SyntheticMatch
+from .suite import BenchmarkSuite, baseline_path, save_baseline, load_baseline, compare_to_baseline, format_comparison
\ No newline at end of file
@@ -0,0 +1,62 @@
+"""
+Runs the synthetic benchmark suite and compares it to a stored baseline.
+
+    python -m benchmarks.run_benchmarks                      # compare to baselines/default.json
+    python -m benchmarks.run_benchmarks --save-baseline      # (re)record the baseline
+    python -m benchmarks.run_benchmarks --only view_transform speed_and_distance
+
+Exits with status 1 if any case is slower than the baseline by more than
+--tolerance. Baselines are only comparable on the same machine and config.
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks import BenchmarkSuite, baseline_path, save_baseline, load_baseline, compare_to_baseline, format_comparison
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=750, help="frames of synthetic tracks")
+    parser.add_argument("--players", type=int, default=22, help="players per frame")
+    parser.add_argument("--video-frames", type=int, default=48, help="rendered frames for the frame stages")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="+", metavar="CASE", help="run only these cases")
+    parser.add_argument("--baseline", default=baseline_path(), help="baseline JSON to compare to / save")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="allowed slowdown ratio")
+    parser.add_argument("--output", help="also write this run's report to a JSON file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    suite = BenchmarkSuite(
+        num_frames=args.frames, num_players=args.players, video_frames=args.video_frames,
+        repeat=args.repeat, seed=args.seed
+    )
+    report = suite.run(args.only)
+
+    if args.output:
+        save_baseline(report, args.output)
+
+    if args.save_baseline:
+        print(f"\nBaseline saved to: {save_baseline(report, args.baseline)}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to record one.")
+        return 0
+
+    rows, warnings = compare_to_baseline(report, load_baseline(args.baseline), args.tolerance)
+    print()
+    for warning in warnings:
+        print(f"warning: {warning}")
+    print(format_comparison(rows))
+    return 1 if any(row["status"] == "regressed" for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,461 @@
+import copy
+import importlib.util
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.append('../')
+from utils import get_center_of_bbox, get_foot_position, get_ball_control_series, iter_video_frames, open_video_writer
+from utils import measure_distance
+from utils import FrameStore
+from view_transformer import ViewTransformer
+from speed_and_distance_estimator import SpeedAndDistance_Estimator
+from camera_movement_estimator import CameraMovementEstimator
+from team_assigner import TeamAssigner
+from player_ball_assigner import PlayerBallAssigner
+from annotation_renderer import AnnotationRenderer
+from .synthetic import SyntheticMatch
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+
+class BenchmarkSuite:
+    """
+    Times the CPU stages of the pipeline on a SyntheticMatch.
+
+    Track-only stages (view transform, speed, ball assignment, ball
+    interpolation) run on `num_frames` frames of tracks; frame stages
+    (camera movement, team assignment, renderers, video reading) on the
+    first `video_frames` rendered frames; the write cases encode them with
+    each OpenCV codec, and render_write(_threaded) compare drawing and
+    encoding in turn with encoding on the writer thread. Each case is set up outside
+    the timed region, run once to warm up, then `repeat` times; the
+    median is what baselines are compared on.
+
+    Cases whose imports are unavailable (e.g. the Tracker drawing methods
+    need ultralytics installed, though never any weights) are reported as
+    skipped instead of failing the suite; ball interpolation benchmarks
+    BallInterpolator on its own and needs neither.
+    """
+
+    def __init__(self, num_frames=750, num_players=22, video_frames=48, repeat=5, seed=0):
+        self.config = {
+            "num_frames": num_frames,
+            "num_players": num_players,
+            "video_frames": video_frames,
+            "repeat": repeat,
+            "seed": seed,
+        }
+        self.repeat = repeat
+        self.seed = seed
+        self.video_frames = min(video_frames, num_frames)
+        self.match = SyntheticMatch(num_frames=num_frames, num_players=num_players, seed=seed)
+
+        self._frames = None
+        self._transformed = None
+        self._annotated = None
+        self._video_dir = None
+
+    # -----------------------------------------------------------
+    # SHARED INPUTS (built once, untimed)
+    # -----------------------------------------------------------
+    def frames(self):
+        if self._frames is None:
+            self._frames = list(self.match.frames(num_frames=self.video_frames))
+        return self._frames
+
+    def video_path(self):
+        if self._video_dir is None:
+            self._video_dir = tempfile.TemporaryDirectory(prefix="benchmark_video_")
+            self.match.write_video(os.path.join(self._video_dir.name, "synthetic.avi"), num_frames=self.video_frames)
+        return os.path.join(self._video_dir.name, "synthetic.avi")
+
+    def positioned_tracks(self):
+        """
+        Synthetic tracks with position / position_adjusted, as before the view transform.
+        """
+        tracks = self.match.tracks()
+        for object_name, object_tracks in tracks.items():
+            for frame_num, track in enumerate(object_tracks):
+                movement = self.match.camera_movement[frame_num]
+                for track_info in track.values():
+                    bbox = track_info["bbox"]
+                    position = get_center_of_bbox(bbox) if object_name == "ball" else get_foot_position(bbox)
+                    track_info["position"] = position
+                    track_info["position_adjusted"] = (position[0] - movement[0], position[1] - movement[1])
+        return tracks
+
+    def annotated_tracks(self):
+        """
+        Tracks with every attribute the renderers draw, plus the ball control series.
+        """
+        if self._annotated is None:
+            tracks = self.positioned_tracks()
+            ViewTransformer().add_transformed_position_to_tracks(tracks)
+            SpeedAndDistance_Estimator().add_speed_and_distance_to_tracks(tracks)
+
+            ball_bboxes = [ball.get(1, {}).get("bbox") for ball in tracks["ball"]]
+            assigned = PlayerBallAssigner().assign_ball_to_player_per_frame(tracks["players"], ball_bboxes)
+
+            team_ball_control, team = [], 0
+            for players, player_id in zip(tracks["players"], assigned.tolist()):
+                for track_id, track_info in players.items():
+                    track_info["team"] = self.match.teams[track_id]
+                    track_info["team_color"] = self.match.team_colors[track_info["team"]]
+                if player_id != -1:
+                    players[player_id]["has_ball"] = True
+                    team = self.match.teams[player_id]
+                team_ball_control.append(team)
+
+            self._annotated = (tracks, get_ball_control_series(team_ball_control))
+        return self._annotated
+
+    # -----------------------------------------------------------
+    # CASES
+    # -----------------------------------------------------------
+    def cases(self):
+        """
+        name -> (setup, run, frames): run(setup()) is timed; `frames` is
+        the number of video frames one run covers.
+        """
+        num_frames = self.match.num_frames
+        video_frames = self.video_frames
+        return {
+            "read_video": (self.video_path, lambda path: sum(1 for _ in iter_video_frames(path)), video_frames),
+            "read_frame_store": (self._setup_frame_store, self._run_frame_store, video_frames),
+            "view_transform": (self.positioned_tracks, self._run_view_transform, num_frames),
+            "speed_and_distance": (self._setup_speed, self._run_speed, num_frames),
+            "speed_and_distance_loop": (self._setup_speed_loop, self._run_speed_loop, num_frames),
+            "ball_assignment": (self.match.tracks, self._run_ball_assignment, num_frames),
+            "interpolate_ball": (self._setup_interpolate, self._run_interpolate, num_frames),
+            "interpolate_ball_rts": (self._setup_interpolate_rts, self._run_interpolate, num_frames),
+            "camera_movement": (self._setup_camera_movement, self._run_camera_movement, video_frames),
+            "team_assignment": (self._setup_team_assignment, self._run_team_assignment, video_frames),
+            "render_annotations": (self._setup_renderer, self._run_renderer, video_frames),
+            "draw_annotations": (self._setup_draw_annotations, self._run_draw_annotations, video_frames),
+            "draw_camera_movement": (self._setup_camera_movement, self._run_draw_camera_movement, video_frames),
+            "draw_speed_and_distance": (lambda: None, self._run_draw_speed_and_distance, video_frames),
+            "write_video_xvid": (lambda: self._output_path(".avi"), self._writer_case("XVID"), video_frames),
+            "write_video_mjpg": (lambda: self._output_path(".avi"), self._writer_case("MJPG"), video_frames),
+            "write_video_mp4v": (lambda: self._output_path(".mp4"), self._writer_case("mp4v"), video_frames),
+            "render_write": (self._setup_render_write, self._render_write_case(False), video_frames),
+            "render_write_threaded": (self._setup_render_write, self._render_write_case(True), video_frames),
+        }
+
+    def _run_view_transform(self, tracks):
+        ViewTransformer().add_transformed_position_to_tracks(tracks)
+
+    def _setup_speed_loop(self):
+        if self._transformed is None:
+            self._transformed = self.positioned_tracks()
+            ViewTransformer().add_transformed_position_to_tracks(self._transformed)
+        return copy.deepcopy(self._transformed)
+
+    def _run_speed_loop(self, tracks):
+        speed_and_distance_loop(SpeedAndDistance_Estimator(), tracks)
+
+    def _setup_speed(self):
+        """
+        Player tracks and their transformed positions as the pipeline's
+        speed stage gets them from the view transform stage.
+        """
+        tracks = self._setup_speed_loop()
+        positions = np.array([
+            (np.nan, np.nan) if info["position_transformed"] is None else info["position_transformed"]
+            for frame_tracks in tracks["players"] for info in frame_tracks.values()
+        ], dtype=np.float32).reshape(-1, 2)
+        return tracks["players"], positions
+
+    def _run_speed(self, inputs):
+        SpeedAndDistance_Estimator().compute_speed_and_distance(*inputs)
+
+    def _run_ball_assignment(self, tracks):
+        ball_bboxes = [ball.get(1, {}).get("bbox") for ball in tracks["ball"]]
+        PlayerBallAssigner().assign_ball_to_player_per_frame(tracks["players"], ball_bboxes)
+
+    def _setup_interpolate(self, smoothing=None):
+        BallInterpolator = _load_ball_interpolator().BallInterpolator
+        return BallInterpolator(smoothing=smoothing), self.match.tracks()["ball"]
+
+    def _setup_interpolate_rts(self):
+        return self._setup_interpolate(smoothing="rts")
+
+    def _run_interpolate(self, inputs):
+        interpolator, ball_tracks = inputs
+        interpolator.interpolate_tracks(ball_tracks)
+
+    def _setup_camera_movement(self):
+        return CameraMovementEstimator(self.frames()[0])
+
+    def _run_camera_movement(self, estimator):
+        estimator.get_camera_movement(self.frames())
+
+    def _setup_team_assignment(self):
+        # KMeans seeds from the global NumPy state
+        np.random.seed(self.seed)
+        return TeamAssigner(), self.match.tracks()["players"]
+
+    def _run_team_assignment(self, inputs):
+        team_assigner, player_tracks = inputs
+        frames = self.frames()
+        team_assigner.assign_team_color(frames[0], player_tracks[0])
+        for frame, players in zip(frames, player_tracks):
+            player_ids = list(players.keys())
+            team_assigner.get_player_teams(frame, [players[i]["bbox"] for i in player_ids], player_ids)
+
+    def _setup_renderer(self):
+        tracks, ball_control = self.annotated_tracks()
+        return AnnotationRenderer(tracks, ball_control, self.match.camera_movement, num_workers=0)
+
+    def _run_renderer(self, renderer):
+        for _ in renderer.render(self.frames()):
+            pass
+
+    def _setup_draw_annotations(self):
+        return _tracker_without_model()
+
+    def _run_draw_annotations(self, tracker):
+        tracks, ball_control = self.annotated_tracks()
+        tracker.draw_annotations(self.frames(), tracks, ball_control)
+
+    def _run_draw_camera_movement(self, estimator):
+        estimator.draw_camera_movement(self.frames(), self.match.camera_movement)
+
+    def _run_draw_speed_and_distance(self, _):
+        tracks, _ = self.annotated_tracks()
+        SpeedAndDistance_Estimator().draw_speed_and_distance(self.frames(), tracks)
+
+    def _setup_frame_store(self):
+        # built once, then every run reads the memory-mapped frames
+        return FrameStore.from_video(self.video_path(), os.path.join(self._video_dir.name, "frame_store"))
+
+    def _run_frame_store(self, store):
+        for frame in store:
+            frame.max()
+
+    def _output_path(self, extension):
+        self.video_path()
+        return os.path.join(self._video_dir.name, "output" + extension)
+
+    def _writer_case(self, codec):
+        def run(path):
+            with open_video_writer(path, codec=codec, threaded=False) as writer:
+                writer.write_frames(self.frames())
+        return run
+
+    def _setup_render_write(self):
+        return self._setup_renderer(), self._output_path(".avi")
+
+    def _render_write_case(self, threaded):
+        def run(inputs):
+            renderer, path = inputs
+            with open_video_writer(path, threaded=threaded) as writer:
+                writer.write_frames(renderer.render(self.frames()))
+        return run
+
+    # -----------------------------------------------------------
+    # RUN
+    # -----------------------------------------------------------
+    def run(self, names=None, verbose=True):
+        """
+        Runs the selected cases (default: all) and returns a report dict.
+        """
+        cases = self.cases()
+        unknown = set(names or ()) - set(cases)
+        if unknown:
+            raise ValueError(f"Unknown benchmark(s) {sorted(unknown)}, expected some of {sorted(cases)}")
+
+        results = {}
+        for name in names or cases:
+            setup, run, frames = cases[name]
+            try:
+                results[name] = self.time_case(setup, run, frames)
+            except ImportError as e:
+                results[name] = {"skipped": f"{type(e).__name__}: {e}"}
+            if verbose:
+                print(format_result(name, results[name]))
+
+        return {"meta": self.meta(), "results": results}
+
+    def time_case(self, setup, run, frames):
+        run(setup())
+
+        timings = []
+        for _ in range(self.repeat):
+            inputs = setup()
+            started = time.perf_counter()
+            run(inputs)
+            timings.append(time.perf_counter() - started)
+
+        median = float(np.median(timings))
+        return {
+            "frames": frames,
+            "median_s": median,
+            "min_s": float(min(timings)),
+            "max_s": float(max(timings)),
+            "ms_per_frame": median / frames * 1000 if frames else None,
+            "fps": frames / median if median else None,
+        }
+
+    def meta(self):
+        return {
+            "config": self.config,
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+
+
+def speed_and_distance_loop(estimator, tracks):
+    """
+    The original per-window loop of SpeedAndDistance_Estimator, timed as
+    the reference for the vectorized speed stage.
+    """
+    total_distance = {}
+
+    for object_name, object_tracks in tracks.items():
+        if object_name in ["ball", "referees"]:
+            continue
+
+        num_frames = len(object_tracks)
+        for start_frame in range(0, num_frames, estimator.frame_window):
+            end_frame = min(start_frame + estimator.frame_window, num_frames - 1)
+            frame_tracks_start = object_tracks[start_frame]
+            frame_tracks_end = object_tracks[end_frame]
+
+            for track_id in frame_tracks_start.keys():
+                if track_id not in frame_tracks_end:
+                    continue
+                start_pos = frame_tracks_start[track_id].get("position_transformed", None)
+                end_pos = frame_tracks_end[track_id].get("position_transformed", None)
+                if start_pos is None or end_pos is None:
+                    continue
+
+                distance_m = measure_distance(start_pos, end_pos)
+                time_s = (end_frame - start_frame) / estimator.frame_rate
+                if time_s == 0:
+                    continue
+                speed_kmh = distance_m / time_s * 3.6
+
+                totals = total_distance.setdefault(object_name, {})
+                totals[track_id] = totals.get(track_id, 0) + distance_m
+
+                for f in range(start_frame, end_frame + 1):
+                    if track_id not in object_tracks[f]:
+                        continue
+                    object_tracks[f][track_id]["speed"] = speed_kmh
+                    object_tracks[f][track_id]["distance"] = totals[track_id]
+
+
+def _load_ball_interpolator():
+    """
+    trackers/ball_interpolator.py as a module. It only needs NumPy, but
+    importing it through the trackers package would import the Tracker
+    and with it ultralytics.
+    """
+    name = "_benchmark_ball_interpolator"
+    if name not in sys.modules:
+        path = os.path.join(os.path.dirname(BASELINE_DIR), os.pardir, "trackers", "ball_interpolator.py")
+        spec = importlib.util.spec_from_file_location(name, os.path.normpath(path))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        sys.modules[name] = module
+    return sys.modules[name]
+
+
+def _tracker_without_model():
+    """
+    Tracker for its model-free methods (interpolation, drawing) without
+    loading any weights.
+    """
+    from trackers import Tracker
+    return Tracker.__new__(Tracker)
+
+
+# -----------------------------------------------------------
+# BASELINES
+# -----------------------------------------------------------
+def baseline_path(name="default"):
+    return os.path.join(BASELINE_DIR, f"{name}.json")
+
+
+def save_baseline(report, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    return path
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_to_baseline(report, baseline, tolerance=1.25):
+    """
+    Per-case median ratio current / baseline. A case regresses when the
+    ratio exceeds `tolerance` and improves when it is below 1 / tolerance.
+    Returns (rows, warnings); warnings flag a different config or machine,
+    for which the ratios are not meaningful.
+    """
+    warnings = []
+    if report["meta"]["config"] != baseline["meta"]["config"]:
+        warnings.append(f"config differs from baseline: {baseline['meta']['config']}")
+    for key in ("platform", "processor", "cpu_count"):
+        if report["meta"].get(key) != baseline["meta"].get(key):
+            warnings.append(f"{key} differs from baseline: {baseline['meta'].get(key)!r}")
+
+    rows = []
+    for name, result in report["results"].items():
+        reference = baseline["results"].get(name)
+        if "skipped" in result or reference is None or "skipped" in reference:
+            rows.append({"name": name, "status": "n/a"})
+            continue
+
+        ratio = result["median_s"] / reference["median_s"]
+        if ratio > tolerance:
+            status = "regressed"
+        elif ratio < 1 / tolerance:
+            status = "improved"
+        else:
+            status = "ok"
+        rows.append({
+            "name": name,
+            "baseline_s": reference["median_s"],
+            "current_s": result["median_s"],
+            "ratio": ratio,
+            "status": status,
+        })
+    return rows, warnings
+
+
+def format_result(name, result):
+    if "skipped" in result:
+        return f"{name:<26} skipped ({result['skipped']})"
+    return (
+        f"{name:<26} {result['median_s'] * 1000:>9.1f} ms  {result['ms_per_frame']:>8.3f} ms/frame"
+        f"  {result['fps']:>9.1f} fps"
+    )
+
+
+def format_comparison(rows):
+    lines = [f"{'benchmark':<26}{'baseline ms':>12}{'current ms':>12}{'ratio':>8}  status"]
+    for row in rows:
+        if row["status"] == "n/a":
+            lines.append(f"{row['name']:<26}{'-':>12}{'-':>12}{'-':>8}  n/a")
+            continue
+        lines.append(
+            f"{row['name']:<26}{row['baseline_s'] * 1000:>12.1f}{row['current_s'] * 1000:>12.1f}"
+            f"{row['ratio']:>8.2f}  {row['status']}"
+        )
+    return "\n".join(lines)
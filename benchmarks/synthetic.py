@@ -0,0 +1,201 @@
+import sys
+
+import cv2
+import numpy as np
+
+sys.path.append('../')
+from utils import VideoStreamWriter
+
+TEAM_COLORS = {
+    1: (40, 40, 220),
+    2: (235, 235, 235),
+}
+REFEREE_COLOR = (20, 200, 230)
+SHORTS_COLOR = (30, 30, 30)
+
+
+class SyntheticMatch:
+    """
+    Reproducible fake match for benchmarks: no weights, video or GPU needed.
+
+    Players and referees random-walk over the pitch area of the default
+    ViewTransformer, the ball follows one player at a time (with gaps,
+    like missed detections), and the camera pans over a textured pitch so
+    optical flow has features to track. Everything is generated from
+    `seed`, so two runs with the same arguments give identical tracks
+    and frames.
+
+    tracks() returns the layout of Tracker.get_object_tracks(); frames()
+    renders the matching BGR frames and write_video() saves them to disk.
+    Track bboxes are in frame pixels; camera_movement[i] is the shift of
+    the background between frames i-1 and i (old - new, as estimated by
+    CameraMovementEstimator).
+    """
+
+    def __init__(self, num_frames=750, num_players=22, num_referees=2, width=1920, height=1080,
+                 seed=0, pan_amplitude=(300, 30), pan_period=240, ball_gap_rate=0.05, max_ball_gap=10):
+        self.num_frames = num_frames
+        self.num_players = num_players
+        self.num_referees = num_referees
+        self.width = width
+        self.height = height
+        self.seed = seed
+
+        rng = np.random.default_rng(seed)
+
+        # camera offset of each frame into the (larger) background
+        t = np.arange(num_frames)
+        self.margin = int(max(pan_amplitude)) + 1
+        phase = 2 * np.pi * t / pan_period
+        self.camera_offsets = np.stack([
+            np.round(pan_amplitude[0] * np.sin(phase)),
+            np.round(pan_amplitude[1] * np.sin(2 * phase)),
+        ], axis=1).astype(np.int64)
+        camera_movement = np.zeros((num_frames, 2), dtype=np.int64)
+        camera_movement[1:] = np.diff(self.camera_offsets, axis=0)
+        self.camera_movement = camera_movement.tolist()
+
+        # people: foot positions in background coordinates
+        self.player_ids = list(range(1, num_players + 1))
+        self.referee_ids = list(range(num_players + 1, num_players + num_referees + 1))
+        self.teams = {player_id: 1 if i < num_players // 2 else 2 for i, player_id in enumerate(self.player_ids)}
+        self.team_colors = {team: np.array(color, dtype=np.float64) for team, color in TEAM_COLORS.items()}
+
+        feet = self._random_walks(rng, num_players + num_referees)
+        self.player_boxes = self._boxes(feet[:, :num_players])
+        self.referee_boxes = self._boxes(feet[:, num_players:])
+        self.ball_boxes = self._ball_boxes(rng, feet[:, :num_players], ball_gap_rate, max_ball_gap)
+
+        self._background = self._make_background(rng)
+
+    # -----------------------------------------------------------
+    # MOTION
+    # -----------------------------------------------------------
+    def _random_walks(self, rng, num_people, max_speed=6.0):
+        """
+        (frames, people, 2) foot positions: smooth random walks that
+        bounce off the pitch bounds.
+        """
+        low = np.array([300.0, 350.0])
+        high = np.array([1500.0, 950.0])
+
+        feet = np.empty((self.num_frames, num_people, 2))
+        position = rng.uniform(low, high, size=(num_people, 2))
+        velocity = rng.normal(0, 2, size=(num_people, 2))
+        for f in range(self.num_frames):
+            velocity = np.clip(velocity + rng.normal(0, 0.4, size=velocity.shape), -max_speed, max_speed)
+            position = position + velocity
+            outside = (position < low) | (position > high)
+            velocity[outside] *= -1
+            position = np.clip(position, low, high)
+            feet[f] = position
+        return feet
+
+    def _boxes(self, feet):
+        """
+        Person bboxes (frames, people, 4) in frame pixels; people further
+        up the frame are drawn smaller.
+        """
+        box_height = 40 + 50 * feet[..., 1] / self.height
+        box_width = 0.45 * box_height
+        x = feet[..., 0] - self.camera_offsets[:, None, 0]
+        y = feet[..., 1] - self.camera_offsets[:, None, 1]
+        return np.stack([x - box_width / 2, y - box_height, x + box_width / 2, y], axis=-1)
+
+    def _ball_boxes(self, rng, player_feet, gap_rate, max_gap, carry_frames=60, size=12):
+        """
+        Ball bbox per frame (NaN = not detected): at the feet of the
+        current carrier, switching carrier every `carry_frames` frames.
+        """
+        carriers = rng.integers(0, player_feet.shape[1], size=self.num_frames // carry_frames + 1)
+        carrier = carriers[np.arange(self.num_frames) // carry_frames]
+        centers = player_feet[np.arange(self.num_frames), carrier] + np.array([8.0, -4.0])
+        centers = centers - self.camera_offsets
+
+        boxes = np.concatenate([centers - size / 2, centers + size / 2], axis=1)
+        frame_num = 0
+        while frame_num < self.num_frames:
+            if rng.random() < gap_rate:
+                gap = int(rng.integers(1, max_gap + 1))
+                boxes[frame_num:frame_num + gap] = np.nan
+                frame_num += gap
+            frame_num += 1
+        return boxes
+
+    # -----------------------------------------------------------
+    # TRACKS
+    # -----------------------------------------------------------
+    def tracks(self):
+        """
+        Fresh tracks dict ({"players", "referees", "ball"} -> list of
+        {track_id: {"bbox": [x1, y1, x2, y2]}} per frame).
+        """
+        tracks = {
+            "players": [],
+            "referees": [],
+            "ball": []
+        }
+        for f in range(self.num_frames):
+            tracks["players"].append({
+                track_id: {"bbox": bbox} for track_id, bbox in zip(self.player_ids, self.player_boxes[f].tolist())
+            })
+            tracks["referees"].append({
+                track_id: {"bbox": bbox} for track_id, bbox in zip(self.referee_ids, self.referee_boxes[f].tolist())
+            })
+            ball = self.ball_boxes[f]
+            tracks["ball"].append({} if np.isnan(ball).any() else {1: {"bbox": ball.tolist()}})
+        return tracks
+
+    # -----------------------------------------------------------
+    # FRAMES
+    # -----------------------------------------------------------
+    def _make_background(self, rng):
+        """
+        Grass texture with pitch lines, larger than the frame by the pan margin.
+        """
+        height, width = self.height + 2 * self.margin, self.width + 2 * self.margin
+        noise = rng.integers(0, 256, size=(height, width), dtype=np.uint8)
+        noise = cv2.GaussianBlur(noise, (0, 0), 2).astype(np.float32)
+        noise = (noise - noise.mean()) * 4
+
+        background = np.empty((height, width, 3), dtype=np.uint8)
+        background[..., 0] = np.clip(40 + 0.3 * noise, 0, 255)
+        background[..., 1] = np.clip(120 + 0.6 * noise, 0, 255)
+        background[..., 2] = np.clip(40 + 0.3 * noise, 0, 255)
+
+        for x in range(0, width, 200):
+            cv2.line(background, (x, 0), (x, height - 1), (230, 230, 230), 3)
+        for y in range(0, height, 180):
+            cv2.line(background, (0, y), (width - 1, y), (230, 230, 230), 3)
+        return background
+
+    def frame(self, frame_num):
+        x0, y0 = self.camera_offsets[frame_num] + self.margin
+        frame = self._background[y0:y0 + self.height, x0:x0 + self.width].copy()
+
+        for track_id, bbox in zip(self.player_ids, self.player_boxes[frame_num]):
+            self._draw_person(frame, bbox, TEAM_COLORS[self.teams[track_id]])
+        for bbox in self.referee_boxes[frame_num]:
+            self._draw_person(frame, bbox, REFEREE_COLOR)
+
+        ball = self.ball_boxes[frame_num]
+        if not np.isnan(ball).any():
+            center = (int((ball[0] + ball[2]) / 2), int((ball[1] + ball[3]) / 2))
+            cv2.circle(frame, center, int((ball[2] - ball[0]) / 2), (255, 255, 255), cv2.FILLED)
+        return frame
+
+    def _draw_person(self, frame, bbox, shirt_color):
+        x1, y1, x2, y2 = (int(v) for v in bbox)
+        y_mid = (y1 + y2) // 2
+        cv2.rectangle(frame, (x1, y1), (x2, y_mid), shirt_color, cv2.FILLED)
+        cv2.rectangle(frame, (x1, y_mid), (x2, y2), SHORTS_COLOR, cv2.FILLED)
+
+    def frames(self, start_frame=0, num_frames=None):
+        end_frame = self.num_frames if num_frames is None else min(self.num_frames, start_frame + num_frames)
+        for frame_num in range(start_frame, end_frame):
+            yield self.frame(frame_num)
+
+    def write_video(self, output_video_path, num_frames=None, fps=24, fourcc='XVID'):
+        with VideoStreamWriter(output_video_path, fps=fps, fourcc=fourcc) as writer:
+            writer.write_frames(self.frames(num_frames=num_frames))
+        return output_video_path
@@ -4,11 +4,45 @@ import numpy as np
 import os
 import sys 
 sys.path.append('../')
-from utils import measure_distance,measure_xy_distance
 
 class CameraMovementEstimator():
-    def __init__(self,frame):
+    """
+    Estimates per-frame camera movement from LK optical flow on static
+    background features. `estimator` selects how the feature displacements
+    of a frame are reduced to one camera movement:
+        - "max":    displacement of the feature that moved the most (original behaviour)
+        - "median": per-axis median displacement of successfully tracked features
+        - "ransac": translation of a RANSAC partial-affine fit, taken at the
+                    centroid of the inlier features
+
+    Flow cost can be reduced with:
+        - flow_roi="strips": only crop the feature column strips (plus a
+          margin for the LK window) instead of using the whole frame
+        - flow_scale < 1: run flow on a downscaled image; movements are
+          rescaled to full-resolution pixels
+        - redetect_interval=N: keep tracking the flowed features and
+          re-detect every N frames, instead of re-detecting after every
+          movement above minimum_distance
+    The defaults reproduce the original full-frame behaviour.
+    """
+    ESTIMATORS = ("max", "median", "ransac")
+    FLOW_ROIS = ("full", "strips")
+
+    def __init__(self,frame,estimator="max",flow_roi="full",flow_scale=1.0,redetect_interval=None,
+                 feature_columns=((0,20),(900,1050)),roi_margin=32):
+        if estimator not in self.ESTIMATORS:
+            raise ValueError(f"Unknown camera movement estimator '{estimator}', expected one of {self.ESTIMATORS}")
+        if flow_roi not in self.FLOW_ROIS:
+            raise ValueError(f"Unknown flow_roi '{flow_roi}', expected one of {self.FLOW_ROIS}")
+        if not 0 < flow_scale <= 1:
+            raise ValueError("flow_scale must be in (0, 1]")
+
         self.minimum_distance = 5
+        self.estimator = estimator
+        self.ransac_reproj_threshold = 3.0
+        self.flow_scale = flow_scale
+        self.redetect_interval = redetect_interval
+        self.minimum_features = 10
 
         self.lk_params = dict(
             winSize = (15,15),
@@ -16,10 +50,12 @@ class CameraMovementEstimator():
             criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT,10,0.03)
         )
 
+        self.reset()
+
         first_frame_grayscale = cv2.cvtColor(frame,cv2.COLOR_BGR2GRAY)
         mask_features = np.zeros_like(first_frame_grayscale)
-        mask_features[:,0:20] = 1
-        mask_features[:,900:1050] = 1
+        for x0,x1 in feature_columns:
+            mask_features[:,x0:x1] = 1
 
         self.features = dict(
             maxCorners = 100,
@@ -29,6 +65,33 @@ class CameraMovementEstimator():
             mask = mask_features
         )
 
+        # column ranges the flow runs on, each with its own (scaled) mask
+        width = mask_features.shape[1]
+        if flow_roi == "full":
+            self.flow_regions = [(0,width)]
+        else:
+            self.flow_regions = [
+                (max(0,x0-roi_margin),min(width,x1+roi_margin))
+                for x0,x1 in feature_columns if x0 < width
+            ]
+        self.region_masks = [self.scale_image(mask_features[:,x0:x1],cv2.INTER_NEAREST) for x0,x1 in self.flow_regions]
+
+    def cache_config(self):
+        return {
+            "version": 1,
+            "estimator": self.estimator,
+            "minimum_distance": self.minimum_distance,
+            "ransac_reproj_threshold": self.ransac_reproj_threshold,
+            "flow_scale": self.flow_scale,
+            "redetect_interval": self.redetect_interval,
+            "minimum_features": self.minimum_features,
+            "flow_regions": self.flow_regions,
+            "lk_params": {"winSize": self.lk_params["winSize"], "maxLevel": self.lk_params["maxLevel"],
+                          "criteria": self.lk_params["criteria"]},
+            "features": {name: value for name, value in self.features.items() if name != "mask"},
+            "feature_mask": self.features["mask"].any(axis=0).nonzero()[0],
+        }
+
     def add_adjust_positions_to_tracks(self,tracks, camera_movement_per_frame):
         for object, object_tracks in tracks.items():
             for frame_num, track in enumerate(object_tracks):
@@ -46,43 +109,189 @@ class CameraMovementEstimator():
             with open(stub_path,'rb') as f:
                 return pickle.load(f)
 
-        camera_movement = [[0,0]]*len(frames)
+        self.reset()
+        camera_movement = self.update_camera_movement(frames)
+        
+        if stub_path is not None:
+            with open(stub_path,'wb') as f:
+                pickle.dump(camera_movement,f)
+
+        return camera_movement
+
+    def reset(self):
+        self.old_gray = None
+        self.old_features = None
+        self.frames_since_detection = 0
+
+    def get_state(self):
+        """
+        Optical-flow state carried between chunks, as plain arrays so it
+        can be checkpointed.
+        """
+        return {
+            "old_gray": self.old_gray,
+            "old_features": self.old_features,
+            "frames_since_detection": self.frames_since_detection,
+        }
+
+    def set_state(self, state):
+        self.old_gray = state["old_gray"]
+        self.old_features = state["old_features"]
+        self.frames_since_detection = state["frames_since_detection"]
+
+    def scale_image(self,image,interpolation=cv2.INTER_AREA):
+        if self.flow_scale == 1:
+            return image
+        return cv2.resize(image,None,fx=self.flow_scale,fy=self.flow_scale,interpolation=interpolation)
+
+    def prepare_flow_images(self,frame):
+        """
+        Grayscale (and optionally downscaled) image for each flow region.
+        A 2-D frame is taken as already grayscale at flow_scale (e.g. the
+        companion of a utils.FrameStore) and only cropped.
+        """
+        if frame.ndim == 2:
+            return self.crop_flow_images(frame)
+        return [
+            cv2.cvtColor(self.scale_image(frame[:,x0:x1]),cv2.COLOR_BGR2GRAY)
+            for x0,x1 in self.flow_regions
+        ]
 
-        old_gray = cv2.cvtColor(frames[0],cv2.COLOR_BGR2GRAY)
-        old_features = cv2.goodFeaturesToTrack(old_gray,**self.features)
+    def crop_flow_images(self,gray):
+        if gray.shape[0] != self.region_masks[0].shape[0]:
+            raise ValueError(
+                f"Grayscale frames of height {gray.shape[0]} do not match flow_scale={self.flow_scale} "
+                f"(expected {self.region_masks[0].shape[0]})"
+            )
+        grays = []
+        for (x0,_),mask in zip(self.flow_regions,self.region_masks):
+            start = int(round(x0*self.flow_scale))
+            crop = gray[:,start:start+mask.shape[1]]
+            # rounding can leave the last region one column short
+            if crop.shape != mask.shape:
+                crop = cv2.resize(crop,(mask.shape[1],mask.shape[0]),interpolation=cv2.INTER_AREA)
+            grays.append(crop)
+        return grays
 
-        for frame_num in range(1,len(frames)):
-            frame_gray = cv2.cvtColor(frames[frame_num],cv2.COLOR_BGR2GRAY)
-            new_features, _,_ = cv2.calcOpticalFlowPyrLK(old_gray,frame_gray,old_features,None,**self.lk_params)
+    def detect_features(self,grays):
+        self.frames_since_detection = 0
+        return [
+            cv2.goodFeaturesToTrack(gray,**dict(self.features,mask=mask))
+            for gray,mask in zip(grays,self.region_masks)
+        ]
 
-            max_distance = 0
-            camera_movement_x, camera_movement_y = 0,0
+    def track_features(self,grays):
+        """
+        Runs LK per region. Returns full-resolution (N,2) old / new points,
+        the LK status mask, and the flowed features per region.
+        """
+        old_points, new_points, status, flowed = [], [], [], []
 
-            for i, (new,old) in enumerate(zip(new_features,old_features)):
-                new_features_point = new.ravel()
-                old_features_point = old.ravel()
+        for (x0,_),old_gray,gray,features in zip(self.flow_regions,self.old_gray,grays,self.old_features):
+            if features is None or len(features) == 0:
+                flowed.append(None)
+                continue
 
-                distance = measure_distance(new_features_point,old_features_point)
-                if distance>max_distance:
-                    max_distance = distance
-                    camera_movement_x,camera_movement_y = measure_xy_distance(old_features_point, new_features_point ) 
+            new_features, region_status,_ = cv2.calcOpticalFlowPyrLK(old_gray,gray,features,None,**self.lk_params)
+            region_status = region_status.ravel() == 1
+            flowed.append(new_features[region_status])
+
+            old_region = features.reshape(-1,2)
+            new_region = new_features.reshape(-1,2)
+            if self.flow_scale != 1 or x0 != 0:
+                old_region = old_region/self.flow_scale + (x0,0)
+                new_region = new_region/self.flow_scale + (x0,0)
+
+            old_points.append(old_region)
+            new_points.append(new_region)
+            status.append(region_status)
+
+        if not old_points:
+            return None, None, None, flowed
+        return np.concatenate(old_points), np.concatenate(new_points), np.concatenate(status), flowed
+
+    def update_camera_movement(self,frames):
+        """
+        Estimates camera movement for a chunk of consecutive frames.
+        Optical-flow state is carried over from the previous call, so
+        calling this on successive chunks matches a single full pass.
+        """
+        camera_movement = [[0,0]]*len(frames)
+
+        for frame_num in range(len(frames)):
+            grays = self.prepare_flow_images(frames[frame_num])
+
+            if self.old_gray is None:
+                self.old_gray = grays
+                self.old_features = self.detect_features(grays)
+                continue
+
+            old_points, new_points, status, flowed = self.track_features(grays)
+            if old_points is None:
+                # nothing to track (e.g. blank frame); try again on this frame
+                camera_movement_x, camera_movement_y, max_distance = 0,0,0
+            else:
+                camera_movement_x, camera_movement_y, max_distance = self.estimate_movement(
+                    old_points, new_points, status
+                )
             
             if max_distance > self.minimum_distance:
                 camera_movement[frame_num] = [camera_movement_x,camera_movement_y]
-                old_features = cv2.goodFeaturesToTrack(frame_gray,**self.features)
 
-            old_gray = frame_gray.copy()
-        
-        if stub_path is not None:
-            with open(stub_path,'wb') as f:
-                pickle.dump(camera_movement,f)
+            self.frames_since_detection += 1
+            if self.redetect_interval is None:
+                if max_distance > self.minimum_distance or old_points is None:
+                    self.old_features = self.detect_features(grays)
+            elif self.frames_since_detection >= self.redetect_interval \
+                    or sum(len(f) for f in flowed if f is not None) < self.minimum_features:
+                self.old_features = self.detect_features(grays)
+            else:
+                self.old_features = flowed
+
+            self.old_gray = grays
 
         return camera_movement
     
-    def draw_camera_movement(self,frames, camera_movement_per_frame):
+    def estimate_movement(self,old_points,new_points,status):
+        """
+        Reduces (N,2) arrays of feature positions in the previous / current
+        frame to one camera movement (old - new) with the configured estimator.
+        Returns (movement_x, movement_y, magnitude).
+        """
+        displacement = old_points - new_points
+
+        if self.estimator == "max":
+            # like the original loop, every feature counts regardless of LK status
+            distances = np.sqrt((displacement**2).sum(axis=1))
+            best = int(np.argmax(distances))
+            if distances[best] <= 0:
+                return 0,0,0
+            movement_x, movement_y = displacement[best].tolist()
+            return movement_x, movement_y, float(distances[best])
+
+        tracked = displacement[status]
+        if len(tracked) == 0:
+            return 0,0,0
+
+        if self.estimator == "ransac" and len(tracked) >= 3:
+            affine, inliers = cv2.estimateAffinePartial2D(
+                old_points[status], new_points[status],
+                method=cv2.RANSAC, ransacReprojThreshold=self.ransac_reproj_threshold
+            )
+            if affine is not None:
+                inliers = inliers.ravel() == 1
+                centroid = old_points[status][inliers].mean(axis=0)
+                moved_centroid = affine[:,:2] @ centroid + affine[:,2]
+                movement_x, movement_y = (centroid - moved_centroid).tolist()
+                return movement_x, movement_y, float(np.hypot(movement_x, movement_y))
+
+        movement_x, movement_y = np.median(tracked,axis=0).tolist()
+        return movement_x, movement_y, float(np.hypot(movement_x, movement_y))
+
+    def draw_camera_movement(self,frames, camera_movement_per_frame, start_frame=0):
         output_frames=[]
 
-        for frame_num, frame in enumerate(frames):
+        for frame_num, frame in enumerate(frames, start=start_frame):
             frame= frame.copy()
 
             overlay = frame.copy()
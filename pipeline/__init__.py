@@ -0,0 +1,9 @@
+from .stages import (
+    assign_teams, assign_ball_possession, run_cached_track_stage, run_speed_stage,
+    encode_teams, decode_teams, set_team_colors, run_frame_free_stages, export_columnar,
+    frame_stage_keys, load_frame_stages, save_frame_stages
+)
+from .chunked_job import ChunkedJob
+from .segment_scheduler import SegmentScheduler
+from .pipelined_executor import PipelinedExecutor, format_pipeline_report, batched
+from .online_pipeline import OnlinePipeline
\ No newline at end of file
@@ -0,0 +1,292 @@
+import io
+import json
+import os
+import pickle
+import sys
+
+import numpy as np
+
+sys.path.append('../')
+from utils import iter_video_chunks, iter_video_frames, read_first_frame, get_video_fps, concat_videos
+from utils import VideoStreamWriter, ThreadedVideoWriter
+from trackers import Tracker
+from team_assigner import TeamAssigner
+from camera_movement_estimator import CameraMovementEstimator
+from annotation_renderer import AnnotationRenderer
+from stage_cache import StageCache, encode_tracks, decode_tracks, encode_track_attributes, apply_track_attributes
+from .stages import assign_teams, set_team_colors, run_frame_free_stages, frame_stage_keys
+
+
+class ChunkedJob:
+    """
+    Resumable, chunked version of main_streaming() for long matches.
+
+    The video is processed in ranges of `chunk_size` frames. After each
+    chunk, its tracks, camera movement and team assignments are written to
+    checkpoints/<job key>/chunk_NNNNN.npz, and the ByteTrack / keyframe, optical-flow
+    and team-assigner state after it to state_NNNNN.pkl, so the next chunk
+    (or a resumed run) continues exactly where the previous one stopped. Rendering is
+    checkpointed the same way as one video segment per chunk; the segments
+    are joined at the end.
+
+    The job key hashes the video, weights, chunk size and stage configs,
+    so changing any of them starts a fresh job instead of resuming.
+    manifest.json is only updated after a chunk's files are in place,
+    which makes it the commit point: a crash mid-chunk just redoes that
+    chunk, from the state saved with the last chunk the manifest records.
+    """
+
+    def __init__(self, video_path, weights_path, output_dir="output_videos",
+                 checkpoint_root="checkpoints", chunk_size=240, cache=None, render_workers=None,
+                 keyframe_interval=None, full_csv=False):
+        self.video_path = video_path
+        self.weights_path = weights_path
+        self.output_dir = output_dir
+        self.checkpoint_root = checkpoint_root
+        self.chunk_size = chunk_size
+        self.render_workers = render_workers
+        self.full_csv = full_csv
+        self.cache = cache if cache is not None else StageCache("cache")
+
+        self.tracker = Tracker(weights_path, keyframe_interval=keyframe_interval)
+        self.team_assigner = TeamAssigner()
+
+        first_frame = read_first_frame(video_path)
+        if first_frame is None:
+            raise ValueError(f"No frames could be read from {video_path}")
+        self.camera_movement_estimator = CameraMovementEstimator(first_frame)
+
+        keys = frame_stage_keys(
+            self.cache, video_path, weights_path,
+            self.tracker, self.camera_movement_estimator, self.team_assigner
+        )
+        self.tracks_key = keys["tracks"]
+        self.camera_key = keys["camera_movement"]
+        self.job_key = self.cache.key(
+            "chunked_job",
+            teams=keys["teams"],
+            camera_movement=keys["camera_movement"],
+            chunk_size=chunk_size
+        )
+        self.job_dir = os.path.join(checkpoint_root, self.job_key)
+        self.manifest = self.load_manifest()
+
+    # -----------------------------------------------------------
+    # CHECKPOINT FILES
+    # -----------------------------------------------------------
+    def path(self, name):
+        return os.path.join(self.job_dir, name)
+
+    def chunk_path(self, chunk_index):
+        return self.path(f"chunk_{chunk_index:05d}.npz")
+
+    def segment_path(self, chunk_index):
+        return self.path(f"render_{chunk_index:05d}.avi")
+
+    def state_path(self, chunk_index):
+        return self.path(f"state_{chunk_index:05d}.pkl")
+
+    def load_manifest(self):
+        try:
+            with open(self.path("manifest.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {
+                "video_path": self.video_path,
+                "chunk_size": self.chunk_size,
+                "tracked_chunks": 0,
+                "tracking_done": False,
+                "num_frames": None,
+                "rendered_chunks": 0,
+                "complete": False,
+            }
+
+    def save_manifest(self):
+        _atomic_write(self.path("manifest.json"), json.dumps(self.manifest, indent=2).encode())
+
+    def save_state(self, chunk_index):
+        """
+        State after `chunk_index`; kept per chunk so a crash before the
+        manifest records the chunk never leaves a newer state behind.
+        """
+        state = {
+            "tracker": self.tracker.get_tracking_state(),
+            "camera_movement": self.camera_movement_estimator.get_state(),
+            "team_assigner": self.team_assigner,
+        }
+        _atomic_write(self.state_path(chunk_index), pickle.dumps(state))
+
+    def load_state(self):
+        """
+        Restores the state after the last chunk the manifest records.
+        """
+        with open(self.state_path(self.manifest["tracked_chunks"] - 1), 'rb') as f:
+            state = pickle.load(f)
+        self.tracker.set_tracking_state(state["tracker"])
+        self.camera_movement_estimator.set_state(state["camera_movement"])
+        self.team_assigner = state["team_assigner"]
+
+    # -----------------------------------------------------------
+    # PASS 1: TRACKING, CAMERA MOVEMENT, TEAMS
+    # -----------------------------------------------------------
+    def track_chunks(self):
+        start_chunk = self.manifest["tracked_chunks"]
+        if start_chunk > 0:
+            self.load_state()
+            print(f"Resuming tracking at chunk {start_chunk}")
+
+        chunks = iter_video_chunks(self.video_path, self.chunk_size, start_frame=start_chunk * self.chunk_size)
+        for chunk_index, chunk in enumerate(chunks, start=start_chunk):
+            start_frame = chunk_index * self.chunk_size
+            tracks = {
+                "players": [],
+                "referees": [],
+                "ball": []
+            }
+
+            camera_movement = self.camera_movement_estimator.update_camera_movement(chunk)
+            self.tracker.update_object_tracks(chunk, tracks, camera_movement)
+
+            if chunk_index == 0:
+                self.team_assigner.assign_team_color(chunk[0], tracks['players'][0])
+            assign_teams(self.team_assigner, chunk, tracks['players'])
+
+            arrays = encode_tracks(tracks)
+            arrays["camera_movement"] = np.array(camera_movement, dtype=np.float64).reshape(-1, 2)
+            for name, values in encode_track_attributes(tracks, ("team",), ("players",)).items():
+                arrays[f"team_{name}"] = values
+            _atomic_write(self.chunk_path(chunk_index), _npz_bytes(arrays))
+            self.save_state(chunk_index)
+
+            self.manifest["tracked_chunks"] = chunk_index + 1
+            self.save_manifest()
+            if chunk_index > 0 and os.path.exists(self.state_path(chunk_index - 1)):
+                os.remove(self.state_path(chunk_index - 1))
+            print(f"Checkpointed frames {start_frame}-{start_frame + len(chunk) - 1}")
+
+        num_chunks = self.manifest["tracked_chunks"]
+        if num_chunks == 0:
+            raise ValueError(f"No frames could be read from {self.video_path}")
+
+        self.manifest["tracking_done"] = True
+        self.save_manifest()
+
+    def load_chunks(self):
+        """
+        Concatenates the chunk checkpoints into whole-video tracks and
+        camera movement.
+        """
+        if self.manifest["tracked_chunks"] > 0:
+            self.load_state()
+
+        tracks = {
+            "players": [],
+            "referees": [],
+            "ball": []
+        }
+        camera_movement_per_frame = []
+
+        for chunk_index in range(self.manifest["tracked_chunks"]):
+            with np.load(self.chunk_path(chunk_index), allow_pickle=False) as data:
+                arrays = {name: data[name] for name in data.files}
+
+            chunk_tracks = decode_tracks(arrays)
+            team_arrays = {
+                name[len("team_"):]: values for name, values in arrays.items() if name.startswith("team_")
+            }
+            apply_track_attributes(chunk_tracks, team_arrays, ("team",), cast=int)
+
+            for object_name, object_tracks in chunk_tracks.items():
+                tracks[object_name] += object_tracks
+            camera_movement_per_frame += arrays["camera_movement"].tolist()
+
+        set_team_colors(self.team_assigner, tracks)
+        self.manifest["num_frames"] = len(camera_movement_per_frame)
+        return tracks, camera_movement_per_frame
+
+    # -----------------------------------------------------------
+    # PASS 2: DRAW + WRITE
+    # -----------------------------------------------------------
+    def render_chunks(self, renderer, fps):
+        """
+        Renders every chunk that has no segment yet. The video is decoded
+        once from the first missing chunk; a chunk's segment file is
+        moved into place (and recorded) as soon as its last frame is written.
+        """
+        num_frames = self.manifest["num_frames"]
+        start_chunk = self.manifest["rendered_chunks"]
+        start_frame = start_chunk * self.chunk_size
+        if start_frame >= num_frames:
+            return
+        if start_chunk > 0:
+            print(f"Resuming rendering at chunk {start_chunk}")
+
+        frames = iter_video_frames(self.video_path, start_frame=start_frame, num_frames=num_frames - start_frame)
+        writer, tmp_path = None, None
+        try:
+            for frame_num, frame in enumerate(renderer.render(frames, start_frame=start_frame), start=start_frame):
+                chunk_index = frame_num // self.chunk_size
+                if writer is None:
+                    tmp_path = self.path(f"render_{chunk_index:05d}.tmp.avi")
+                    writer = ThreadedVideoWriter(VideoStreamWriter(tmp_path, fps=fps))
+
+                writer.write(frame)
+
+                if (frame_num + 1) % self.chunk_size == 0 or frame_num + 1 == num_frames:
+                    writer.release()
+                    writer = None
+                    os.replace(tmp_path, self.segment_path(chunk_index))
+                    self.manifest["rendered_chunks"] = chunk_index + 1
+                    self.save_manifest()
+        finally:
+            if writer is not None:
+                writer.release()
+
+    # -----------------------------------------------------------
+    # RUN
+    # -----------------------------------------------------------
+    def run(self):
+        os.makedirs(self.job_dir, exist_ok=True)
+        os.makedirs(self.output_dir, exist_ok=True)
+        output_video_path = os.path.join(self.output_dir, "output_video.avi")
+
+        if self.manifest["complete"] and os.path.exists(output_video_path):
+            print(f"Job {self.job_key} already complete: {output_video_path}")
+            return output_video_path
+
+        if not self.manifest["tracking_done"]:
+            self.track_chunks()
+
+        tracks, camera_movement_per_frame = self.load_chunks()
+
+        ball_control, speed_windows = run_frame_free_stages(
+            self.tracker, self.camera_movement_estimator, tracks, camera_movement_per_frame,
+            self.output_dir, self.cache, self.tracks_key, self.camera_key, full_csv=self.full_csv
+        )
+
+        fps = get_video_fps(self.video_path)
+        renderer = AnnotationRenderer(
+            tracks, ball_control, camera_movement_per_frame, num_workers=self.render_workers,
+            speed_windows=speed_windows
+        )
+        self.render_chunks(renderer, fps)
+
+        num_chunks = self.manifest["rendered_chunks"]
+        concat_videos([self.segment_path(i) for i in range(num_chunks)], output_video_path, fps=fps)
+
+        self.manifest["complete"] = True
+        self.save_manifest()
+        return output_video_path
+
+
+def _npz_bytes(arrays):
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def _atomic_write(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
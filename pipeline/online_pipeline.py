@@ -0,0 +1,264 @@
+import sys
+import time
+from collections import deque
+
+import numpy as np
+
+sys.path.append('../')
+from utils import get_foot_position
+from trackers import Tracker, BallInterpolator
+from team_assigner import TeamAssigner
+from camera_movement_estimator import CameraMovementEstimator
+from view_transformer import ViewTransformer
+from speed_and_distance_estimator import SpeedAndDistance_Estimator
+from player_ball_assigner import PlayerBallAssigner
+from annotation_renderer import render_frame, frame_annotations
+from profiling import PipelineProfiler
+from .stages import assign_teams
+
+
+class OnlinePipeline:
+    """
+    Single-pass pipeline for live feeds: process_frame(frame) takes the
+    next frame and returns the finished result of an earlier one.
+
+    Every stage runs once per frame and only keeps bounded state:
+        - camera movement and tracking carry their optical-flow / ByteTrack
+          state between frames (as in the chunked pipelines)
+        - teams: team colors are fitted on the first frame with at least
+          two players, then players are assigned as they appear
+        - speed: SpeedAndDistance_Estimator.update_speed_and_distance, the
+          causal version of the windowed estimator
+        - ball: BallInterpolator in streaming mode; this is the only stage
+          that looks ahead, by `lookahead` = 3 * (ball_max_gap + 1) frames
+        - possession: carried over from the last frame with an assigned
+          player, with running team shares for the HUD
+
+    So the result for frame n is returned by the call for frame
+    n + lookahead, and flush() returns the rest at the end of the feed.
+    At most lookahead + 1 frames are held; frames must not be modified
+    after they are passed in.
+
+    For CPU real time the defaults detect at `detection_imgsz` and run the
+    camera flow on the feature strips at half resolution; keyframe_interval
+    cuts detection further (see Tracker). Every stage is timed by
+    `profiler`, and latency_summary() compares the per-frame processing
+    time with the 1 / fps budget.
+
+    With `track_writer` (a ColumnarTrackWriter), every finished frame is
+    appended to it as it is returned, so the columnar tracks of a feed
+    are written one row group at a time; the caller closes the writer.
+    """
+
+    def __init__(self, weights_path, fps=25, detection_imgsz=640, keyframe_interval=None,
+                 ball_max_gap=None, ball_smoothing=None, camera_flow_scale=0.5, camera_flow_roi="strips",
+                 draw=True, profiler=None, latency_window=1500, track_writer=None):
+        if ball_max_gap is None:
+            # in keyframe mode the ball is only detected on keyframes
+            ball_max_gap = max(5, keyframe_interval or 0)
+
+        self.fps = fps
+        self.draw = draw
+        self.track_writer = track_writer
+        self.profiler = profiler or PipelineProfiler()
+
+        self.tracker = Tracker(
+            weights_path, detection_imgsz=detection_imgsz, detection_batch_size=1,
+            keyframe_interval=keyframe_interval
+        )
+        self.team_assigner = TeamAssigner()
+        self.view_transformer = ViewTransformer()
+        self.speed_and_distance_estimator = SpeedAndDistance_Estimator(frame_rate=fps)
+        self.player_assigner = PlayerBallAssigner()
+        self.ball_interpolator = BallInterpolator(max_gap=ball_max_gap, smoothing=ball_smoothing)
+
+        # created from the first frame
+        self.camera_movement_estimator = None
+        self.camera_options = {"flow_scale": camera_flow_scale, "flow_roi": camera_flow_roi}
+
+        self.frames_in = 0
+        self.pending = deque()
+        self.team_in_control = 0
+        self.control_frames = {1: 0, 2: 0}
+        # processing time of the last `latency_window` frames
+        self.frame_seconds = deque(maxlen=latency_window)
+
+    @property
+    def lookahead(self):
+        return self.ball_interpolator.lookahead
+
+    # -----------------------------------------------------------
+    # PER FRAME
+    # -----------------------------------------------------------
+    def process_frame(self, frame):
+        """
+        Runs every causal stage on `frame` and returns the result of frame
+        frames_in - lookahead (a dict, see finish_frame), or None while the
+        lookahead is filling up.
+        """
+        arrived = time.perf_counter()
+        frame_num = self.frames_in
+        self.frames_in += 1
+        profiler = self.profiler
+
+        with profiler.stage("camera_movement", frames=1):
+            if self.camera_movement_estimator is None:
+                self.camera_movement_estimator = CameraMovementEstimator(frame, **self.camera_options)
+            camera_movement = self.camera_movement_estimator.update_camera_movement([frame])[0]
+
+        with profiler.stage("track", frames=1):
+            tracks = {
+                "players": [],
+                "referees": [],
+                "ball": []
+            }
+            self.tracker.update_object_tracks([frame], tracks, [camera_movement])
+            players, referees, ball = tracks["players"][0], tracks["referees"][0], tracks["ball"][0]
+
+        with profiler.stage("team_assignment", frames=1):
+            if not self.team_assigner.team_colors and len(players) >= 2:
+                self.team_assigner.assign_team_color(frame, players)
+            if self.team_assigner.team_colors:
+                assign_teams(self.team_assigner, [frame], [players])
+
+        with profiler.stage("positions", frames=1):
+            self.add_positions(players, referees, camera_movement)
+
+        with profiler.stage("speed", frames=1):
+            self.speed_and_distance_estimator.update_speed_and_distance(frame_num, players)
+
+        self.pending.append({
+            "frame_num": frame_num,
+            "frame": frame,
+            "players": players,
+            "referees": referees,
+            "camera_movement": camera_movement,
+            "arrived": arrived,
+        })
+
+        with profiler.stage("ball", frames=1):
+            bbox = ball.get(1, {}).get("bbox")
+            _, boxes, confidence = self.ball_interpolator.push(np.full(4, np.nan) if bbox is None else bbox)
+
+        results = self.finish_frames(boxes, confidence)
+
+        elapsed = time.perf_counter() - arrived
+        self.frame_seconds.append(elapsed)
+        profiler.record("frame", elapsed, frames=1)
+        return results[0] if results else None
+
+    def flush(self):
+        """
+        Results of the frames still inside the lookahead, at the end of the feed.
+        """
+        _, boxes, confidence = self.ball_interpolator.flush()
+        return self.finish_frames(boxes, confidence)
+
+    def add_positions(self, players, referees, camera_movement):
+        """
+        position, position_adjusted and position_transformed for one frame,
+        as Tracker / CameraMovementEstimator / ViewTransformer add them in batch.
+        """
+        infos = list(players.values()) + list(referees.values())
+        if not infos:
+            return
+
+        positions = np.array([get_foot_position(info["bbox"]) for info in infos], dtype=np.float64)
+        adjusted = positions - np.asarray(camera_movement, dtype=np.float64)
+        transformed, is_valid = self.view_transformer.transform_points(adjusted)
+
+        for info, position, position_adjusted, position_transformed, valid in zip(
+                infos, positions.tolist(), adjusted.tolist(), transformed.tolist(), is_valid):
+            info["position"] = tuple(position)
+            info["position_adjusted"] = tuple(position_adjusted)
+            info["position_transformed"] = position_transformed if valid else None
+
+    # -----------------------------------------------------------
+    # FINISHED FRAMES
+    # -----------------------------------------------------------
+    def finish_frames(self, boxes, confidence):
+        return [
+            self.finish_frame(self.pending.popleft(), box, conf)
+            for box, conf in zip(boxes.tolist(), confidence.tolist())
+        ]
+
+    def finish_frame(self, pending, ball_bbox, ball_confidence):
+        """
+        Possession and drawing for a frame whose ball position is final.
+        Returns {frame_num, frame (annotated copy, None with draw=False),
+        players, referees, ball, camera_movement, team_in_control,
+        ball_control (team 1, team 2 shares), latency_s (arrival to result)}.
+        """
+        profiler = self.profiler
+        players = pending["players"]
+
+        with profiler.stage("possession", frames=1):
+            ball = {}
+            if ball_confidence > 0:
+                ball = {1: {"bbox": ball_bbox, "confidence": ball_confidence}}
+                assigned_player = self.player_assigner.assign_ball_to_player(players, ball_bbox)
+                if assigned_player != -1:
+                    players[assigned_player]["has_ball"] = True
+                    self.team_in_control = players[assigned_player].get("team", 0)
+
+            if self.team_in_control in self.control_frames:
+                self.control_frames[self.team_in_control] += 1
+            total = self.control_frames[1] + self.control_frames[2]
+            ball_control = (self.control_frames[1] / total, self.control_frames[2] / total) if total else (0.0, 0.0)
+
+        if self.track_writer is not None:
+            with profiler.stage("export_columnar", frames=1):
+                self.track_writer.write_frames(
+                    {"players": [players], "referees": [pending["referees"]], "ball": [ball]}, 0, 1,
+                    [pending["camera_movement"]], [self.team_in_control], frame_offset=pending["frame_num"]
+                )
+
+        annotated = None
+        if self.draw:
+            with profiler.stage("draw", frames=1):
+                annotated = render_frame(pending["frame"].copy(), frame_annotations(
+                    players, pending["referees"], ball, ball_control, pending["camera_movement"]
+                ))
+
+        return {
+            "frame_num": pending["frame_num"],
+            "frame": annotated,
+            "players": players,
+            "referees": pending["referees"],
+            "ball": ball,
+            "camera_movement": pending["camera_movement"],
+            "team_in_control": self.team_in_control,
+            "ball_control": ball_control,
+            "latency_s": time.perf_counter() - pending["arrived"],
+        }
+
+    # -----------------------------------------------------------
+    # REAL-TIME CHECK
+    # -----------------------------------------------------------
+    def latency_summary(self):
+        """
+        Per-frame processing time of the last latency_window frames against
+        the 1 / fps frame budget. The output delay is this plus lookahead / fps.
+        The keys are the same before any frame was processed, with NaN times.
+        """
+        budget_ms = 1000 / self.fps
+        frame_ms = np.array(self.frame_seconds) * 1000
+        if len(frame_ms) == 0:
+            return {
+                "frames": 0,
+                "budget_ms": budget_ms,
+                "mean_ms": float("nan"),
+                "p50_ms": float("nan"),
+                "p99_ms": float("nan"),
+                "over_budget": 0,
+                "output_delay_s": self.lookahead / self.fps,
+            }
+        return {
+            "frames": len(frame_ms),
+            "budget_ms": budget_ms,
+            "mean_ms": float(frame_ms.mean()),
+            "p50_ms": float(np.percentile(frame_ms, 50)),
+            "p99_ms": float(np.percentile(frame_ms, 99)),
+            "over_budget": int((frame_ms > budget_ms).sum()),
+            "output_delay_s": self.lookahead / self.fps,
+        }
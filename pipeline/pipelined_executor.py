@@ -0,0 +1,212 @@
+import queue
+import threading
+import time
+
+_END = object()
+
+
+class PipelinedExecutor:
+    """
+    Runs a linear chain of stages, one thread per stage, connected by
+    bounded queues.
+
+    The first stage is a source: `fn()` returns an iterable of items.
+    Every later stage is `fn(items)`: it consumes an iterable fed from the
+    previous queue and returns an iterable for the next one, or None if it
+    is a sink. Generators fit naturally, e.g. a batching stage can read
+    20 frames before yielding one batch.
+
+    A full queue blocks its producer (backpressure), so memory stays
+    bounded by the queue sizes and wall time approaches the slowest stage
+    instead of the sum of all stages. Item order is preserved.
+
+    If any stage raises, the other stages are stopped and the exception is
+    re-raised from run().
+    """
+
+    def __init__(self, queue_size=8, sample_interval=0.05, report_interval=None):
+        self.queue_size = queue_size
+        self.sample_interval = sample_interval
+        self.report_interval = report_interval
+        self.stages = []
+
+    def add_stage(self, name, fn, queue_size=None):
+        """
+        `queue_size` bounds the queue feeding this stage (default: queue_size).
+        """
+        self.stages.append((name, fn, queue_size or self.queue_size))
+        return self
+
+    def run(self):
+        """
+        Runs the pipeline to completion and returns a report dict:
+            wall_time_s
+            stages: {name: {items_in, items_out, busy_s, input_wait_s, output_wait_s}}
+            queues: {"a->b": {maxsize, mean_depth, max_depth}}
+        A stage with a large output_wait_s is blocked by a slower consumer;
+        one with a large input_wait_s is starved by a slower producer.
+        """
+        if not self.stages:
+            raise ValueError("PipelinedExecutor has no stages")
+
+        self._stop = threading.Event()
+        self._errors = []
+        self._queues = [queue.Queue(maxsize=size) for _, _, size in self.stages[1:]]
+        # set once the consumer of a queue has returned, so its producer stops
+        self._closed = [threading.Event() for _ in self._queues]
+        self._stats = [
+            {"items_in": 0, "items_out": 0, "busy_s": 0.0, "input_wait_s": 0.0, "output_wait_s": 0.0}
+            for _ in self.stages
+        ]
+        self._depth_samples = [[] for _ in self._queues]
+
+        threads = [
+            threading.Thread(target=self._run_stage, args=(i,), name=f"pipeline-{name}", daemon=True)
+            for i, (name, _, _) in enumerate(self.stages)
+        ]
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+
+        last_report = start
+        while any(thread.is_alive() for thread in threads):
+            threads[-1].join(self.sample_interval)
+            for samples, q in zip(self._depth_samples, self._queues):
+                samples.append(q.qsize())
+
+            now = time.perf_counter()
+            if self.report_interval is not None and now - last_report >= self.report_interval:
+                print(self.format_queue_depths())
+                last_report = now
+
+        for thread in threads:
+            thread.join()
+        wall_time = time.perf_counter() - start
+
+        if self._errors:
+            raise self._errors[0]
+
+        return self._report(wall_time)
+
+    # -----------------------------------------------------------
+    # STAGE THREADS
+    # -----------------------------------------------------------
+    def _run_stage(self, index):
+        name, fn, _ = self.stages[index]
+        stats = self._stats[index]
+        started = time.perf_counter()
+
+        try:
+            if index == 0:
+                outputs = fn()
+            else:
+                outputs = fn(self._iter_queue(self._queues[index - 1], stats))
+
+            if outputs is not None:
+                has_output = index < len(self._queues)
+                for item in outputs:
+                    stats["items_out"] += 1
+                    if has_output and not self._put(index, item, stats):
+                        break
+        except BaseException as e:
+            self._errors.append(e)
+            self._stop.set()
+        finally:
+            if index > 0:
+                self._closed[index - 1].set()
+            if index < len(self._queues):
+                self._put(index, _END, stats, force=True)
+            stats["busy_s"] = time.perf_counter() - started - stats["input_wait_s"] - stats["output_wait_s"]
+
+    def _iter_queue(self, q, stats):
+        while True:
+            waited = time.perf_counter()
+            item = q.get()
+            stats["input_wait_s"] += time.perf_counter() - waited
+            if item is _END or self._stop.is_set():
+                return
+            stats["items_in"] += 1
+            yield item
+
+    def _put(self, index, item, stats, force=False):
+        """
+        Blocking put into queue `index` that gives up once the pipeline is
+        stopping or the consumer has returned, so a producer never hangs on
+        a consumer that is gone. The end marker is always delivered
+        (`force`) so a consumer that is still reading can finish.
+        """
+        q = self._queues[index]
+        waited = time.perf_counter()
+        try:
+            while True:
+                try:
+                    q.put(item, timeout=self.sample_interval)
+                    return True
+                except queue.Full:
+                    if self._stop.is_set() or self._closed[index].is_set():
+                        if not force:
+                            return False
+                        # make room: the consumer is stopping and drops items anyway
+                        try:
+                            q.get_nowait()
+                        except queue.Empty:
+                            pass
+        finally:
+            stats["output_wait_s"] += time.perf_counter() - waited
+
+    # -----------------------------------------------------------
+    # REPORTING
+    # -----------------------------------------------------------
+    def queue_names(self):
+        names = [name for name, _, _ in self.stages]
+        return [f"{a}->{b}" for a, b in zip(names, names[1:])]
+
+    def format_queue_depths(self):
+        return "queue depth: " + ", ".join(
+            f"{name} {q.qsize()}/{q.maxsize}" for name, q in zip(self.queue_names(), self._queues)
+        )
+
+    def _report(self, wall_time):
+        return {
+            "wall_time_s": wall_time,
+            "stages": {
+                name: dict(stats) for (name, _, _), stats in zip(self.stages, self._stats)
+            },
+            "queues": {
+                name: {
+                    "maxsize": q.maxsize,
+                    "mean_depth": sum(samples) / len(samples) if samples else 0.0,
+                    "max_depth": max(samples, default=0),
+                }
+                for name, q, samples in zip(self.queue_names(), self._queues, self._depth_samples)
+            },
+        }
+
+
+def format_pipeline_report(report):
+    lines = [f"pipeline wall time: {report['wall_time_s']:.2f}s"]
+    for name, stats in report["stages"].items():
+        lines.append(
+            f"  {name:<10} in={stats['items_in']:<6} out={stats['items_out']:<6} busy={stats['busy_s']:.2f}s "
+            f"starved={stats['input_wait_s']:.2f}s blocked={stats['output_wait_s']:.2f}s"
+        )
+    for name, stats in report["queues"].items():
+        lines.append(
+            f"  {name:<20} depth mean={stats['mean_depth']:.1f} max={stats['max_depth']}/{stats['maxsize']}"
+        )
+    return "\n".join(lines)
+
+
+def batched(items, batch_size):
+    """
+    Groups an iterable into lists of at most `batch_size` items.
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
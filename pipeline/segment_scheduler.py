@@ -0,0 +1,222 @@
+import contextlib
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+sys.path.append('../')
+from utils import get_video_fps
+from analytics.speed_band_analyzer import compute_speed_bands
+from track_export import find_columnar_tracks, read_track_columns
+from .chunked_job import ChunkedJob
+
+# environment variables read by the BLAS / OpenMP runtimes under PyTorch,
+# NumPy and OpenCV when they are first loaded in a process
+THREAD_LIMIT_VARIABLES = (
+    "OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS", "VECLIB_MAXIMUM_THREADS",
+)
+
+SEGMENT_CSVS = (
+    "full_speed_distance.csv",
+    "player_summary_stats.csv",
+    "team_ball_control.csv",
+    "player_speed_bands.csv",
+)
+FULL_CSV = "full_speed_distance.csv"
+FULL_CSV_COLUMNS = ["object_type", "track_id", "frame_num", "speed_kmh", "total_distance_m"]
+
+
+class SegmentScheduler:
+    """
+    Runs the full pipeline (a resumable ChunkedJob) on many independent
+    segments / clips across a process pool, then merges the per-segment
+    CSVs into match-level outputs.
+
+    Each worker gets `threads_per_worker` threads for OpenCV, PyTorch and
+    the BLAS runtimes, so `num_workers * threads_per_worker` matches the
+    machine instead of every worker oversubscribing all cores. Segments
+    are submitted largest file first, so one long clip does not start
+    last and leave the rest of the pool idle.
+
+    Speed bands use each segment's own frame rate (read from the video);
+    `fps` overrides it for all segments.
+
+    Output layout:
+        <output_root>/<segment name>/   per-segment video + CSVs
+        <output_root>/match/            merged CSVs with a `segment` column
+    """
+
+    def __init__(self, weights_path, output_root="output_videos", num_workers=None,
+                 threads_per_worker=1, chunk_size=240, fps=None):
+        self.weights_path = weights_path
+        self.output_root = output_root
+        self.threads_per_worker = threads_per_worker
+        self.num_workers = num_workers or max(1, (os.cpu_count() or 1) // threads_per_worker)
+        self.chunk_size = chunk_size
+        self.fps = fps
+
+    def segment_dir(self, segment_name):
+        return os.path.join(self.output_root, segment_name)
+
+    def run(self, segments):
+        """
+        `segments` is a list of (name, video_path) pairs; names must be
+        unique. Returns {name: segment output dir} for the segments that
+        finished and raises after merging if any segment failed.
+        """
+        names = [name for name, _ in segments]
+        if len(set(names)) != len(names):
+            raise ValueError("Segment names must be unique")
+
+        # largest first keeps the pool busy until the end of the round
+        segments = sorted(segments, key=lambda segment: os.path.getsize(segment[1]), reverse=True)
+
+        finished, failed = {}, {}
+        with _thread_limit_env(self.threads_per_worker), ProcessPoolExecutor(
+            max_workers=min(self.num_workers, len(segments)) or 1,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.threads_per_worker,)
+        ) as pool:
+            futures = {
+                pool.submit(
+                    _run_segment, name, video_path, self.weights_path,
+                    self.segment_dir(name), self.chunk_size, self.fps
+                ): name
+                for name, video_path in segments
+            }
+
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    finished[name] = future.result()
+                    print(f"Segment {name} done ({len(finished)}/{len(segments)})")
+                except Exception as e:
+                    failed[name] = e
+                    print(f"Segment {name} failed: {e!r}")
+
+        # merge in the order the segments were given, not completion order
+        self.merge_segment_csvs([name for name in names if name in finished])
+
+        if failed:
+            raise RuntimeError(f"{len(failed)} segment(s) failed: {sorted(failed)}")
+        return finished
+
+    # -----------------------------------------------------------
+    # MATCH-LEVEL OUTPUTS
+    # -----------------------------------------------------------
+    def merge_segment_csvs(self, segment_names, match_dir=None):
+        """
+        Concatenates each per-segment CSV into <output_root>/match/ with a
+        leading `segment` column, and writes match_ball_control.csv with the
+        possession totals of every segment and of the whole match. The
+        per-frame speed rows are read from a segment's tracks.parquet /
+        tracks.arrow when it has one (the full CSV is opt-in).
+        """
+        match_dir = match_dir or os.path.join(self.output_root, "match")
+        os.makedirs(match_dir, exist_ok=True)
+
+        for file_name in SEGMENT_CSVS:
+            frames = []
+            for name in segment_names:
+                df = _read_segment_table(self.segment_dir(name), file_name)
+                if df is None:
+                    continue
+                df = df.drop(columns="segment", errors="ignore")
+                df.insert(0, "segment", name)
+                frames.append(df)
+
+            if frames:
+                path = os.path.join(match_dir, file_name)
+                pd.concat(frames, ignore_index=True).to_csv(path, index=False)
+                print(f"Match CSV exported: {path}")
+
+        control_rows = []
+        for name in segment_names:
+            path = os.path.join(self.segment_dir(name), "team_ball_control.csv")
+            if not os.path.exists(path):
+                continue
+            last = pd.read_csv(path).iloc[-1]
+            control_rows.append({
+                "segment": name,
+                "team1_frames": int(last["team1_frames"]),
+                "team2_frames": int(last["team2_frames"]),
+            })
+
+        if control_rows:
+            control = pd.DataFrame(control_rows)
+            total = control[["team1_frames", "team2_frames"]].sum()
+            control.loc[len(control)] = {"segment": "match", **total.to_dict()}
+
+            counted = control["team1_frames"] + control["team2_frames"]
+            control["team1_ball_control"] = (control["team1_frames"] / counted).fillna(0)
+            control["team2_ball_control"] = (control["team2_frames"] / counted).fillna(0)
+
+            path = os.path.join(match_dir, "match_ball_control.csv")
+            control.to_csv(path, index=False)
+            print(f"Match ball control exported: {path}")
+
+        return match_dir
+
+
+def _run_segment(name, video_path, weights_path, output_dir, chunk_size, fps=None):
+    if fps is None:
+        fps = get_video_fps(video_path)
+
+    job = ChunkedJob(
+        video_path, weights_path, output_dir=output_dir,
+        chunk_size=chunk_size, render_workers=1
+    )
+    job.run()
+    if find_columnar_tracks(output_dir) or os.path.exists(os.path.join(output_dir, FULL_CSV)):
+        compute_speed_bands(name, output_dir, fps=fps)
+    return output_dir
+
+
+def _read_segment_table(segment_dir, file_name):
+    """
+    One per-segment CSV as a DataFrame, or None if the segment has none.
+    """
+    if file_name == FULL_CSV:
+        path = find_columnar_tracks(segment_dir)
+        if path is not None:
+            df = read_track_columns(path, columns=FULL_CSV_COLUMNS, object_type="players")
+            df = df.dropna(subset=["speed_kmh"]).reset_index(drop=True)
+            df["object_type"] = df["object_type"].astype(str)
+            return df
+
+    path = os.path.join(segment_dir, file_name)
+    if not os.path.exists(path):
+        return None
+    return pd.read_csv(path)
+
+
+def _init_worker(num_threads):
+    import cv2
+    cv2.setNumThreads(num_threads)
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(num_threads)
+
+
+@contextlib.contextmanager
+def _thread_limit_env(num_threads):
+    """
+    Sets the thread-limit variables while workers are spawned so they are
+    in place before a worker loads PyTorch / NumPy; restores them after.
+    """
+    previous = {name: os.environ.get(name) for name in THREAD_LIMIT_VARIABLES}
+    os.environ.update({name: str(num_threads) for name in THREAD_LIMIT_VARIABLES})
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
@@ -0,0 +1,262 @@
+import os
+import sys
+import numpy as np
+
+sys.path.append('../')
+from utils import get_ball_control_series, export_ball_control_csv
+from player_ball_assigner import PlayerBallAssigner
+from view_transformer import ViewTransformer
+from speed_and_distance_estimator import SpeedAndDistance_Estimator, SpeedWindows
+from stage_cache import encode_tracks, decode_tracks, encode_track_attributes, apply_track_attributes
+from stage_cache.track_codecs import OBJECT_NAMES
+from track_export import export_tracks_columnar
+from profiling import PipelineProfiler
+
+
+# -----------------------------------------------------------
+# STAGE HELPERS
+# -----------------------------------------------------------
+def assign_teams(team_assigner, frames, player_tracks):
+    """
+    Assigns team + team color to every player; player_tracks[i] belongs to frames[i].
+    """
+    for frame, player_track in zip(frames, player_tracks):
+        player_ids = list(player_track.keys())
+        teams = team_assigner.get_player_teams(
+            frame,
+            [player_track[player_id]["bbox"] for player_id in player_ids],
+            player_ids
+        )
+        for player_id, team in zip(player_ids, teams.tolist()):
+            track = player_track[player_id]
+            track["team"] = team
+            if team in team_assigner.team_colors:
+                track["team_color"] = team_assigner.team_colors[team]
+
+
+def run_cached_track_stage(cache, stage, key, tracks, compute, names,
+                           object_names=("players", "referees", "ball"), width=None, cast=None):
+    """
+    Runs a stage that adds `names` to the track entries in place, or
+    restores those attributes from the cache. Returns the attribute rows
+    (see encode_track_attributes), cached or new.
+    """
+    arrays = cache.load(stage, key)
+    if arrays is not None:
+        apply_track_attributes(tracks, arrays, names, cast=cast)
+        return arrays
+
+    compute()
+    arrays = encode_track_attributes(tracks, names, object_names, width=width)
+    cache.save(stage, key, arrays)
+    return arrays
+
+
+def run_speed_stage(cache, view_key, tracks, view_arrays, speed_and_distance_estimator):
+    """
+    Player speed and distance as SpeedWindows, cached. The transformed
+    positions are taken from the view transform stage's rows instead of
+    being read back from the track dicts, and nothing is written into
+    them; exports and the renderer look the values up.
+    """
+    speed_key = cache.key(
+        "speed_and_distance",
+        view_transform=view_key,
+        config=speed_and_distance_estimator.cache_config()
+    )
+
+    players = view_arrays["object_class"] == OBJECT_NAMES.index("players")
+    positions = view_arrays["position_transformed"][players]
+    if len(positions) != sum(map(len, tracks["players"])):
+        positions = None
+
+    return cache.run(
+        "speed_and_distance", speed_key,
+        lambda: speed_and_distance_estimator.compute_speed_and_distance(tracks["players"], positions),
+        SpeedWindows.to_arrays, SpeedWindows.from_arrays
+    )
+
+
+def encode_teams(team_assigner, tracks):
+    arrays = encode_track_attributes(tracks, ("team",), ("players",))
+    team_ids = sorted(team_assigner.team_colors)
+    arrays["team_ids"] = np.array(team_ids, dtype=np.int64)
+    arrays["team_colors"] = np.array(
+        [team_assigner.team_colors[team] for team in team_ids], dtype=np.float64
+    ).reshape(-1, 3)
+    return arrays
+
+
+def decode_teams(team_assigner, tracks, arrays):
+    apply_track_attributes(tracks, arrays, ("team",), cast=int)
+    team_assigner.team_colors = dict(zip(arrays["team_ids"].tolist(), arrays["team_colors"]))
+    set_team_colors(team_assigner, tracks)
+
+
+def set_team_colors(team_assigner, tracks):
+    for player_track in tracks["players"]:
+        for track in player_track.values():
+            if track.get("team") in team_assigner.team_colors:
+                track["team_color"] = team_assigner.team_colors[track["team"]]
+
+
+def assign_ball_possession(tracks):
+    player_assigner = PlayerBallAssigner()
+    team_ball_control = []
+
+    ball_bboxes = [ball.get(1, {}).get("bbox") for ball in tracks["ball"]]
+    assigned_players = player_assigner.assign_ball_to_player_per_frame(
+        tracks["players"], ball_bboxes
+    )
+
+    for player_track, assigned_player in zip(tracks["players"], assigned_players.tolist()):
+        if assigned_player != -1:
+            player_track[assigned_player]["has_ball"] = True
+            team_ball_control.append(player_track[assigned_player]["team"])
+        else:
+            team_ball_control.append(team_ball_control[-1] if team_ball_control else 0)
+
+    return np.array(team_ball_control)
+
+
+# -----------------------------------------------------------
+# FRAME STAGES (TRACKING, CAMERA MOVEMENT, TEAMS)
+# -----------------------------------------------------------
+def frame_stage_keys(cache, video_path, weights_path, tracker, camera_movement_estimator, team_assigner):
+    """
+    Stage cache keys of the three stages that need decoded frames.
+    """
+    video_digest = cache.file_digest(video_path)
+    tracks_key = cache.key(
+        "tracks",
+        video=video_digest,
+        weights=cache.file_digest(weights_path),
+        config=tracker.cache_config()
+    )
+    camera_key = cache.key(
+        "camera_movement",
+        video=video_digest,
+        config=camera_movement_estimator.cache_config()
+    )
+    teams_key = cache.key(
+        "teams",
+        video=video_digest,
+        tracks=tracks_key,
+        config=team_assigner.cache_config()
+    )
+    return {"tracks": tracks_key, "camera_movement": camera_key, "teams": teams_key}
+
+
+def load_frame_stages(cache, keys, team_assigner):
+    """
+    (tracks, camera_movement_per_frame) if all frame stages are cached,
+    otherwise None. Restores the team colors on `team_assigner`.
+    """
+    cached = {stage: cache.load(stage, key) for stage, key in keys.items()}
+    if any(arrays is None for arrays in cached.values()):
+        return None
+
+    tracks = decode_tracks(cached["tracks"])
+    camera_movement_per_frame = cached["camera_movement"]["camera_movement"].tolist()
+    decode_teams(team_assigner, tracks, cached["teams"])
+    return tracks, camera_movement_per_frame
+
+
+def save_frame_stages(cache, keys, tracks, camera_movement_per_frame, team_assigner):
+    cache.save("tracks", keys["tracks"], encode_tracks(tracks))
+    cache.save("camera_movement", keys["camera_movement"], {
+        "camera_movement": np.array(camera_movement_per_frame, dtype=np.float64).reshape(-1, 2)
+    })
+    cache.save("teams", keys["teams"], encode_teams(team_assigner, tracks))
+
+
+# -----------------------------------------------------------
+# FRAME-FREE STAGES
+# -----------------------------------------------------------
+def run_frame_free_stages(tracker, camera_movement_estimator, tracks, camera_movement_per_frame,
+                          output_dir, cache, tracks_key, camera_key, columnar_format="parquet", full_csv=False,
+                          profiler=None):
+    """
+    Everything after tracking / camera movement / teams that only needs the
+    track dicts: positions, view transform, ball interpolation, speed and
+    distance, CSV exports and ball possession. Returns the ball control
+    series and the players' SpeedWindows (for AnnotationRenderer).
+
+    With `columnar_format` ("parquet" or "arrow", None to skip) the full
+    tracks are also exported to <output_dir>/tracks.<format> (see export_columnar).
+    The per-frame full_speed_distance.csv is only written with `full_csv`,
+    or when there is no columnar file for the analytics to read instead.
+    Each step is timed as a stage of `profiler` (a PipelineProfiler) when given.
+    """
+    profiler = profiler or PipelineProfiler()
+    num_frames = len(tracks["players"])
+
+    view_transformer = ViewTransformer()
+    view_key = cache.key(
+        "view_transform",
+        tracks=tracks_key,
+        camera_movement=camera_key,
+        config=view_transformer.cache_config()
+    )
+    with profiler.stage("transform", frames=num_frames):
+        tracker.add_position_to_tracks(tracks)
+        camera_movement_estimator.add_adjust_positions_to_tracks(
+            tracks, camera_movement_per_frame
+        )
+        view_arrays = run_cached_track_stage(
+            cache, "view_transform", view_key, tracks,
+            lambda: view_transformer.add_transformed_position_to_tracks(tracks),
+            ("position_transformed",), width=2
+        )
+
+    with profiler.stage("interpolate", frames=num_frames):
+        tracks["ball"] = tracker.interpolate_ball_positions(tracks["ball"])
+
+    speed_and_distance_estimator = SpeedAndDistance_Estimator()
+    with profiler.stage("speed", frames=num_frames):
+        speed_windows = run_speed_stage(cache, view_key, tracks, view_arrays, speed_and_distance_estimator)
+
+    with profiler.stage("export"):
+        speed_and_distance_estimator.export_summary_csv(
+            tracks, output_folder=output_dir, speed_windows=speed_windows
+        )
+
+    # whole-video batch assignment: one sample, reported per frame as fps
+    with profiler.stage("possession", frames=num_frames):
+        team_ball_control = assign_ball_possession(tracks)
+    with profiler.stage("export"):
+        ball_control = get_ball_control_series(team_ball_control)
+        export_ball_control_csv(ball_control, output_folder=output_dir)
+
+    columnar_path = None
+    if columnar_format is not None:
+        with profiler.stage("export_columnar", frames=num_frames):
+            columnar_path = export_columnar(tracks, camera_movement_per_frame, team_ball_control, output_dir,
+                                            columnar_format, speed_windows=speed_windows)
+
+    if full_csv or columnar_path is None:
+        with profiler.stage("export"):
+            speed_and_distance_estimator.export_full_csv(
+                tracks, output_folder=output_dir, speed_windows=speed_windows
+            )
+    print("CSV files saved inside:", output_dir)
+
+    return ball_control, speed_windows
+
+
+def export_columnar(tracks, camera_movement_per_frame, team_ball_control, output_dir, format="parquet",
+                    speed_windows=None):
+    """
+    Writes <output_dir>/tracks.parquet (or .arrow) with positions, speed,
+    team, possession and camera movement per track and frame. Skipped with
+    a notice when pyarrow is not installed.
+    """
+    extension = ".arrow" if format == "arrow" else ".parquet"
+    try:
+        return export_tracks_columnar(
+            tracks, os.path.join(output_dir, "tracks" + extension),
+            camera_movement_per_frame, team_ball_control, format=format, speed_windows=speed_windows
+        )
+    except ImportError as e:
+        print(f"Columnar export skipped: {e}")
+        return None
@@ -1,27 +1,105 @@
-import sys 
+import numpy as np
+import sys
 sys.path.append('../')
-from utils import get_center_of_bbox, measure_distance
+from utils import get_center_of_bbox
 
 class PlayerBallAssigner():
     def __init__(self):
         self.max_player_ball_distance = 70
-    
+
     def assign_ball_to_player(self,players,ball_bbox):
-        ball_position = get_center_of_bbox(ball_bbox)
+        player_ids = list(players.keys())
+        if not player_ids:
+            return -1
+
+        player_bboxes = np.array([players[player_id]['bbox'] for player_id in player_ids],dtype=np.float64)
+        ball_position = np.array(get_center_of_bbox(ball_bbox),dtype=np.float64)
+
+        distances = self.foot_distances(player_bboxes,ball_position[None,:])
+        closest = int(np.argmin(distances))
+        if distances[closest] < self.max_player_ball_distance:
+            return player_ids[closest]
+        return -1
+
+    def foot_distances(self,player_bboxes,ball_positions):
+        """
+        Distance from each ball position to the nearer foot (bottom-left /
+        bottom-right bbox corner) of the matching player; (N,4) and (N,2) -> (N,).
+        """
+        foot_y = player_bboxes[:,3]
+        distance_left = np.hypot(player_bboxes[:,0]-ball_positions[:,0],foot_y-ball_positions[:,1])
+        distance_right = np.hypot(player_bboxes[:,2]-ball_positions[:,0],foot_y-ball_positions[:,1])
+        return np.minimum(distance_left,distance_right)
+
+    def assign_balls_to_players(self,players,ball_bboxes):
+        """
+        Several ball candidates in one frame: returns the assigned player id
+        for each candidate (-1 if none within max_player_ball_distance).
+        """
+        player_ids = list(players.keys())
+        if not player_ids or len(ball_bboxes) == 0:
+            return np.full(len(ball_bboxes),-1,dtype=np.int64)
+
+        player_bboxes = np.array([players[player_id]['bbox'] for player_id in player_ids],dtype=np.float64)
+        ball_positions = self.ball_centers(ball_bboxes)
+
+        # (balls, players) distance matrix in one broadcast
+        foot_y = player_bboxes[None,:,3]
+        distance_left = np.hypot(player_bboxes[None,:,0]-ball_positions[:,None,0],foot_y-ball_positions[:,None,1])
+        distance_right = np.hypot(player_bboxes[None,:,2]-ball_positions[:,None,0],foot_y-ball_positions[:,None,1])
+        distances = np.minimum(distance_left,distance_right)
+
+        closest = distances.argmin(axis=1)
+        in_reach = distances[np.arange(len(ball_positions)),closest] < self.max_player_ball_distance
+        return np.where(in_reach,np.array(player_ids,dtype=np.int64)[closest],-1)
+
+    def assign_ball_to_player_per_frame(self,player_tracks,ball_bboxes):
+        """
+        Whole-video batch mode: player_tracks[f] is the {track_id: {"bbox": ...}}
+        dict of frame f and ball_bboxes[f] its ball bbox (None/empty if missing).
+        Returns an int array with the assigned player id per frame (-1 = none).
+        Ties go to the player listed first in the frame, as in the per-frame call.
+        """
+        num_frames = len(player_tracks)
+        assigned = np.full(num_frames,-1,dtype=np.int64)
+
+        frames, player_ids, player_bboxes = [], [], []
+        for frame_num, players in enumerate(player_tracks):
+            frames.extend([frame_num]*len(players))
+            player_ids.extend(players.keys())
+            player_bboxes.extend(player['bbox'] for player in players.values())
+
+        if not frames:
+            return assigned
 
-        miniumum_distance = 99999
-        assigned_player=-1
+        frames = np.array(frames)
+        player_ids = np.array(player_ids,dtype=np.int64)
+        player_bboxes = np.array(player_bboxes,dtype=np.float64)
+        ball_positions = self.ball_centers(ball_bboxes)
 
-        for player_id, player in players.items():
-            player_bbox = player['bbox']
+        distances = self.foot_distances(player_bboxes,ball_positions[frames])
+        in_reach = distances < self.max_player_ball_distance
+        frames, player_ids, distances = frames[in_reach], player_ids[in_reach], distances[in_reach]
 
-            distance_left = measure_distance((player_bbox[0],player_bbox[-1]),ball_position)
-            distance_right = measure_distance((player_bbox[2],player_bbox[-1]),ball_position)
-            distance = min(distance_left,distance_right)
+        # closest candidate per frame: stable sort by (frame, distance), take the first row of each frame
+        order = np.lexsort((distances,frames))
+        frames, player_ids = frames[order], player_ids[order]
+        first = np.ones(len(frames),dtype=bool)
+        first[1:] = frames[1:] != frames[:-1]
+        assigned[frames[first]] = player_ids[first]
 
-            if distance < self.max_player_ball_distance:
-                if distance < miniumum_distance:
-                    miniumum_distance = distance
-                    assigned_player = player_id
+        return assigned
 
-        return assigned_player
\ No newline at end of file
+    def ball_centers(self,ball_bboxes):
+        """
+        get_center_of_bbox for many bboxes at once; missing bboxes give NaN.
+        """
+        ball_bboxes = [
+            bbox if bbox is not None and len(bbox) == 4 else (np.nan,)*4
+            for bbox in ball_bboxes
+        ]
+        ball_bboxes = np.array(ball_bboxes,dtype=np.float64).reshape(-1,4)
+        return np.stack([
+            np.trunc((ball_bboxes[:,0]+ball_bboxes[:,2])/2),
+            np.trunc((ball_bboxes[:,1]+ball_bboxes[:,3])/2)
+        ],axis=1)
@@ -0,0 +1 @@
+from .pipeline_profiler import PipelineProfiler, peak_rss_mb, quiet_ultralytics_logging
\ No newline at end of file
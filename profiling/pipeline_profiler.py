@@ -0,0 +1,224 @@
+import cProfile
+import json
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+# per-frame latency histogram bins: 0.1 ms .. 100 s, 4 bins per decade
+LATENCY_BIN_EDGES_MS = np.logspace(-1, 5, 25)
+
+
+class PipelineProfiler:
+    """
+    Per-stage instrumentation for a pipeline run.
+
+    For every named stage it records calls, frames, wall time, CPU time
+    (process-wide, so threads count), frames/sec, peak RSS seen at the end
+    of the stage, and per-frame latencies summarized as percentiles plus a
+    log-spaced histogram. `report()` / `save_json()` write it all out as
+    one JSON document per run for comparing releases.
+
+    Stages are timed with
+        with profiler.stage("detect", frames=len(batch)): ...
+    or, for per-frame latencies of a generator,
+        for frame in profiler.iterate("draw", renderer.render(frames)): ...
+
+    `cprofile_stages` (stage names or "all") additionally runs those
+    stages under cProfile and dumps <profile_dir>/<stage>.prof for
+    snakeviz / pstats. For py-spy, run the unchanged pipeline under
+    `py-spy record -o profile.svg -- python main.py`; the stage names of
+    this report match the functions and pipeline threads it shows.
+    """
+
+    def __init__(self, cprofile_stages=(), profile_dir="profiles"):
+        self.cprofile_stages = cprofile_stages
+        self.profile_dir = profile_dir
+        self.stages = {}
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._profiles = {}
+
+    @classmethod
+    def from_env(cls):
+        """
+        Builds a profiler from PIPELINE_CPROFILE ("all" or comma-separated
+        stage names) and PIPELINE_PROFILE_DIR.
+        """
+        stages = os.environ.get("PIPELINE_CPROFILE", "")
+        if stages != "all":
+            stages = tuple(name for name in stages.split(",") if name)
+        return cls(cprofile_stages=stages, profile_dir=os.environ.get("PIPELINE_PROFILE_DIR", "profiles"))
+
+    # -----------------------------------------------------------
+    # RECORDING
+    # -----------------------------------------------------------
+    def _stats(self, name):
+        if name not in self.stages:
+            self.stages[name] = {
+                "calls": 0, "frames": 0, "wall_s": 0.0, "cpu_s": 0.0,
+                "peak_rss_mb": 0.0, "latencies_ms": [], "latency_weights": [],
+            }
+        return self.stages[name]
+
+    def record(self, name, wall_s, cpu_s=0.0, frames=0, calls=1):
+        """
+        Adds one measurement; with frames > 0 the per-frame latency
+        wall_s / frames is counted once per frame.
+        """
+        with self._lock:
+            stats = self._stats(name)
+            stats["calls"] += calls
+            stats["frames"] += frames
+            stats["wall_s"] += wall_s
+            stats["cpu_s"] += cpu_s
+            stats["peak_rss_mb"] = max(stats["peak_rss_mb"], peak_rss_mb())
+            if frames:
+                stats["latencies_ms"].append(wall_s / frames * 1000)
+                stats["latency_weights"].append(frames)
+
+    @contextmanager
+    def stage(self, name, frames=0):
+        profile = self._start_cprofile(name)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield self
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            if profile is not None:
+                profile.disable()
+            self.record(name, wall, cpu, frames=frames)
+
+    def iterate(self, name, items):
+        """
+        Yields from `items`, timing how long each item takes to produce
+        (one latency sample per item, consumer time excluded).
+        """
+        iterator = iter(items)
+        while True:
+            profile = self._start_cprofile(name)
+            wall, cpu = time.perf_counter(), time.process_time()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                if profile is not None:
+                    profile.disable()
+                return
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            if profile is not None:
+                profile.disable()
+            self.record(name, wall, cpu, frames=1, calls=0)
+            yield item
+
+    def _start_cprofile(self, name):
+        if self.cprofile_stages != "all" and name not in self.cprofile_stages:
+            return None
+        # cProfile only follows the thread that enabled it
+        profile = self._profiles.setdefault(name, cProfile.Profile())
+        profile.enable()
+        return profile
+
+    # -----------------------------------------------------------
+    # REPORT
+    # -----------------------------------------------------------
+    def report(self):
+        wall_total = time.perf_counter() - self.started
+        stages = {}
+        for name, stats in self.stages.items():
+            entry = {
+                "calls": stats["calls"],
+                "frames": stats["frames"],
+                "wall_s": stats["wall_s"],
+                "cpu_s": stats["cpu_s"],
+                "fps": stats["frames"] / stats["wall_s"] if stats["frames"] and stats["wall_s"] else None,
+                "share_of_run": stats["wall_s"] / wall_total if wall_total else None,
+                "peak_rss_mb": stats["peak_rss_mb"],
+            }
+            if stats["latencies_ms"]:
+                entry["latency_ms"] = _latency_summary(stats["latencies_ms"], stats["latency_weights"])
+            stages[name] = entry
+
+        return {
+            "run": {
+                "started_at": self.started_at,
+                "wall_s": wall_total,
+                "cpu_s": time.process_time(),
+                "peak_rss_mb": peak_rss_mb(),
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+            },
+            "stages": stages,
+        }
+
+    def save_json(self, path):
+        report = self.report()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+
+        if self._profiles:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            for name, profile in self._profiles.items():
+                profile.dump_stats(os.path.join(self.profile_dir, f"{name}.prof"))
+        return report
+
+    def format_table(self):
+        lines = [f"{'stage':<18}{'frames':>8}{'wall s':>10}{'cpu s':>10}{'fps':>10}{'p50 ms':>10}{'p99 ms':>10}"]
+        for name, entry in self.report()["stages"].items():
+            latency = entry.get("latency_ms", {})
+            lines.append(
+                f"{name:<18}{entry['frames']:>8}{entry['wall_s']:>10.2f}{entry['cpu_s']:>10.2f}"
+                f"{entry['fps'] or 0:>10.1f}{latency.get('p50', 0):>10.2f}{latency.get('p99', 0):>10.2f}"
+            )
+        return "\n".join(lines)
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process so far (ru_maxrss is KiB on
+    Linux and bytes on macOS).
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def quiet_ultralytics_logging():
+    """
+    Keeps Ultralytics' per-batch prediction logs out of the run output.
+    """
+    import logging
+    logging.getLogger("ultralytics").setLevel(logging.WARNING)
+
+
+def _latency_summary(latencies_ms, weights):
+    latencies_ms = np.asarray(latencies_ms)
+    weights = np.asarray(weights, dtype=np.float64)
+
+    order = np.argsort(latencies_ms)
+    sorted_latencies = latencies_ms[order]
+    cumulative = np.cumsum(weights[order]) / weights.sum()
+
+    def percentile(q):
+        return float(sorted_latencies[min(np.searchsorted(cumulative, q), len(sorted_latencies) - 1)])
+
+    # out-of-range latencies land in the first / last bin
+    clipped = np.clip(latencies_ms, LATENCY_BIN_EDGES_MS[0], LATENCY_BIN_EDGES_MS[-1])
+    counts, _ = np.histogram(clipped, bins=LATENCY_BIN_EDGES_MS, weights=weights)
+    return {
+        "mean": float(np.average(latencies_ms, weights=weights)),
+        "p50": percentile(0.5),
+        "p90": percentile(0.9),
+        "p99": percentile(0.99),
+        "max": float(sorted_latencies[-1]),
+        "histogram": {
+            "bin_edges_ms": [round(edge, 4) for edge in LATENCY_BIN_EDGES_MS.tolist()],
+            "counts": [int(count) for count in counts],
+        },
+    }
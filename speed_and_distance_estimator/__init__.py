@@ -1 +1,2 @@
-from .speed_and_distance_estimator import SpeedAndDistance_Estimator
\ No newline at end of file
+from .speed_and_distance_estimator import SpeedAndDistance_Estimator
+from .speed_windows import SpeedWindows
\ No newline at end of file
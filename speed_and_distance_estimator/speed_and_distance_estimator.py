@@ -1,15 +1,23 @@
 import cv2
+import operator
 import os
+from itertools import chain, compress, repeat
+
+import numpy as np
 import pandas as pd
 
 from utils import measure_distance, get_foot_position
+from .speed_windows import SpeedWindows
 
 
 class SpeedAndDistance_Estimator:
     """
     Computes per-player cumulative distance and speed using perspective-transformed coordinates.
     Provides:
+        - compute_speed_and_distance(): SpeedWindows for one object type (pipeline)
         - add_speed_and_distance_to_tracks(): updates the tracking dict
+        - speed_windows(): NumPy engine behind both
+        - update_speed_and_distance(): causal, one frame at a time (live feeds)
         - draw_speed_and_distance(): draws overlays on video frames
         - export_full_csv(): saves per-frame speed + distance
         - export_summary_csv(): saves one row per player (final distance, avg/max speed)
@@ -18,78 +26,176 @@ class SpeedAndDistance_Estimator:
     def __init__(self, frame_rate=24, frame_window=5):
         self.frame_rate = frame_rate       # video FPS
         self.frame_window = frame_window   # window for speed calculation
+        self.reset()
+
+    def cache_config(self):
+        return {"version": 2, "frame_rate": self.frame_rate, "frame_window": self.frame_window}
 
     # ---------------------------------------------------------------------
     # 1. COMPUTE SPEED + CUMULATIVE DISTANCE
     # ---------------------------------------------------------------------
+    def compute_speed_and_distance(self, object_tracks, positions=None):
+        """
+        Windowed speed and cumulative distance for one object type's
+        tracks (e.g. tracks["players"]) as SpeedWindows, without writing
+        into the track dicts. Only the window boundary frames are read.
+
+        `positions` optionally gives the transformed positions of every
+        entry as an (N, 2) array in frame then dict order (NaN = None), as
+        the view transform stage produces them; they are then not read
+        back from the dicts.
+        """
+        num_frames = len(object_tracks)
+        boundary_frames = list(range(0, num_frames, self.frame_window))
+        if num_frames and (num_frames - 1) % self.frame_window != 0:
+            boundary_frames.append(num_frames - 1)
+
+        frame_tracks = [object_tracks[f] for f in boundary_frames]
+        lengths = np.fromiter(map(len, frame_tracks), dtype=np.int64, count=len(frame_tracks))
+        count = int(lengths.sum())
+
+        frames = np.repeat(np.array(boundary_frames, dtype=np.int64), lengths)
+        track_ids = np.fromiter(chain.from_iterable(frame_tracks), dtype=np.int64, count=count)
+
+        if positions is not None:
+            # rows of the boundary frames in the row-aligned array
+            all_lengths = np.fromiter(map(len, object_tracks), dtype=np.int64, count=num_frames)
+            first_row = np.cumsum(all_lengths) - all_lengths
+            starts = first_row[boundary_frames] - (np.cumsum(lengths) - lengths)
+            rows = np.repeat(starts, lengths) + np.arange(count)
+            positions = np.asarray(positions).reshape(-1, 2)[rows]
+        else:
+            points = list(map(dict.get, chain.from_iterable(map(dict.values, frame_tracks)),
+                              repeat("position_transformed")))
+            has_point = np.fromiter(map(operator.is_not, points, repeat(None)), dtype=bool, count=count)
+            positions = np.full((count, 2), np.nan)
+            positions[has_point] = np.fromiter(
+                chain.from_iterable(compress(points, has_point.tolist())),
+                dtype=np.float64, count=2 * int(has_point.sum())
+            ).reshape(-1, 2)
+
+        return self.speed_windows(frames, track_ids, positions, num_frames)
+
     def add_speed_and_distance_to_tracks(self, tracks):
         """
         Adds speed (km/h) and cumulative distance (meters) into each track entry.
         """
-
-        total_distance = {}   # {object: {track_id: cumulative_dist}}
-
         for object_name, object_tracks in tracks.items():
             if object_name in ["ball", "referees"]:
                 continue
+            self.compute_speed_and_distance(object_tracks).apply(object_tracks)
 
-            num_frames = len(object_tracks)
-
-            for start_frame in range(0, num_frames, self.frame_window):
-                end_frame = min(start_frame + self.frame_window, num_frames - 1)
-
-                frame_tracks_start = object_tracks[start_frame]
-                frame_tracks_end = object_tracks[end_frame]
-
-                for track_id in frame_tracks_start.keys():
-
-                    # skip players not present in the end-frame
-                    if track_id not in frame_tracks_end:
-                        continue
-
-                    start_pos = frame_tracks_start[track_id].get("position_transformed", None)
-                    end_pos = frame_tracks_end[track_id].get("position_transformed", None)
-
-                    if start_pos is None or end_pos is None:
-                        continue
-
-                    # --- distance + speed ---
-                    distance_m = measure_distance(start_pos, end_pos)
-                    time_s = (end_frame - start_frame) / self.frame_rate
-                    if time_s == 0:
-                        continue
+    def speed_windows(self, frames, track_ids, positions, num_frames):
+        """
+        Vectorized windowed speed / cumulative distance for one object type.
+
+        Takes rows of (frame, integer track_id) with their transformed
+        position (NaN = not transformable); only rows on window boundary
+        frames are used. Same results as the original per-window loop, up
+        to float rounding (`**` there can be 1 ulp off from NumPy's sqrt):
+            - windows are [k*W, min(k*W + W, num_frames - 1)], sharing end frames
+            - a track needs a position at both window ends to get a value
+            - on a shared frame the later window wins (see SpeedWindows)
+        """
+        window = self.frame_window
+        frames = np.asarray(frames, dtype=np.int64)
+        track_ids = np.asarray(track_ids, dtype=np.int64)
+        positions = np.asarray(positions).reshape(-1, 2)
+
+        last_frame = num_frames - 1
+        usable = ((frames % window == 0) | (frames == last_frame)) \
+            & ~np.isnan(positions[:, 0]) & ~np.isnan(positions[:, 1])
+        if not usable.all():
+            frames, track_ids, positions = frames[usable], track_ids[usable], positions[usable]
+        if num_frames < 2 or len(frames) == 0:
+            return SpeedWindows(window, num_frames, [], [], [], [])
+
+        # rows of one track in frame order; ids that fit in 16 bits take
+        # NumPy's radix sort
+        if np.any(frames[1:] < frames[:-1]):
+            order = np.argsort(frames, kind="stable")
+            frames, track_ids, positions = frames[order], track_ids[order], positions[order]
+        min_id = int(track_ids.min())
+        offset = track_ids - min_id
+        sort_keys = offset.astype(np.uint16) if offset.max() < 1 << 16 else offset
+        order = np.argsort(sort_keys, kind="stable")
+        f, t = frames[order], offset[order]
+
+        # a window's start row is followed by its end row of the same track
+        start = f[:-1]
+        pairs = np.flatnonzero(
+            (t[:-1] == t[1:]) & (start % window == 0) & (f[1:] == np.minimum(start + window, last_frame))
+        )
+        time_s = (f[pairs + 1] - f[pairs]) / self.frame_rate
+        delta = positions[order[pairs]].astype(np.float64) - positions[order[pairs + 1]]
+        distance_m = np.sqrt(delta[:, 0] * delta[:, 0] + delta[:, 1] * delta[:, 1])
+        speed_kmh = distance_m / time_s * 3.6
+
+        # cumulative distance per track, summed in window order like the loop
+        track = t[pairs]
+        total = np.empty(len(pairs))
+        bounds = np.flatnonzero(np.r_[True, track[1:] != track[:-1], True]).tolist()
+        for a, b in zip(bounds[:-1], bounds[1:]):
+            total[a:b] = np.cumsum(distance_m[a:b])
+
+        return SpeedWindows(window, num_frames, f[pairs] // window, track + min_id, speed_kmh, total)
 
-                    speed_mps = distance_m / time_s
-                    speed_kmh = speed_mps * 3.6
+    # ---------------------------------------------------------------------
+    # 1b. ONLINE (CAUSAL) UPDATE
+    # ---------------------------------------------------------------------
+    def reset(self):
+        self.boundary_positions = {}   # {track_id: position} on the last window boundary
+        self.total_distance = {}       # {track_id: cumulative_dist}
+        self.window_values = {}        # {track_id: (speed_kmh, distance_m)} of the last window
 
-                    # --- initialize dict for team type ---
-                    if object_name not in total_distance:
-                        total_distance[object_name] = {}
+    def update_speed_and_distance(self, frame_num, player_track):
+        """
+        Causal variant of add_speed_and_distance_to_tracks for live feeds:
+        takes one frame of player tracks at a time and never looks ahead.
+
+        On every window boundary (frame_num a multiple of frame_window), a
+        player with a position here and on the previous boundary gets the
+        speed of the window that just ended and its distance grows by it;
+        the values are kept on the following frames until the next
+        boundary. The windows and totals are the batch ones, each reported
+        frame_window frames later.
+        """
+        if frame_num % self.frame_window == 0:
+            positions, values = {}, {}
+            time_s = self.frame_window / self.frame_rate
 
-                    # --- initialize and update cumulative distance ---
-                    if track_id not in total_distance[object_name]:
-                        total_distance[object_name][track_id] = 0
+            for track_id, info in player_track.items():
+                position = info.get("position_transformed", None)
+                if position is None:
+                    continue
+                positions[track_id] = position
 
-                    total_distance[object_name][track_id] += distance_m
+                previous = self.boundary_positions.get(track_id)
+                if previous is None:
+                    continue
+                distance_m = measure_distance(previous, position)
+                total = self.total_distance.get(track_id, 0) + distance_m
+                self.total_distance[track_id] = total
+                values[track_id] = (distance_m / time_s * 3.6, total)
 
-                    # --- update all frames in this window ---
-                    for f in range(start_frame, end_frame + 1):
-                        if track_id not in object_tracks[f]:
-                            continue
+            self.boundary_positions = positions
+            self.window_values = values
 
-                        object_tracks[f][track_id]["speed"] = speed_kmh
-                        object_tracks[f][track_id]["distance"] = total_distance[object_name][track_id]
+        for track_id, info in player_track.items():
+            if track_id in self.window_values:
+                info["speed"], info["distance"] = self.window_values[track_id]
 
     # ---------------------------------------------------------------------
     # 2. DRAW OVERLAYS ON VIDEO
     # ---------------------------------------------------------------------
-    def draw_speed_and_distance(self, frames, tracks):
+    def draw_speed_and_distance(self, frames, tracks, start_frame=0):
         """
         Draws speed (km/h) and cumulative distance on every frame.
+        `start_frame` is the index of frames[0] in the full video.
         """
         output_frames = []
 
-        for f_idx, frame in enumerate(frames):
+        for f_idx, frame in enumerate(frames, start=start_frame):
             for object_name, obj_tracks in tracks.items():
                 if object_name in ["ball", "referees"]:
                     continue
@@ -118,10 +224,24 @@ class SpeedAndDistance_Estimator:
     # ---------------------------------------------------------------------
     # 3. EXPORT FULL PER-FRAME DATA
     # ---------------------------------------------------------------------
-    def export_full_csv(self, tracks, output_folder="output_videos"):
+    def export_full_csv(self, tracks, output_folder="output_videos", speed_windows=None):
         """
         Exports a full CSV containing all frame-by-frame statistics.
+        With `speed_windows` (players' SpeedWindows) the values are looked
+        up instead of read from the track dicts.
         """
+        if speed_windows is not None:
+            frames, track_ids, speed, distance = speed_windows.rows(tracks["players"])
+            valid = ~np.isnan(speed)
+            df = pd.DataFrame({
+                "object_type": "players",
+                "track_id": track_ids[valid],
+                "frame_num": frames[valid],
+                "speed_kmh": speed[valid],
+                "total_distance_m": distance[valid]
+            })
+            return self._write_full_csv(df, output_folder)
+
         all_rows = []
 
         for object_name, object_tracks in tracks.items():
@@ -139,11 +259,13 @@ class SpeedAndDistance_Estimator:
                             "total_distance_m": info["distance"]
                         })
 
-        if not all_rows:
+        return self._write_full_csv(pd.DataFrame(all_rows), output_folder)
+
+    def _write_full_csv(self, df, output_folder):
+        if df.empty:
             print("No speed/distance data found. CSV skipped.")
             return None
 
-        df = pd.DataFrame(all_rows)
         os.makedirs(output_folder, exist_ok=True)
         path = os.path.join(output_folder, "full_speed_distance.csv")
         df.to_csv(path, index=False)
@@ -153,13 +275,29 @@ class SpeedAndDistance_Estimator:
     # ---------------------------------------------------------------------
     # 4. EXPORT FINAL SUMMARY (ONE ROW PER PLAYER)
     # ---------------------------------------------------------------------
-    def export_summary_csv(self, tracks, output_folder="output_videos"):
+    def export_summary_csv(self, tracks, output_folder="output_videos", speed_windows=None):
         """
         Exports summary statistics for each tracked player:
             - final cumulative distance
             - average speed
             - maximum speed
+        With `speed_windows` the per-frame values are looked up instead
+        of read from the track dicts.
         """
+        if speed_windows is not None:
+            frames, track_ids, speed, distance = speed_windows.rows(tracks["players"])
+            valid = ~np.isnan(speed)
+            grouped = pd.DataFrame({
+                "track_id": track_ids[valid], "distance": distance[valid], "speed": speed[valid]
+            }).groupby("track_id", sort=False)
+            df = pd.DataFrame({
+                "object_type": "players",
+                "track_id": list(grouped.groups),
+                "final_distance_m": grouped["distance"].last().to_numpy(),
+                "avg_speed_kmh": grouped["speed"].mean().to_numpy(),
+                "max_speed_kmh": grouped["speed"].max().to_numpy()
+            })
+            return self._write_summary_csv(df, output_folder)
 
         summary = {}
 
@@ -203,7 +341,9 @@ class SpeedAndDistance_Estimator:
                 "max_speed_kmh": max(speeds) if speeds else 0
             })
 
-        df = pd.DataFrame(rows)
+        return self._write_summary_csv(pd.DataFrame(rows), output_folder)
+
+    def _write_summary_csv(self, df, output_folder):
         os.makedirs(output_folder, exist_ok=True)
         path = os.path.join(output_folder, "player_summary_stats.csv")
         df.to_csv(path, index=False)
@@ -0,0 +1,149 @@
+import operator
+from collections import deque
+from itertools import chain, compress, repeat
+
+import numpy as np
+
+# largest (track x window) grid that lookup() indexes directly
+DENSE_LOOKUP_SLOTS = 1 << 22
+
+
+class SpeedWindows:
+    """
+    Result of the windowed speed estimator for one object type: speed
+    (km/h) and cumulative distance (m) per (window, track_id), sorted by
+    track then window.
+
+    Every frame of window k = frame // frame_window shares that window's
+    values; a frame on a shared window boundary takes the previous
+    window's values when the track has none in its own window. Keeping
+    one row per window instead of writing two keys into every track dict
+    is what makes the speed stage cheap: exports expand the rows they
+    need with lookup() / rows(), the renderer looks up one frame at a time
+    with frame_values(), and apply() writes the dict keys for callers that
+    still read them from the tracks.
+    """
+
+    def __init__(self, frame_window, num_frames, window, track_id, speed, distance):
+        self.frame_window = int(frame_window)
+        self.num_frames = int(num_frames)
+        self.window = np.asarray(window, dtype=np.int64)
+        self.track_id = np.asarray(track_id, dtype=np.int64)
+        self.speed = np.asarray(speed, dtype=np.float64)
+        self.distance = np.asarray(distance, dtype=np.float64)
+
+        self.num_windows = max(-(-self.num_frames // self.frame_window), 1)
+        self.min_id = int(self.track_id.min()) if len(self.track_id) else 0
+        self.id_span = int(self.track_id.max()) - self.min_id + 1 if len(self.track_id) else 1
+        self.keys = (self.track_id - self.min_id) * self.num_windows + self.window
+        self._slots = None
+        self._speed = np.append(self.speed, np.nan)
+        self._distance = np.append(self.distance, np.nan)
+
+    def __len__(self):
+        return len(self.window)
+
+    # -----------------------------------------------------------
+    # LOOKUP
+    # -----------------------------------------------------------
+    def lookup(self, frames, track_ids):
+        """
+        (speed_kmh, distance_m) arrays for rows of (frame, track_id), NaN
+        where the estimator assigns no value.
+        """
+        frames = np.asarray(frames, dtype=np.int64)
+        track_ids = np.asarray(track_ids, dtype=np.int64)
+        window = frames // self.frame_window
+
+        speed, distance = self._find(window, track_ids)
+        fallback = np.flatnonzero(np.isnan(speed) & (frames == window * self.frame_window) & (frames > 0))
+        if len(fallback):
+            speed[fallback], distance[fallback] = self._find(window[fallback] - 1, track_ids[fallback])
+        return speed, distance
+
+    def _find(self, window, track_ids):
+        if len(self.keys) == 0 or len(window) == 0:
+            return np.full(len(window), np.nan), np.full(len(window), np.nan)
+
+        offset = track_ids - self.min_id
+        keys = offset * self.num_windows + window
+        inside = None
+        if offset.min() < 0 or offset.max() >= self.id_span:
+            inside = (offset >= 0) & (offset < self.id_span)
+            keys = np.where(inside, keys, 0)
+
+        slots = self.slots()
+        if slots is not None:
+            index = slots[keys]
+        else:
+            index = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+            index[self.keys[index] != keys] = -1
+        if inside is not None:
+            index[~inside] = -1
+
+        # index -1 picks the trailing NaN
+        return self._speed[index], self._distance[index]
+
+    def slots(self):
+        """
+        Row of every (track, window) key on a dense grid (-1 = none), so
+        lookups skip the binary search; None when the grid would be large.
+        """
+        size = self.id_span * self.num_windows
+        if self._slots is None and size <= DENSE_LOOKUP_SLOTS:
+            self._slots = np.full(size, -1, dtype=np.int32)
+            self._slots[self.keys] = np.arange(len(self.keys), dtype=np.int32)
+        return self._slots
+
+    def frame_values(self, frame_num, track_ids):
+        """
+        [(speed_kmh, distance_m) or None] for `track_ids` on one frame.
+        """
+        track_ids = list(track_ids)
+        speed, distance = self.lookup(np.full(len(track_ids), frame_num), track_ids)
+        return [
+            None if s != s else (s, d)   # NaN = no value
+            for s, d in zip(speed.tolist(), distance.tolist())
+        ]
+
+    def rows(self, object_tracks):
+        """
+        (frames, track_ids, speed, distance) for every entry of
+        object_tracks[frame][track_id], in frame then dict order.
+        """
+        lengths = np.fromiter(map(len, object_tracks), dtype=np.int64, count=len(object_tracks))
+        frames = np.repeat(np.arange(len(object_tracks)), lengths)
+        track_ids = np.fromiter(chain.from_iterable(object_tracks), dtype=np.int64, count=len(frames))
+        speed, distance = self.lookup(frames, track_ids)
+        return frames, track_ids, speed, distance
+
+    def apply(self, object_tracks):
+        """
+        Writes "speed" and "distance" into the track dicts that get a value.
+        """
+        _, _, speed, distance = self.rows(object_tracks)
+        has_value = (~np.isnan(speed)).tolist()
+        infos = list(compress(chain.from_iterable(map(dict.values, object_tracks)), has_value))
+        valid = np.flatnonzero(has_value)
+
+        # map() keeps the per-entry writes in C
+        deque(map(operator.setitem, infos, repeat("speed"), speed[valid].tolist()), maxlen=0)
+        deque(map(operator.setitem, infos, repeat("distance"), distance[valid].tolist()), maxlen=0)
+
+    # -----------------------------------------------------------
+    # CACHE ENCODING
+    # -----------------------------------------------------------
+    def to_arrays(self):
+        return {
+            "shape": np.array([self.frame_window, self.num_frames], dtype=np.int64),
+            "window": self.window,
+            "track_id": self.track_id,
+            "speed": self.speed,
+            "distance": self.distance,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        frame_window, num_frames = arrays["shape"].tolist()
+        return cls(frame_window, num_frames, arrays["window"], arrays["track_id"],
+                   arrays["speed"], arrays["distance"])
@@ -0,0 +1,2 @@
+from .stage_cache import StageCache
+from .track_codecs import encode_tracks, decode_tracks, encode_track_attributes, apply_track_attributes
\ No newline at end of file
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+
+class StageCache:
+    """
+    Content-addressed, on-disk cache for pipeline stage results.
+
+    An entry is one uncompressed .npz file under <cache_dir>/<stage>/<key>.npz.
+    Keys are hashes of everything a stage result depends on: the input
+    video / model weights (by content), the stage config including its
+    version, and the keys of the upstream stages it consumed. Changing any
+    of them gives a new key, so only the stages that are truly unchanged
+    are skipped on a rerun.
+
+    Loading an entry bumps its mtime; once the cache grows past `max_bytes`
+    the least recently used entries are evicted. Writes are atomic renames,
+    so several worker processes can share one cache directory.
+    """
+
+    def __init__(self, cache_dir="cache", max_bytes=2 * 1024**3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._file_digests = {}
+
+    # -----------------------------------------------------------
+    # KEYS
+    # -----------------------------------------------------------
+    def file_digest(self, path, block_size=1 << 20):
+        """
+        blake2b digest of a file's content, memoized on (path, size, mtime).
+        """
+        stat = os.stat(path)
+        memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        if memo_key not in self._file_digests:
+            digest = hashlib.blake2b(digest_size=20)
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(block_size), b''):
+                    digest.update(block)
+            self._file_digests[memo_key] = digest.hexdigest()
+        return self._file_digests[memo_key]
+
+    def key(self, stage, **inputs):
+        """
+        Cache key for `stage` from its inputs: file digests, upstream keys
+        and JSON-serializable config dicts.
+        """
+        payload = json.dumps({"stage": stage, "inputs": inputs}, sort_keys=True, default=_json_default)
+        return hashlib.blake2b(payload.encode(), digest_size=20).hexdigest()
+
+    # -----------------------------------------------------------
+    # ENTRIES
+    # -----------------------------------------------------------
+    def entry_path(self, stage, key):
+        return os.path.join(self.cache_dir, stage, f"{key}.npz")
+
+    def load(self, stage, key):
+        """
+        Returns the stored {name: array} dict, or None on a miss.
+        """
+        path = self.entry_path(stage, key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                arrays = {name: data[name] for name in data.files}
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # evicted by another process in the meantime
+            pass
+        return arrays
+
+    def save(self, stage, key, arrays):
+        """
+        Atomically writes an entry, then evicts old entries if over budget.
+        """
+        path = self.entry_path(stage, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+        self.evict()
+
+    def run(self, stage, key, compute, encode, decode):
+        """
+        Returns decode(cached arrays) on a hit; otherwise computes the
+        result, stores encode(result) and returns it.
+        """
+        arrays = self.load(stage, key)
+        if arrays is not None:
+            return decode(arrays)
+
+        result = compute()
+        self.save(stage, key, encode(result))
+        return result
+
+    def entries(self):
+        """
+        (mtime, size, path) of every entry, oldest first.
+        """
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+
+        for stage in os.listdir(self.cache_dir):
+            stage_dir = os.path.join(self.cache_dir, stage)
+            if not os.path.isdir(stage_dir):
+                continue
+            for name in os.listdir(stage_dir):
+                if not name.endswith(".npz"):
+                    continue
+                path = os.path.join(stage_dir, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, path))
+
+        entries.sort()
+        return entries
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """
+        Deletes least recently used entries until the cache fits in max_bytes.
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            os.remove(path)
+
+
+def _json_default(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    raise TypeError(f"Cannot use {type(value).__name__} in a stage cache key")
@@ -0,0 +1,101 @@
+import numpy as np
+
+OBJECT_NAMES = ("players", "referees", "ball")
+
+
+# -----------------------------------------------------------
+# TRACKS
+# -----------------------------------------------------------
+def encode_tracks(tracks):
+    """
+    tracks[obj][frame][track_id]["bbox"] -> flat row arrays.
+    """
+    object_class, frame, track_id, bbox = [], [], [], []
+    for class_id, object_name in enumerate(OBJECT_NAMES):
+        for frame_num, frame_tracks in enumerate(tracks[object_name]):
+            for tid, info in frame_tracks.items():
+                object_class.append(class_id)
+                frame.append(frame_num)
+                track_id.append(tid)
+                bbox.append(info["bbox"])
+
+    return {
+        "num_frames": np.array(len(tracks["players"]), dtype=np.int64),
+        "object_class": np.array(object_class, dtype=np.int8),
+        "frame": np.array(frame, dtype=np.int64),
+        "track_id": np.array(track_id, dtype=np.int64),
+        "bbox": np.array(bbox, dtype=np.float64).reshape(-1, 4),
+    }
+
+
+def decode_tracks(arrays):
+    num_frames = int(arrays["num_frames"])
+    tracks = {object_name: [{} for _ in range(num_frames)] for object_name in OBJECT_NAMES}
+
+    for class_id, frame_num, tid, bbox in zip(
+        arrays["object_class"].tolist(), arrays["frame"].tolist(),
+        arrays["track_id"].tolist(), arrays["bbox"].tolist()
+    ):
+        tracks[OBJECT_NAMES[class_id]][frame_num][tid] = {"bbox": bbox}
+
+    return tracks
+
+
+# -----------------------------------------------------------
+# PER-TRACK ATTRIBUTES
+# -----------------------------------------------------------
+def encode_track_attributes(tracks, names, object_names=OBJECT_NAMES, width=None):
+    """
+    Attributes written by one stage -> (object_class, frame, track_id) row
+    arrays plus one column per name. Rows are the track entries that have
+    names[0]; None values are stored as NaN.
+    """
+    object_class, frame, track_id = [], [], []
+    values = {name: [] for name in names}
+    missing = np.nan if width is None else (np.nan,) * width
+
+    for object_name in object_names:
+        class_id = OBJECT_NAMES.index(object_name)
+        for frame_num, frame_tracks in enumerate(tracks[object_name]):
+            for tid, info in frame_tracks.items():
+                if names[0] not in info:
+                    continue
+                object_class.append(class_id)
+                frame.append(frame_num)
+                track_id.append(tid)
+                for name in names:
+                    value = info.get(name)
+                    values[name].append(missing if value is None else value)
+
+    arrays = {
+        "object_class": np.array(object_class, dtype=np.int8),
+        "frame": np.array(frame, dtype=np.int64),
+        "track_id": np.array(track_id, dtype=np.int64),
+    }
+    for name in names:
+        column = np.array(values[name], dtype=np.float64)
+        arrays[name] = column if width is None else column.reshape(-1, width)
+    return arrays
+
+
+def apply_track_attributes(tracks, arrays, names, cast=None):
+    """
+    Writes attributes encoded by encode_track_attributes back into tracks.
+    NaN values become None; `cast` converts the others.
+    """
+    keys = list(zip(
+        arrays["object_class"].tolist(), arrays["frame"].tolist(), arrays["track_id"].tolist()
+    ))
+
+    for name in names:
+        column = arrays[name]
+        missing = np.isnan(column) if column.ndim == 1 else np.isnan(column).any(axis=1)
+
+        for (class_id, frame_num, tid), value, is_missing in zip(keys, column.tolist(), missing.tolist()):
+            info = tracks[OBJECT_NAMES[class_id]][frame_num].get(tid)
+            if info is None:
+                continue
+            if is_missing:
+                info[name] = None
+            else:
+                info[name] = cast(value) if cast is not None else value
@@ -1,51 +1,114 @@
+import numpy as np
 from sklearn.cluster import KMeans
 
 class TeamAssigner:
-    def __init__(self):
+    def __init__(self, color_iterations=10, min_team_confidence=0.2, max_team_evaluations=5):
         self.team_colors = {}
         self.player_team_dict = {}
+        self.color_iterations = color_iterations
+
+        # ids whose team is uncertain are re-evaluated on later frames until
+        # the confidence-weighted votes are clear or the evaluation budget is used
+        self.min_team_confidence = min_team_confidence
+        self.max_team_evaluations = max_team_evaluations
+        self.player_team_votes = {}
+        self.player_team_evaluations = {}
+        self.player_team_confidence = {}
+
+        self.team_overrides = {91: 1}
+
+    def cache_config(self):
+        return {
+            "version": 1,
+            "color_iterations": self.color_iterations,
+            "min_team_confidence": self.min_team_confidence,
+            "max_team_evaluations": self.max_team_evaluations,
+            "team_overrides": sorted(self.team_overrides.items()),
+        }
     
-    def get_clustering_model(self,image):
-        # Reshape the image to 2D array
-        image_2d = image.reshape(-1,3)
-
-        # Preform K-means with 2 clusters
-        kmeans = KMeans(n_clusters=2, init="k-means++",n_init=1)
-        kmeans.fit(image_2d)
-
-        return kmeans
-
     def get_player_color(self,frame,bbox):
-        image = frame[int(bbox[1]):int(bbox[3]),int(bbox[0]):int(bbox[2])]
-
-        top_half_image = image[0:int(image.shape[0]/2),:]
-
-        # Get Clustering model
-        kmeans = self.get_clustering_model(top_half_image)
-
-        # Get the cluster labels forr each pixel
-        labels = kmeans.labels_
-
-        # Reshape the labels to the image shape
-        clustered_image = labels.reshape(top_half_image.shape[0],top_half_image.shape[1])
-
-        # Get the player cluster
-        corner_clusters = [clustered_image[0,0],clustered_image[0,-1],clustered_image[-1,0],clustered_image[-1,-1]]
-        non_player_cluster = max(set(corner_clusters),key=corner_clusters.count)
+        return self.get_player_colors(frame,[bbox])[0]
+
+    def get_player_colors(self,frame,bboxes):
+        """
+        Jersey color for every bbox of a frame, shape (N,3).
+
+        Same recipe as the per-player KMeans it replaces (2 clusters on the
+        top half of the crop, the cluster holding most of the four corners is
+        background, the other one is the jersey), but all crops go through a
+        single NumPy 2-means: pixels of every crop are concatenated and the
+        per-crop centers are updated with bincount. Empty crops give NaN.
+        """
+        colors = np.full((len(bboxes),3),np.nan)
+
+        pixels, crop_ids, corners, crops = [], [], [], []
+        offset = 0
+        for i, bbox in enumerate(bboxes):
+            image = frame[int(bbox[1]):int(bbox[3]),int(bbox[0]):int(bbox[2])]
+            top_half_image = image[0:int(image.shape[0]/2),:]
+            h, w = top_half_image.shape[:2]
+            if h == 0 or w == 0:
+                continue
+
+            pixels.append(top_half_image.reshape(-1,3))
+            crop_ids.append(np.full(h*w,len(crops)))
+            corners.append([offset, offset+w-1, offset+(h-1)*w, offset+h*w-1])
+            crops.append(i)
+            offset += h*w
+
+        if not crops:
+            return colors
+
+        pixels = np.concatenate(pixels).astype(np.float64)
+        crop_ids = np.concatenate(crop_ids)
+        corners = np.array(corners)
+        num_crops = len(crops)
+
+        def crop_mean(mask):
+            counts = np.bincount(crop_ids,weights=mask,minlength=num_crops)
+            sums = np.stack([np.bincount(crop_ids,weights=pixels[:,c]*mask,minlength=num_crops) for c in range(3)],axis=1)
+            return sums, counts
+
+        # deterministic init: background seed = mean of the four corners,
+        # jersey seed = pixels farther than average from that background
+        background = pixels[corners].mean(axis=1)
+        distance_bg = ((pixels-background[crop_ids])**2).sum(axis=1)
+        _, counts = crop_mean(np.ones(len(pixels)))
+        mean_distance = np.bincount(crop_ids,weights=distance_bg,minlength=num_crops)/counts
+        labels = distance_bg > mean_distance[crop_ids]
+
+        centers = np.empty((num_crops,2,3))
+        for _ in range(self.color_iterations):
+            for cluster in (0,1):
+                sums, counts = crop_mean((labels == cluster).astype(np.float64))
+                has_pixels = counts > 0
+                centers[has_pixels,cluster] = sums[has_pixels]/counts[has_pixels,None]
+                # an empty cluster collapses onto the other one
+                if not has_pixels.all():
+                    other_sums, other_counts = crop_mean((labels != cluster).astype(np.float64))
+                    centers[~has_pixels,cluster] = other_sums[~has_pixels]/other_counts[~has_pixels,None]
+
+            distance_0 = ((pixels-centers[crop_ids,0])**2).sum(axis=1)
+            distance_1 = ((pixels-centers[crop_ids,1])**2).sum(axis=1)
+            new_labels = distance_1 < distance_0
+            if np.array_equal(new_labels,labels):
+                break
+            labels = new_labels
+
+        # background = cluster owning most corners (ties -> cluster 0, as before)
+        corner_votes = labels[corners].sum(axis=1)
+        non_player_cluster = (corner_votes > 2).astype(int)
         player_cluster = 1 - non_player_cluster
 
-        player_color = kmeans.cluster_centers_[player_cluster]
-
-        return player_color
+        colors[crops] = centers[np.arange(num_crops),player_cluster]
+        return colors
 
 
     def assign_team_color(self,frame, player_detections):
         
-        player_colors = []
-        for _, player_detection in player_detections.items():
-            bbox = player_detection["bbox"]
-            player_color =  self.get_player_color(frame,bbox)
-            player_colors.append(player_color)
+        bboxes = [player_detection["bbox"] for player_detection in player_detections.values()]
+        player_colors = self.get_player_colors(frame,bboxes)
+        player_colors = player_colors[~np.isnan(player_colors).any(axis=1)]
         
         kmeans = KMeans(n_clusters=2, init="k-means++",n_init=10)
         kmeans.fit(player_colors)
@@ -57,17 +120,50 @@ class TeamAssigner:
 
 
     def get_player_team(self,frame,player_bbox,player_id):
-        if player_id in self.player_team_dict:
-            return self.player_team_dict[player_id]
-
-        player_color = self.get_player_color(frame,player_bbox)
-
-        team_id = self.kmeans.predict(player_color.reshape(1,-1))[0]
-        team_id+=1
-
-        if player_id ==91:
-            team_id=1
-
-        self.player_team_dict[player_id] = team_id
-
-        return team_id
+        return self.get_player_teams(frame,[player_bbox],[player_id])[0]
+
+    def get_player_teams(self,frame,player_bboxes,player_ids):
+        """
+        Team (1/2) for every player of a frame, as an int array aligned with
+        player_ids; 0 when no team could be assigned yet (e.g. empty crop).
+
+        Colors are extracted and classified in one batch, only for ids that
+        are new or still below min_team_confidence. Each evaluation adds a
+        vote weighted by its margin (|d1 - d2| / (d1 + d2) to the team
+        centers), so one bad first crop does not lock in the wrong team.
+        """
+        player_ids = list(player_ids)
+
+        to_evaluate = [
+            i for i, player_id in enumerate(player_ids)
+            if player_id not in self.team_overrides and (
+                player_id not in self.player_team_dict or (
+                    self.player_team_confidence[player_id] < self.min_team_confidence
+                    and self.player_team_evaluations[player_id] < self.max_team_evaluations
+                )
+            )
+        ]
+
+        if to_evaluate:
+            colors = self.get_player_colors(frame,[player_bboxes[i] for i in to_evaluate])
+            has_color = ~np.isnan(colors).any(axis=1)
+
+            if has_color.any():
+                distances = self.kmeans.transform(colors[has_color])
+                teams = distances.argmin(axis=1)
+                margins = np.abs(distances[:,0]-distances[:,1])/np.maximum(distances.sum(axis=1),1e-9)
+
+                evaluated = [player_ids[i] for i, ok in zip(to_evaluate,has_color) if ok]
+                for player_id, team, margin in zip(evaluated,teams.tolist(),margins.tolist()):
+                    votes = self.player_team_votes.setdefault(player_id,np.zeros(2))
+                    votes[team] += margin
+                    evaluations = self.player_team_evaluations.get(player_id,0)+1
+                    self.player_team_evaluations[player_id] = evaluations
+
+                    self.player_team_dict[player_id] = int(votes.argmax())+1
+                    self.player_team_confidence[player_id] = float(abs(votes[0]-votes[1]))/evaluations
+
+        return np.array([
+            self.team_overrides.get(player_id,self.player_team_dict.get(player_id,0))
+            for player_id in player_ids
+        ],dtype=int)
@@ -0,0 +1,4 @@
+from .columnar_export import (
+    ColumnarTrackWriter, export_tracks_columnar, read_track_columns, find_columnar_tracks,
+    frame_columns, track_schema
+)
\ No newline at end of file
@@ -0,0 +1,278 @@
+import os
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pc = pq = None
+
+OBJECT_NAMES = ("players", "referees", "ball")
+COLUMNAR_FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+# 2-value track attributes, stored as <name>_x / <name>_y columns
+POINT_COLUMNS = ("position", "position_adjusted", "position_transformed")
+
+
+def track_schema():
+    """
+    One row per (frame, object, track). Missing values are nulls; the
+    per-frame possession and camera movement are repeated on every row
+    of the frame (they compress to almost nothing).
+    """
+    _require_pyarrow()
+    float32 = pa.float32()
+    fields = [
+        ("frame_num", pa.int32()),
+        ("object_type", pa.dictionary(pa.int8(), pa.string())),
+        ("track_id", pa.int32()),
+        ("bbox_x1", float32), ("bbox_y1", float32), ("bbox_x2", float32), ("bbox_y2", float32),
+    ]
+    for column in POINT_COLUMNS:
+        fields += [(f"{column}_x", float32), (f"{column}_y", float32)]
+    fields += [
+        ("speed_kmh", pa.float64()),
+        ("total_distance_m", pa.float64()),
+        ("team", pa.int8()),
+        ("has_ball", pa.bool_()),
+        ("team_in_control", pa.int8()),
+        ("camera_movement_x", float32),
+        ("camera_movement_y", float32),
+    ]
+    return pa.schema(fields)
+
+
+class ColumnarTrackWriter:
+    """
+    Streams tracks to a Parquet (or Arrow IPC) file.
+
+    write_frames() converts a range of frames to columns and appends
+    them; every `row_group_frames` frames become one row group (one
+    record batch for Arrow), so only that many frames are ever buffered.
+    The file is written under a temporary name and moved into place by
+    close(), so readers never see a partial file.
+    """
+
+    def __init__(self, path, format=None, row_group_frames=240, compression="zstd"):
+        _require_pyarrow()
+        format = format or _format_from_path(path)
+        if format not in COLUMNAR_FORMATS:
+            raise ValueError(f"Unknown columnar format '{format}', expected one of {tuple(COLUMNAR_FORMATS)}")
+
+        self.path = path
+        self.format = format
+        self.row_group_frames = row_group_frames
+        self.schema = track_schema()
+        self.tmp_path = f"{path}.tmp"
+        self.rows_written = 0
+        self._pending = []
+        self._pending_frames = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if format == "parquet":
+            self.writer = pq.ParquetWriter(self.tmp_path, self.schema, compression=compression)
+        else:
+            self._sink = pa.OSFile(self.tmp_path, "wb")
+            self.writer = pa.ipc.new_file(self._sink, self.schema)
+
+    def write_frames(self, tracks, start_frame, end_frame, camera_movement_per_frame=None, team_ball_control=None,
+                     speed_windows=None, frame_offset=0):
+        """
+        Appends frames [start_frame, end_frame) of `tracks`;
+        `camera_movement_per_frame` / `team_ball_control` are whole-video sequences.
+        Player speeds come from `speed_windows` (SpeedWindows) when given.
+        `frame_offset` is added to the written frame numbers, for callers
+        that pass a window of a longer video (e.g. one live frame at a time).
+        """
+        for chunk_start in range(start_frame, end_frame, self.row_group_frames):
+            chunk_end = min(end_frame, chunk_start + self.row_group_frames)
+            self._pending.append(frame_columns(
+                tracks, chunk_start, chunk_end, camera_movement_per_frame, team_ball_control, speed_windows,
+                frame_offset
+            ))
+            self._pending_frames += chunk_end - chunk_start
+            if self._pending_frames >= self.row_group_frames:
+                self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        batches = [pa.RecordBatch.from_pydict(columns, schema=self.schema) for columns in self._pending]
+        table = pa.Table.from_batches(batches, schema=self.schema).combine_chunks()
+        if self.format == "parquet":
+            self.writer.write_table(table, row_group_size=max(1, table.num_rows))
+        else:
+            self.writer.write_table(table)
+        self.rows_written += table.num_rows
+        self._pending, self._pending_frames = [], 0
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+        if self.format == "arrow":
+            self._sink.close()
+        os.replace(self.tmp_path, self.path)
+        return self.path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+            return
+        # leave no partial file behind
+        self.writer.close()
+        if self.format == "arrow":
+            self._sink.close()
+        os.remove(self.tmp_path)
+
+
+def frame_columns(tracks, start_frame, end_frame, camera_movement_per_frame=None, team_ball_control=None,
+                  speed_windows=None, frame_offset=0):
+    """
+    Column dict (matching track_schema()) for frames [start_frame, end_frame),
+    numbered from `frame_offset`.
+    """
+    frame_nums, object_codes, track_ids = [], [], []
+    bboxes, speeds, distances, teams, has_ball = [], [], [], [], []
+    points = {column: [] for column in POINT_COLUMNS}
+
+    for frame_num in range(start_frame, end_frame):
+        for object_code, object_name in enumerate(OBJECT_NAMES):
+            object_tracks = tracks.get(object_name, [])
+            if frame_num >= len(object_tracks):
+                continue
+            for track_id, info in object_tracks[frame_num].items():
+                frame_nums.append(frame_num)
+                object_codes.append(object_code)
+                track_ids.append(track_id)
+                bboxes.append(info["bbox"])
+                for column in POINT_COLUMNS:
+                    points[column].append(_point_or_nan(info.get(column)))
+                speeds.append(info.get("speed", np.nan))
+                distances.append(info.get("distance", np.nan))
+                teams.append(info.get("team", 0))
+                has_ball.append(info.get("has_ball", False))
+
+    frame_nums = np.array(frame_nums, dtype=np.int32)
+    bboxes = np.array(bboxes, dtype=np.float32).reshape(-1, 4)
+
+    columns = {
+        "frame_num": frame_nums,
+        "object_type": pa.DictionaryArray.from_arrays(
+            pa.array(np.array(object_codes, dtype=np.int8), type=pa.int8()), pa.array(OBJECT_NAMES)
+        ),
+        "track_id": np.array(track_ids, dtype=np.int32),
+    }
+    for i, name in enumerate(("bbox_x1", "bbox_y1", "bbox_x2", "bbox_y2")):
+        columns[name] = bboxes[:, i]
+    for column, values in points.items():
+        values = np.array(values, dtype=np.float32).reshape(-1, 2)
+        columns[f"{column}_x"] = _nullable(values[:, 0])
+        columns[f"{column}_y"] = _nullable(values[:, 1])
+
+    speeds = np.array(speeds, dtype=np.float64)
+    distances = np.array(distances, dtype=np.float64)
+    if speed_windows is not None:
+        players = np.array(object_codes, dtype=np.int8) == OBJECT_NAMES.index("players")
+        speeds[players], distances[players] = speed_windows.lookup(
+            frame_nums[players] + frame_offset, columns["track_id"][players]
+        )
+    columns["speed_kmh"] = _nullable(speeds)
+    columns["total_distance_m"] = _nullable(distances)
+    columns["team"] = np.array(teams, dtype=np.int8)
+    columns["has_ball"] = np.array(has_ball, dtype=bool)
+
+    local = frame_nums - start_frame
+    control = np.zeros(end_frame - start_frame, dtype=np.int8)
+    if team_ball_control is not None:
+        control[:] = np.asarray(team_ball_control[start_frame:end_frame], dtype=np.int8)
+    columns["team_in_control"] = control[local]
+
+    movement = np.zeros((end_frame - start_frame, 2), dtype=np.float32)
+    if camera_movement_per_frame is not None:
+        movement[:] = np.asarray(camera_movement_per_frame[start_frame:end_frame], dtype=np.float32).reshape(-1, 2)
+    columns["camera_movement_x"] = movement[local, 0]
+    columns["camera_movement_y"] = movement[local, 1]
+    if frame_offset:
+        columns["frame_num"] = frame_nums + np.int32(frame_offset)
+    return columns
+
+
+def export_tracks_columnar(tracks, path, camera_movement_per_frame=None, team_ball_control=None,
+                           row_group_frames=240, format=None, speed_windows=None):
+    """
+    Writes whole-video tracks with ColumnarTrackWriter, one row group at a time.
+    """
+    num_frames = max(len(object_tracks) for object_tracks in tracks.values())
+    with ColumnarTrackWriter(path, format=format, row_group_frames=row_group_frames) as writer:
+        writer.write_frames(tracks, 0, num_frames, camera_movement_per_frame, team_ball_control, speed_windows)
+    print(f"Columnar tracks exported: {path} ({writer.rows_written} rows)")
+    return path
+
+
+def read_track_columns(path, columns=None, object_type=None):
+    """
+    Reads a file written by ColumnarTrackWriter into a DataFrame. Only
+    `columns` are read (column projection); `object_type` keeps the rows
+    of one object type ("players", "referees" or "ball").
+    """
+    _require_pyarrow()
+    format = _format_from_path(path)
+    if format == "parquet":
+        filters = [("object_type", "=", object_type)] if object_type is not None else None
+        table = pq.read_table(path, columns=columns, filters=filters)
+    else:
+        # memory-mapped: only the projected columns are paged in, so
+        # select them (plus object_type for the filter) before filtering
+        with pa.memory_map(path) as source:
+            table = pa.ipc.open_file(source).read_all()
+            if columns is not None:
+                needed = list(columns)
+                if object_type is not None and "object_type" not in needed:
+                    needed.append("object_type")
+                table = table.select(needed)
+            if object_type is not None:
+                table = table.filter(pc.equal(table["object_type"].cast(pa.string()), object_type))
+            if columns is not None:
+                table = table.select(columns)
+            return table.to_pandas()
+    return table.to_pandas()
+
+
+def find_columnar_tracks(directory, name="tracks"):
+    """
+    Path of <directory>/<name>.parquet or .arrow, or None. If both exist
+    (from runs with different formats), the most recently written one.
+    """
+    paths = [os.path.join(directory, name + extension) for extension in COLUMNAR_FORMATS.values()]
+    paths = [path for path in paths if os.path.exists(path)]
+    if not paths:
+        return None
+    return max(paths, key=os.path.getmtime)
+
+
+def _format_from_path(path):
+    extension = os.path.splitext(path)[1].lower()
+    for format, format_extension in COLUMNAR_FORMATS.items():
+        if extension == format_extension:
+            return format
+    return "parquet"
+
+
+def _point_or_nan(point):
+    if point is None or len(point) != 2:
+        return (np.nan, np.nan)
+    return point
+
+
+def _nullable(values):
+    return pa.array(values, mask=np.isnan(values))
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("pyarrow is required for Parquet / Arrow export (pip install pyarrow)")
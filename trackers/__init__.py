@@ -1 +1,2 @@
-from .tracker import Tracker
\ No newline at end of file
+from .tracker import Tracker
+from .ball_interpolator import BallInterpolator, ball_bbox_array, ball_tracks_from_array
\ No newline at end of file
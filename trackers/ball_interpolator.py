@@ -0,0 +1,341 @@
+import numpy as np
+
+SMOOTHING_MODES = (None, "kalman", "rts")
+
+
+class BallInterpolator:
+    """
+    Fills missing ball detections with NumPy instead of a pandas round trip.
+
+    For an (N, 4) array of ball bboxes (NaN rows = not detected):
+        - outlier rejection: an isolated false detection is dropped. A
+          detection is rejected when reaching it from a neighbouring
+          detection (within max_gap + 1 frames) takes more than
+          `max_speed_px` pixels per frame while the neighbours agree with
+          each other (or, with one neighbour, that neighbour agrees with
+          the detection on its other side)
+        - gap filling: runs of missing frames are interpolated linearly
+          between detections (held constant before the first / after the
+          last one), but only when the run is at most `max_gap` frames;
+          longer runs stay empty
+        - smoothing (optional): a constant-velocity Kalman filter over the
+          ball center, run forward only ("kalman", causal) or forward and
+          back with a Rauch-Tung-Striebel pass ("rts", offline); it restarts
+          after every unfilled run and its velocity is capped at
+          `max_speed_px`. Box sizes stay linearly interpolated.
+        - confidence: 1 on detections, decaying with a half life of
+          `confidence_half_life` frames with the distance to the nearest
+          kept detection, 0 on unfilled frames
+
+    interpolate() works on a whole array at once. push() / flush() do the
+    same on a stream of frames (any chunk size, including one frame):
+    a frame is returned once 3 * (max_gap + 1) later frames have been
+    pushed, with the same result as interpolate() over the whole video.
+    Streaming needs a max_gap and does not support "rts".
+    """
+
+    def __init__(self, max_gap=48, max_speed_px=100.0, smoothing=None,
+                 measurement_std_px=2.0, acceleration_std_px=5.0, confidence_half_life=12.0):
+        if smoothing not in SMOOTHING_MODES:
+            raise ValueError(f"Unknown ball smoothing '{smoothing}', expected one of {SMOOTHING_MODES}")
+        self.max_gap = max_gap
+        self.max_speed_px = max_speed_px
+        self.smoothing = smoothing
+        self.measurement_var = measurement_std_px ** 2
+        self.acceleration_var = acceleration_std_px ** 2
+        self.confidence_half_life = confidence_half_life
+        self.reset()
+
+    # -----------------------------------------------------------
+    # TRACKS
+    # -----------------------------------------------------------
+    def interpolate_tracks(self, ball_tracks):
+        """
+        Tracker layout in and out: [{1: {"bbox": [...]}} or {}] per frame.
+        Filled frames get {1: {"bbox": [...], "confidence": c}}.
+        """
+        boxes, confidence = self.interpolate(ball_bbox_array(ball_tracks))
+        return ball_tracks_from_array(boxes, confidence)
+
+    def interpolate(self, boxes):
+        """
+        (N, 4) bboxes with NaN rows -> (filled (N, 4) bboxes, (N,) confidence).
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        rejected = self.find_outliers(boxes)
+        filled, confidence = self.fill(boxes, rejected)
+        if self.smoothing is not None:
+            filled = self.smooth(filled, confidence == 1.0, rts=self.smoothing == "rts")[0]
+        return filled, confidence
+
+    # -----------------------------------------------------------
+    # OUTLIERS
+    # -----------------------------------------------------------
+    def find_outliers(self, boxes):
+        """
+        (N,) bool, True on detections rejected as false detections.
+        """
+        rejected = np.zeros(len(boxes), dtype=bool)
+        detected = np.flatnonzero(~np.isnan(boxes).any(axis=1))
+        if self.max_speed_px is None or len(detected) < 2:
+            return rejected
+
+        centers = (boxes[detected, :2] + boxes[detected, 2:]) / 2
+        max_step = np.inf if self.max_gap is None else self.max_gap + 1
+
+        # step k: from detection k to detection k + 1
+        gaps = np.diff(detected)
+        near = gaps <= max_step
+        fast = np.linalg.norm(np.diff(centers, axis=0), axis=1) / gaps > self.max_speed_px
+        # the two detections around detection k + 1 agree
+        skip_gaps = detected[2:] - detected[:-2]
+        agree = (np.linalg.norm(centers[2:] - centers[:-2], axis=1) / skip_gaps <= self.max_speed_px) \
+            & near[:-1] & near[1:]
+        # step k is near and plausible
+        steady = near & ~fast
+
+        pad = np.zeros(1, dtype=bool)
+        near_before, near_after = np.concatenate([pad, near]), np.concatenate([near, pad])
+        fast_before, fast_after = np.concatenate([pad, fast]), np.concatenate([fast, pad])
+        agree_around = np.concatenate([pad, agree, pad])
+        # the neighbour before / after agrees with its own other neighbour
+        supported_before = np.concatenate([pad, pad, steady[:-1]])
+        supported_after = np.concatenate([steady[1:], pad, pad])
+
+        outlier = (agree_around & (fast_before | fast_after)) \
+            | (near_before & ~near_after & fast_before & supported_before) \
+            | (near_after & ~near_before & fast_after & supported_after)
+
+        rejected[detected[outlier]] = True
+        return rejected
+
+    # -----------------------------------------------------------
+    # GAP FILLING
+    # -----------------------------------------------------------
+    def fill(self, boxes, rejected, open_start=False):
+        """
+        Linear gap filling over the kept detections. With `open_start`, the
+        frames before the first detection are treated as the end of a gap
+        that started before the array (streaming windows) and stay empty.
+        """
+        n = len(boxes)
+        filled = np.full((n, 4), np.nan)
+        confidence = np.zeros(n)
+
+        kept = np.flatnonzero(~np.isnan(boxes).any(axis=1) & ~rejected)
+        if len(kept) == 0:
+            return filled, confidence
+
+        frames = np.arange(n)
+        after = np.searchsorted(kept, frames, side="left")
+        before = np.searchsorted(kept, frames, side="right") - 1
+        has_before = before >= 0
+        has_after = after < len(kept)
+        prev_frame = np.where(has_before, kept[np.maximum(before, 0)], -1)
+        next_frame = np.where(has_after, kept[np.minimum(after, len(kept) - 1)], n)
+
+        # length of the run of missing frames each frame is in
+        run = next_frame - prev_frame - 1
+        if open_start:
+            run = np.where(has_before, run, np.iinfo(np.int64).max)
+
+        max_gap = n if self.max_gap is None else self.max_gap
+        has_box = run <= max_gap
+        has_box[kept] = True
+
+        for i in range(4):
+            filled[has_box, i] = np.interp(frames[has_box], kept, boxes[kept, i])
+
+        distance = np.minimum(
+            np.where(has_before, frames - prev_frame, n),
+            np.where(has_after, next_frame - frames, n)
+        )
+        confidence[has_box] = 0.5 ** (distance[has_box] / self.confidence_half_life)
+        return filled, confidence
+
+    # -----------------------------------------------------------
+    # SMOOTHING
+    # -----------------------------------------------------------
+    def smooth(self, filled, measured, rts=False, state=None):
+        """
+        Constant-velocity Kalman filter over the centers of `filled`
+        (measurement on `measured` frames, prediction only in between).
+        Unfilled frames reset the filter; frames before its first
+        measurement keep their linear value. `state` carries the filter
+        across calls (forward mode only). Returns (boxes, state).
+
+        x and y share one 2x2 covariance (same model and noise, same
+        measurement frames), so it is kept as three scalars.
+        """
+        boxes = filled.copy()
+        centers = (filled[:, :2] + filled[:, 2:]) / 2
+        sizes = filled[:, 2:] - filled[:, :2]
+        q, r = self.acceleration_var, self.measurement_var
+
+        # state: position (2,), velocity (2,), covariance p00, p01, p11
+        position, velocity, p00, p01, p11 = state if state is not None else (None, None, 0.0, 0.0, 0.0)
+        smoothed = centers.copy()
+        history = []
+
+        for f in range(len(filled)):
+            if np.isnan(centers[f, 0]):
+                position = None
+                continue
+
+            if position is None:
+                if not measured[f]:
+                    continue
+                position, velocity = centers[f].copy(), np.zeros(2)
+                p00, p01, p11 = r, 0.0, (self.max_speed_px or 100.0) ** 2
+                prior = None
+            else:
+                # predict
+                position = position + velocity
+                p00, p01, p11 = p00 + 2 * p01 + p11 + q / 4, p01 + p11 + q / 2, p11 + q
+                prior = (position, velocity, p00, p01, p11)
+                if measured[f]:
+                    s = p00 + r
+                    k0, k1 = p00 / s, p01 / s
+                    innovation = centers[f] - position
+                    position = position + k0 * innovation
+                    velocity = velocity + k1 * innovation
+                    p00, p01, p11 = (1 - k0) * p00, (1 - k0) * p01, p11 - k1 * p01
+
+                    speed = np.hypot(*velocity)
+                    if self.max_speed_px is not None and speed > self.max_speed_px:
+                        velocity = velocity * (self.max_speed_px / speed)
+
+            smoothed[f] = position
+            if rts:
+                history.append((f, prior, (position, velocity, p00, p01, p11)))
+
+        if rts:
+            smoothed = self._rts(smoothed, history)
+
+        boxes[:, :2] = smoothed - sizes / 2
+        boxes[:, 2:] = smoothed + sizes / 2
+        return boxes, (position, velocity, p00, p01, p11)
+
+    def _rts(self, smoothed, history):
+        """
+        Rauch-Tung-Striebel backward pass over the forward filter history;
+        a step without a prior starts a new run.
+        """
+        later = None
+        for f, prior, posterior in reversed(history):
+            position, velocity, p00, p01, p11 = posterior
+            if later is not None:
+                (next_prior, next_smooth) = later
+                prior_position, prior_velocity, a00, a01, a11 = next_prior
+                s_position, s_velocity, b00, b01, b11 = next_smooth
+
+                # gain C = P F^T (prior)^-1, F = [[1, 1], [0, 1]]
+                m00, m01, m10, m11 = p00 + p01, p01, p01 + p11, p11
+                det = a00 * a11 - a01 * a01
+                i00, i01, i11 = a11 / det, -a01 / det, a00 / det
+                c00, c01 = m00 * i00 + m01 * i01, m00 * i01 + m01 * i11
+                c10, c11 = m10 * i00 + m11 * i01, m10 * i01 + m11 * i11
+
+                d_position, d_velocity = s_position - prior_position, s_velocity - prior_velocity
+                position = position + c00 * d_position + c01 * d_velocity
+                velocity = velocity + c10 * d_position + c11 * d_velocity
+
+                # P + C (P_smooth - prior) C^T
+                e00, e01, e11 = b00 - a00, b01 - a01, b11 - a11
+                p00 = p00 + c00 * c00 * e00 + 2 * c00 * c01 * e01 + c01 * c01 * e11
+                p01 = p01 + c00 * c10 * e00 + (c00 * c11 + c01 * c10) * e01 + c01 * c11 * e11
+                p11 = p11 + c10 * c10 * e00 + 2 * c10 * c11 * e01 + c11 * c11 * e11
+                smoothed[f] = position
+
+            later = ((prior, (position, velocity, p00, p01, p11)) if prior is not None else None)
+        return smoothed
+
+    # -----------------------------------------------------------
+    # STREAMING
+    # -----------------------------------------------------------
+    @property
+    def lookahead(self):
+        """
+        Frames that must follow a frame before push() returns it.
+        """
+        return 3 * (self.max_gap + 1)
+
+    def reset(self):
+        self._raw = np.empty((0, 4))
+        self._locked = np.empty(0, dtype=bool)
+        self._window_start = 0
+        self._emitted = 0
+        self._kalman_state = None
+
+    def push(self, boxes):
+        """
+        Appends the next frames' bboxes ((4,) or (K, 4), NaN = no detection)
+        and returns (first_frame, boxes, confidence) for the frames that
+        became final; the arrays may be empty.
+        """
+        if self.max_gap is None:
+            raise ValueError("Streaming ball interpolation needs a max_gap")
+        if self.smoothing == "rts":
+            raise ValueError("'rts' smoothing needs the whole video, use 'kalman' when streaming")
+
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        self._raw = np.concatenate([self._raw, boxes])
+        self._locked = np.concatenate([self._locked, np.zeros(len(boxes), dtype=bool)])
+        end = self._window_start + len(self._raw) - self.lookahead
+        return self._emit(end)
+
+    def flush(self):
+        """
+        Final frames at the end of the video; the stream is reset afterwards.
+        """
+        result = self._emit(self._window_start + len(self._raw))
+        self.reset()
+        return result
+
+    def _emit(self, end):
+        """
+        Resolves frames [self._emitted, end) on the buffered window, then
+        drops what is no longer needed as history.
+        """
+        first = self._emitted
+        if end <= first:
+            return first, np.empty((0, 4)), np.empty(0)
+
+        rejected = self.find_outliers(self._raw)
+        # earlier decisions stand: their neighbours may have left the window
+        num_decided = first - self._window_start
+        rejected[:num_decided] = self._locked[:num_decided]
+
+        filled, confidence = self.fill(self._raw, rejected, open_start=self._window_start > 0)
+        emit = slice(first - self._window_start, end - self._window_start)
+        self._locked[emit] = rejected[emit]
+
+        boxes, confidence = filled[emit], confidence[emit]
+        if self.smoothing == "kalman":
+            boxes, self._kalman_state = self.smooth(boxes, confidence == 1.0, state=self._kalman_state)
+        self._emitted = end
+
+        # keep `lookahead` emitted frames as context for the next window
+        drop = max(0, end - self.lookahead - self._window_start)
+        self._raw, self._locked = self._raw[drop:], self._locked[drop:]
+        self._window_start += drop
+        return first, boxes, confidence
+
+
+def ball_bbox_array(ball_tracks):
+    """
+    (N, 4) float array of the ball bbox per frame, NaN rows where missing.
+    """
+    boxes = np.full((len(ball_tracks), 4), np.nan)
+    for frame_num, ball in enumerate(ball_tracks):
+        bbox = ball.get(1, {}).get("bbox")
+        if bbox is not None and len(bbox) == 4:
+            boxes[frame_num] = bbox
+    return boxes
+
+
+def ball_tracks_from_array(boxes, confidence):
+    return [
+        {1: {"bbox": bbox, "confidence": conf}} if conf > 0 else {}
+        for bbox, conf in zip(boxes.tolist(), confidence.tolist())
+    ]
@@ -0,0 +1,104 @@
+import math
+
+import cv2
+import numpy as np
+import torch
+
+# YOLO feature maps are strided by 32, so network inputs must be multiples of it
+STRIDE = 32
+LETTERBOX_FILL = 114
+
+
+class DetectionInputBuffer:
+    """
+    Preallocated YOLO input for one detection batch.
+
+    Frames are resized (aspect ratio kept) into a reused uint8 NHWC buffer
+    and copied into a reused float32 NCHW tensor in [0, 1], RGB order, which
+    ultralytics accepts as-is. `imgsz` is the network input width (rounded
+    up to a multiple of 32); the height follows the frame's aspect ratio
+    and the bottom padding keeps the usual letterbox gray. Boxes predicted on the tensor map back to frame pixels
+    by dividing by `scale`.
+    """
+
+    def __init__(self, batch_size, frame_shape, imgsz):
+        self.target_imgsz = imgsz
+        self.resized_height, self.height, self.width = _input_shape(frame_shape, imgsz)
+        self.scale = self.width / frame_shape[1]
+
+        self.batch_size = batch_size
+        self.frame_shape = tuple(frame_shape[:2])
+        self.images = np.full((batch_size, self.height, self.width, 3), LETTERBOX_FILL, dtype=np.uint8)
+        self.tensor = torch.empty((batch_size, 3, self.height, self.width), dtype=torch.float32)
+        self._resized = np.empty((self.resized_height, self.width, 3), dtype=np.uint8)
+
+    @property
+    def imgsz(self):
+        return (self.height, self.width)
+
+    @property
+    def nbytes(self):
+        return self.images.nbytes + self.tensor.element_size() * self.tensor.nelement()
+
+    def fill(self, frames):
+        """
+        Loads up to batch_size frames; returns a view of the input tensor
+        for exactly len(frames) images.
+        """
+        n = len(frames)
+        if n > self.batch_size:
+            raise ValueError(f"Batch of {n} frames does not fit a buffer of {self.batch_size}")
+
+        for i, frame in enumerate(frames):
+            if frame.shape[:2] != self.frame_shape:
+                raise ValueError(f"Frame shape {frame.shape[:2]} differs from buffer shape {self.frame_shape}")
+            cv2.resize(frame, (self.width, self.resized_height), dst=self._resized, interpolation=cv2.INTER_AREA)
+            cv2.cvtColor(self._resized, cv2.COLOR_BGR2RGB, dst=self.images[i, :self.resized_height])
+
+        tensor = self.tensor[:n]
+        tensor.copy_(torch.from_numpy(self.images[:n]).permute(0, 3, 1, 2))
+        tensor.div_(255.0)
+        return tensor
+
+    def rescale_results(self, results):
+        """
+        Maps predicted boxes from network input pixels back to frame pixels, in place.
+        """
+        for result in results:
+            result.boxes.data[:, :4] /= self.scale
+            result.orig_shape = self.frame_shape
+            result.boxes.orig_shape = self.frame_shape
+        return results
+
+
+def input_bytes_per_frame(frame_shape, imgsz):
+    """
+    Bytes of preallocated input (uint8 image + float32 tensor) per frame.
+    """
+    _, height, width = _input_shape(frame_shape, imgsz)
+    return height * width * 3 * (1 + 4)
+
+
+def batch_size_for_budget(frame_shape, imgsz, memory_budget_mb, activation_factor=30, max_batch_size=64):
+    """
+    Largest batch whose inputs plus estimated activations fit the budget.
+    `activation_factor` is the peak inference memory per input-tensor byte;
+    about 30 covers YOLOv5/v8 s-m models on CPU and can be measured per model.
+    """
+    _, height, width = _input_shape(frame_shape, imgsz)
+    per_frame = input_bytes_per_frame(frame_shape, imgsz) + activation_factor * height * width * 3 * 4
+    batch_size = int(memory_budget_mb * 1024**2 // per_frame)
+    return max(1, min(batch_size, max_batch_size))
+
+
+def _input_shape(frame_shape, imgsz):
+    """
+    (resized height, padded height, width) of the network input for a frame.
+    """
+    width = _round_up(imgsz, STRIDE)
+    resized_height = max(1, round(frame_shape[0] * width / frame_shape[1]))
+    return resized_height, _round_up(resized_height, STRIDE), width
+
+
+def _round_up(value, multiple):
+    return int(math.ceil(value / multiple) * multiple)
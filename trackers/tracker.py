@@ -6,15 +6,73 @@ import numpy as np
 import pandas as pd
 import cv2
 import sys
+import time
 
 sys.path.append('../')
-from utils import get_center_of_bbox, get_bbox_width, get_foot_position
+from utils import get_center_of_bbox, get_foot_position, get_ball_control_series
+from annotation_renderer.annotation_renderer import draw_ellipse, draw_triangle
+from .detection_input import DetectionInputBuffer, batch_size_for_budget
+from .ball_interpolator import BallInterpolator
+
+# ByteTrack's default: frames a lost track is kept before it is removed
+LOST_TRACK_BUFFER = 30
 
 
 class Tracker:
-    def __init__(self, model_path):
+    """
+    YOLO detection + ByteTrack tracking.
+
+    By default frames go to model.predict at full resolution in batches of
+    `detection_batch_size`. With `detection_imgsz` set, frames are instead
+    downscaled to that input width into a preallocated tensor (see
+    DetectionInputBuffer), which is much cheaper on CPU. With
+    `memory_budget_mb` set, the batch size is derived from the budget.
+    `detection_fps` reports the measured detection throughput, and
+    autotune_detection() picks an input size for a target frame rate.
+
+    With `keyframe_interval` set, YOLO + ByteTrack only run on keyframes
+    (every `keyframe_interval` frames, or sooner once the camera has moved
+    `keyframe_camera_threshold` pixels); boxes in between are propagated
+    (see update_object_tracks). ByteTrack counts its lost-track buffer in
+    updates, so it is scaled by 1 / keyframe_interval to keep covering
+    about the same stretch of video.
+
+    Missing ball frames are filled by `ball_interpolator` (a
+    BallInterpolator: gap limit, outlier rejection, optional smoothing).
+    """
+    def __init__(self, model_path, detection_imgsz=None, detection_batch_size=20, memory_budget_mb=None,
+                 keyframe_interval=None, keyframe_camera_threshold=20.0, ball_interpolator=None):
         self.model = YOLO(model_path)
-        self.tracker = sv.ByteTrack()
+        self.lost_track_buffer = LOST_TRACK_BUFFER
+        if keyframe_interval:
+            self.lost_track_buffer = max(1, round(LOST_TRACK_BUFFER / keyframe_interval))
+        self.tracker = sv.ByteTrack(lost_track_buffer=self.lost_track_buffer)
+        self.detection_conf = 0.1
+
+        self.detection_imgsz = detection_imgsz
+        self.detection_batch_size = detection_batch_size
+        self.memory_budget_mb = memory_budget_mb
+        self.input_buffer = None
+        self.reset_detection_stats()
+
+        self.keyframe_interval = keyframe_interval
+        self.keyframe_camera_threshold = keyframe_camera_threshold
+        self.keyframe_state = None
+
+        self.ball_interpolator = ball_interpolator or BallInterpolator()
+
+    def cache_config(self):
+        """
+        Everything besides the video and weights that changes the tracks.
+        """
+        return {
+            "version": 2,
+            "detection_conf": self.detection_conf,
+            "detection_imgsz": self.detection_imgsz,
+            "keyframe_interval": self.keyframe_interval,
+            "keyframe_camera_threshold": self.keyframe_camera_threshold,
+            "lost_track_buffer": self.lost_track_buffer,
+        }
 
     # -----------------------------------------------------------
     # POSITION ASSIGNMENT
@@ -35,23 +93,98 @@ class Tracker:
     # BALL INTERPOLATION
     # -----------------------------------------------------------
     def interpolate_ball_positions(self, ball_tracks):
-        ball_positions = [x.get(1, {}).get('bbox', []) for x in ball_tracks]
-        df = pd.DataFrame(ball_positions, columns=['x1', 'y1', 'x2', 'y2'])
-
-        df = df.interpolate().bfill()
-        ball_positions = [{1: {"bbox": row}} for row in df.to_numpy().tolist()]
-        return ball_positions
+        """
+        Fills missing ball frames (see BallInterpolator); frames in gaps
+        longer than its max_gap stay empty, and every filled frame has a
+        "confidence".
+        """
+        return self.ball_interpolator.interpolate_tracks(ball_tracks)
 
     # -----------------------------------------------------------
     # BATCH FRAME DETECTION
     # -----------------------------------------------------------
-    def detect_frames(self, frames, batch_size=20):
+    def detect_frames(self, frames, batch_size=None):
+        if len(frames) == 0:
+            return []
+        batch_size = batch_size or self.get_detection_batch_size(frames[0].shape)
+
+        started = time.perf_counter()
         detections = []
         for i in range(0, len(frames), batch_size):
-            batch = self.model.predict(frames[i:i + batch_size], conf=0.1)
-            detections += batch
+            batch = frames[i:i + batch_size]
+            if self.detection_imgsz is None:
+                detections += self.model.predict(batch, conf=self.detection_conf)
+            else:
+                detections += self.predict_downscaled(batch)
+
+        self.detection_frames += len(frames)
+        self.detection_seconds += time.perf_counter() - started
         return detections
 
+    def predict_downscaled(self, frames):
+        """
+        model.predict on frames resized to detection_imgsz; boxes are
+        returned in full-frame pixels.
+        """
+        buffer = self.input_buffer
+        if buffer is None or buffer.frame_shape != frames[0].shape[:2] or buffer.batch_size < len(frames) \
+                or buffer.target_imgsz != self.detection_imgsz:
+            buffer = self.input_buffer = DetectionInputBuffer(
+                max(len(frames), self.get_detection_batch_size(frames[0].shape)),
+                frames[0].shape, self.detection_imgsz
+            )
+
+        tensor = buffer.fill(frames)
+        results = self.model.predict(tensor, conf=self.detection_conf, imgsz=buffer.imgsz, verbose=False)
+        return buffer.rescale_results(results)
+
+    def get_detection_batch_size(self, frame_shape):
+        if self.memory_budget_mb is None:
+            return self.detection_batch_size
+        # ultralytics letterboxes full-resolution input to 640
+        return batch_size_for_budget(frame_shape, self.detection_imgsz or 640, self.memory_budget_mb)
+
+    # -----------------------------------------------------------
+    # DETECTION THROUGHPUT
+    # -----------------------------------------------------------
+    @property
+    def detection_fps(self):
+        return self.detection_frames / self.detection_seconds if self.detection_seconds else 0.0
+
+    def reset_detection_stats(self):
+        self.detection_frames = 0
+        self.detection_seconds = 0.0
+
+    def autotune_detection(self, sample_frames, imgsz_candidates=(1280, 960, 640, 480), target_fps=None):
+        """
+        Measures detection fps on `sample_frames` for each input width and
+        keeps the largest one that reaches `target_fps` (the fastest one if
+        none does, the largest one if no target is given). A warm-up batch
+        runs first so model initialization is not timed.
+        Returns {imgsz: fps}.
+        """
+        measured = {}
+        for imgsz in sorted(imgsz_candidates, reverse=True):
+            self.detection_imgsz = imgsz
+            self.input_buffer = None
+            self.detect_frames(sample_frames[:1])
+
+            self.reset_detection_stats()
+            self.detect_frames(sample_frames)
+            measured[imgsz] = self.detection_fps
+            print(f"Detection at imgsz={imgsz}: {measured[imgsz]:.1f} fps")
+
+        if target_fps is None:
+            chosen = max(measured)
+        else:
+            fast_enough = [imgsz for imgsz, fps in measured.items() if fps >= target_fps]
+            chosen = max(fast_enough) if fast_enough else max(measured, key=measured.get)
+
+        self.detection_imgsz = chosen
+        self.input_buffer = None
+        self.reset_detection_stats()
+        return measured
+
     # -----------------------------------------------------------
     # BUILD TRACK DICTIONARY
     # -----------------------------------------------------------
@@ -61,15 +194,143 @@ class Tracker:
             with open(stub_path, 'rb') as f:
                 return pickle.load(f)
 
-        detections = self.detect_frames(frames)
-
         tracks = {
             "players": [],
             "referees": [],
             "ball": []
         }
+        self.update_object_tracks(frames, tracks)
+
+        # save stub
+        if stub_path:
+            with open(stub_path, 'wb') as f:
+                pickle.dump(tracks, f)
+
+        return tracks
+
+    # -----------------------------------------------------------
+    # INCREMENTAL (CHUNKED) TRACKING
+    # -----------------------------------------------------------
+    def get_tracking_state(self):
+        """
+        ByteTrack + keyframe state after the last chunk (picklable), for checkpoints.
+        """
+        return {"byte_track": self.tracker, "keyframes": self.keyframe_state}
 
-        for frame_num, det in enumerate(detections):
+    def set_tracking_state(self, state):
+        self.tracker = state["byte_track"]
+        self.keyframe_state = state["keyframes"]
+
+    def update_object_tracks(self, frames, tracks, camera_movement=None):
+        """
+        Detects and tracks a chunk of consecutive frames and appends the
+        per-frame results to `tracks`. ByteTrack state is kept on the
+        instance, so ids stay consistent across successive chunks.
+        `camera_movement` (one [x, y] per frame of the chunk) is only used
+        in keyframe mode.
+        """
+        if self.keyframe_interval is not None:
+            return self.track_keyframes(frames, tracks, camera_movement)
+        return self.track_detections(self.detect_frames(frames), tracks)
+
+    # -----------------------------------------------------------
+    # KEYFRAME TRACKING
+    # -----------------------------------------------------------
+    def plan_keyframes(self, camera_movement):
+        """
+        Marks which frames of a chunk are keyframes. Returns one
+        (is_keyframe, frames_since_previous_keyframe) per frame and advances
+        the keyframe counters.
+        """
+        state = self.keyframe_state
+        if state is None:
+            state = self.keyframe_state = {
+                "frames_since_keyframe": None,
+                "camera_since_keyframe": np.zeros(2),
+                "boxes": {},
+                "velocities": {},
+            }
+
+        plan = []
+        for movement in camera_movement:
+            since = state["frames_since_keyframe"]
+            camera = state["camera_since_keyframe"] + np.asarray(movement, dtype=np.float64)
+
+            is_keyframe = since is None or since + 1 >= self.keyframe_interval \
+                or np.hypot(*camera) >= self.keyframe_camera_threshold
+            plan.append((is_keyframe, 0 if since is None else since + 1))
+
+            if is_keyframe:
+                state["frames_since_keyframe"] = 0
+                state["camera_since_keyframe"] = np.zeros(2)
+            else:
+                state["frames_since_keyframe"] = since + 1
+                state["camera_since_keyframe"] = camera
+
+        return plan
+
+    def track_keyframes(self, frames, tracks, camera_movement=None):
+        """
+        Keyframe mode of update_object_tracks. Keyframes are detected in one
+        batch and fed to ByteTrack, so track ids are ByteTrack's. On the
+        frames in between, player / referee boxes follow a constant-velocity
+        model in image space: each track moves by its displacement between
+        its last two keyframes per frame. Camera motion only forces earlier
+        keyframes; the per-frame camera estimates are too coarse to shift
+        boxes with directly. The ball is only detected on keyframes; the
+        gaps are filled by interpolate_ball_positions.
+        """
+        if camera_movement is None:
+            camera_movement = [[0, 0]] * len(frames)
+        plan = self.plan_keyframes(camera_movement)
+        state = self.keyframe_state
+
+        detections = iter(self.detect_frames([
+            frame for frame, (is_keyframe, _) in zip(frames, plan) if is_keyframe
+        ]))
+
+        for is_keyframe, since in plan:
+            if is_keyframe:
+                self.track_detections([next(detections)], tracks)
+                self.update_keyframe_motion(tracks, since)
+                continue
+
+            for object_name in ("players", "referees"):
+                shifted = {}
+                for track_id, box in state["boxes"][object_name].items():
+                    velocity = state["velocities"][object_name].get(track_id, np.zeros(2))
+                    offset = velocity * since
+                    shifted[track_id] = {"bbox": (box + np.tile(offset, 2)).tolist()}
+                tracks[object_name].append(shifted)
+            tracks["ball"].append({})
+
+        return tracks
+
+    def update_keyframe_motion(self, tracks, frames_since_keyframe):
+        """
+        Stores the boxes of the keyframe just tracked and updates per-track
+        velocities (pixels / frame) from the previous keyframe.
+        """
+        state = self.keyframe_state
+        for object_name in ("players", "referees"):
+            previous = state["boxes"].get(object_name, {})
+            boxes, velocities = {}, {}
+            for track_id, info in tracks[object_name][-1].items():
+                box = np.asarray(info["bbox"], dtype=np.float64)
+                boxes[track_id] = box
+                if track_id in previous and frames_since_keyframe > 0:
+                    displacement = (box[:2] + box[2:]) / 2 - (previous[track_id][:2] + previous[track_id][2:]) / 2
+                    velocities[track_id] = displacement / frames_since_keyframe
+            state["boxes"][object_name] = boxes
+            state["velocities"][object_name] = velocities
+
+    def track_detections(self, detections, tracks):
+        """
+        ByteTrack update for already computed YOLO detections (one per
+        frame, in order); appends the per-frame results to `tracks`.
+        """
+        for det in detections:
+            frame_num = len(tracks["players"])
 
             # convert YOLO detection → Supervision object
             detection_sup = sv.Detections.from_ultralytics(det)
@@ -107,94 +368,34 @@ class Tracker:
                 if cls_id == cls_inv['ball']:
                     tracks["ball"][frame_num][1] = {"bbox": bbox}
 
-        # save stub
-        if stub_path:
-            with open(stub_path, 'wb') as f:
-                pickle.dump(tracks, f)
-
         return tracks
 
     # -----------------------------------------------------------
     # DRAW ELLIPSE FOR PLAYER
     # -----------------------------------------------------------
     def draw_ellipse(self, frame, bbox, color, track_id=None):
-        y2 = int(bbox[3])
-        x_center, _ = get_center_of_bbox(bbox)
-        width = get_bbox_width(bbox)
-
-        cv2.ellipse(
-            frame,
-            center=(x_center, y2),
-            axes=(int(width), int(0.35 * width)),
-            angle=0.0,
-            startAngle=-45,
-            endAngle=235,
-            color=color,
-            thickness=2,
-            lineType=cv2.LINE_4
-        )
-
-        # ID rectangle
-        if track_id is not None:
-            w, h = 40, 20
-            x1 = x_center - w // 2
-            y1 = y2 + 15 - h // 2
-            x2 = x_center + w // 2
-            y2_ = y2 + 15 + h // 2
-
-            cv2.rectangle(frame, (x1, y1), (x2, y2_), color, cv2.FILLED)
-
-            cv2.putText(
-                frame,
-                f"{track_id}",
-                (x1 + 12, y1 + 15),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                0.6,
-                (0, 0, 0),
-                2
-            )
-        return frame
+        return draw_ellipse(frame, bbox, color, track_id)
 
     # -----------------------------------------------------------
     # DRAW TRIANGLE (BALL / PLAYER POSSESSION)
     # -----------------------------------------------------------
     def draw_triangle(self, frame, bbox, color):
-        y = int(bbox[1])
-        x, _ = get_center_of_bbox(bbox)
-
-        pts = np.array([
-            [x, y],
-            [x - 10, y - 20],
-            [x + 10, y - 20]
-        ])
-
-        cv2.drawContours(frame, [pts], 0, color, cv2.FILLED)
-        cv2.drawContours(frame, [pts], 0, (0, 0, 0), 2)
-        return frame
+        return draw_triangle(frame, bbox, color)
 
     # -----------------------------------------------------------
     # SAFE TEAM CONTROL DRAW
     # -----------------------------------------------------------
-    def draw_team_ball_control(self, frame, frame_num, team_control):
+    def draw_team_ball_control(self, frame, frame_num, ball_control):
         """
-        SAFE VERSION — Prevents ZeroDivisionError when no team touched the ball.
+        Draws possession percentages for frame_num from the precomputed
+        series returned by utils.get_ball_control_series (no per-frame rescan).
         """
         overlay = frame.copy()
         cv2.rectangle(overlay, (1350, 850), (1900, 970), (255, 255, 255), -1)
         cv2.addWeighted(overlay, 0.4, frame, 0.6, 0, frame)
 
-        control_up_to_now = team_control[:frame_num + 1]
-
-        t1 = (control_up_to_now == 1).sum()
-        t2 = (control_up_to_now == 2).sum()
-
-        total = t1 + t2
-
-        if total == 0:
-            pct1 = pct2 = 0.0
-        else:
-            pct1 = t1 / total
-            pct2 = t2 / total
+        pct1 = ball_control["team1_ball_control"].iat[frame_num]
+        pct2 = ball_control["team2_ball_control"].iat[frame_num]
 
         cv2.putText(frame,
                     f"Team 1 Ball Control: {pct1*100:.1f}%",
@@ -217,10 +418,18 @@ class Tracker:
     # -----------------------------------------------------------
     # MAIN DRAW FUNCTION
     # -----------------------------------------------------------
-    def draw_annotations(self, video_frames, tracks, team_control):
+    def draw_annotations(self, video_frames, tracks, team_control, start_frame=0):
+        """
+        `start_frame` is the index of video_frames[0] in the full video,
+        so a chunk of frames can be annotated against whole-video tracks.
+        `team_control` is the raw per-frame team array or the series from
+        utils.get_ball_control_series.
+        """
         out_frames = []
+        ball_control = team_control if isinstance(team_control, pd.DataFrame) \
+            else get_ball_control_series(team_control)
 
-        for fnum, frame in enumerate(video_frames):
+        for fnum, frame in enumerate(video_frames, start=start_frame):
             frame = frame.copy()
 
             players = tracks["players"][fnum]
@@ -245,7 +454,7 @@ class Tracker:
                 frame = self.draw_triangle(frame, info["bbox"], (0, 255, 0))
 
             # safe draw
-            frame = self.draw_team_ball_control(frame, fnum, team_control)
+            frame = self.draw_team_ball_control(frame, fnum, ball_control)
 
             out_frames.append(frame)
 
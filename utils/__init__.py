@@ -1,2 +1,5 @@
-from .video_utils import read_video, save_video
+from .video_utils import read_video, save_video, iter_video_frames, iter_video_chunks, read_first_frame, get_video_fps, VideoStreamWriter, concat_videos
+from .video_writer import FFmpegPipeWriter, ThreadedVideoWriter, open_video_writer, video_extension
+from .frame_store import FrameStore
 from .bbox_utils import get_center_of_bbox, get_bbox_width, measure_distance,measure_xy_distance,get_foot_position
+from .ball_control_utils import get_ball_control_series, export_ball_control_csv
\ No newline at end of file
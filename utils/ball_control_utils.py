@@ -0,0 +1,41 @@
+import os
+import numpy as np
+import pandas as pd
+
+
+def get_ball_control_series(team_ball_control):
+    """
+    Per-frame possession time series built from cumulative counts in one pass.
+
+    team_ball_control[i] is the team (1/2, 0 = nobody yet) in control at frame i.
+    Columns:
+        - frame_num, team_in_control
+        - team1_frames, team2_frames: frames controlled up to and including frame_num
+        - team1_ball_control, team2_ball_control: share of controlled frames (0-1)
+    """
+    team_ball_control = np.asarray(team_ball_control)
+
+    team1_frames = np.cumsum(team_ball_control == 1)
+    team2_frames = np.cumsum(team_ball_control == 2)
+    total = team1_frames + team2_frames
+    safe_total = np.maximum(total, 1)
+
+    return pd.DataFrame({
+        "frame_num": np.arange(len(team_ball_control)),
+        "team_in_control": team_ball_control,
+        "team1_frames": team1_frames,
+        "team2_frames": team2_frames,
+        "team1_ball_control": np.where(total > 0, team1_frames / safe_total, 0.0),
+        "team2_ball_control": np.where(total > 0, team2_frames / safe_total, 0.0),
+    })
+
+
+def export_ball_control_csv(ball_control, output_folder="output_videos"):
+    """
+    Exports the per-frame possession series from get_ball_control_series().
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    path = os.path.join(output_folder, "team_ball_control.csv")
+    ball_control.to_csv(path, index=False)
+    print(f"Ball control CSV exported: {path}")
+    return path
@@ -0,0 +1,195 @@
+import hashlib
+import json
+import os
+
+import cv2
+import numpy as np
+
+from .video_utils import iter_video_frames, get_video_fps
+
+FRAME_STORE_VERSION = 1
+
+
+class FrameStore:
+    """
+    Decoded frames of a video in a raw, memory-mapped file.
+
+    Indexing gives zero-copy ndarray views into the map (a slice gives a
+    list of views), and len() / iteration work as on the list of frames
+    read_video() returns, so a store can be passed wherever a stage takes
+    `video_frames`. Pages are loaded by the OS on first access and stay in
+    its page cache, so repeated passes (team colors, rendering) do not
+    decode or copy again and the video never has to fit in RAM. The map is
+    read-only; draw on copies.
+
+    A store is a directory with frames.raw (N x H x W x C uint8) and
+    frames.json (shape, fps, source video); from_video() can also write a
+    grayscale companion at `companion_scale` (gray.raw / gray.json), e.g.
+    for optical flow, which is then available as `companion`.
+    """
+
+    def __init__(self, directory, name="frames"):
+        self.directory = directory
+        self.name = name
+        with open(os.path.join(directory, f"{name}.json")) as f:
+            self.meta = json.load(f)
+
+        self.fps = self.meta["fps"]
+        self.scale = self.meta["scale"]
+        self.shape = tuple(self.meta["shape"])
+        self.frames = np.memmap(os.path.join(directory, f"{name}.raw"), dtype=np.uint8, mode="r", shape=self.shape) \
+            if self.shape[0] else np.empty(self.shape, dtype=np.uint8)
+
+        self.companion = None
+        companion_name = self.meta.get("companion")
+        if companion_name is not None:
+            self.companion = FrameStore(directory, companion_name)
+
+    # -----------------------------------------------------------
+    # FRAME ACCESS
+    # -----------------------------------------------------------
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.frames[i] for i in range(*index.indices(len(self)))]
+        return self.frames[index]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.frames[i]
+
+    def chunks(self, chunk_size, start_frame=0):
+        """
+        Lists of at most `chunk_size` consecutive frame views, like iter_video_chunks().
+        """
+        for start in range(start_frame, len(self), chunk_size):
+            yield self[start:start + chunk_size]
+
+    def close(self):
+        """
+        Drops the maps (views handed out keep theirs alive).
+        """
+        self.frames = None
+        if self.companion is not None:
+            self.companion.close()
+
+    # -----------------------------------------------------------
+    # BUILD
+    # -----------------------------------------------------------
+    @classmethod
+    def from_video(cls, video_path, store_root="frame_store", color=True, companion_scale=None, rebuild=False):
+        """
+        Store for `video_path` under `store_root`, decoding the video only
+        if no store for the same file (path, size, mtime) and options
+        exists yet. `color=False` keeps only the grayscale companion
+        (then required) as the main frames.
+        """
+        if not color and companion_scale is None:
+            raise ValueError("A FrameStore without color frames needs a companion_scale")
+
+        directory = store_directory(video_path, store_root)
+        options = {"color": color, "companion_scale": companion_scale}
+        source = source_signature(video_path)
+
+        main_name = "frames" if color else "gray"
+        header_path = os.path.join(directory, f"{main_name}.json")
+        if not rebuild and os.path.exists(header_path):
+            with open(header_path) as f:
+                meta = json.load(f)
+            if meta.get("version") == FRAME_STORE_VERSION and meta.get("source") == source \
+                    and meta.get("options") == options:
+                return cls(directory, main_name)
+
+        cls.build(video_path, directory, color=color, companion_scale=companion_scale)
+        return cls(directory, main_name)
+
+    @staticmethod
+    def build(video_path, directory, color=True, companion_scale=None):
+        """
+        Decodes the video once, writing every frame (and its companion)
+        to temporary files that are moved into place at the end; the
+        headers are written last, so an interrupted build is never reused.
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name in ("frames", "gray"):
+            header_path = os.path.join(directory, f"{name}.json")
+            if os.path.exists(header_path):
+                os.remove(header_path)
+
+        outputs = {}
+        if color:
+            outputs["frames"] = None
+        if companion_scale is not None:
+            outputs["gray"] = None
+
+        files = {name: open(os.path.join(directory, f"{name}.raw.tmp"), "wb") for name in outputs}
+        num_frames = 0
+        try:
+            for frame in iter_video_frames(video_path):
+                if "frames" in files:
+                    files["frames"].write(np.ascontiguousarray(frame).data)
+                    outputs["frames"] = frame.shape
+                if "gray" in files:
+                    gray = companion_image(frame, companion_scale)
+                    files["gray"].write(np.ascontiguousarray(gray).data)
+                    outputs["gray"] = gray.shape
+                num_frames += 1
+        finally:
+            for f in files.values():
+                f.close()
+
+        for name in files:
+            os.replace(os.path.join(directory, f"{name}.raw.tmp"), os.path.join(directory, f"{name}.raw"))
+
+        fps = get_video_fps(video_path)
+        meta = {
+            "version": FRAME_STORE_VERSION,
+            "source": source_signature(video_path),
+            "options": {"color": color, "companion_scale": companion_scale},
+            "fps": fps,
+        }
+        # companion header first: the main header is the commit point
+        if "gray" in outputs:
+            shape = outputs["gray"] or (0, 0)
+            _write_header(directory, "gray", dict(meta, shape=[num_frames, *shape], scale=companion_scale))
+        if color:
+            shape = outputs["frames"] or (0, 0, 3)
+            _write_header(directory, "frames", dict(
+                meta, shape=[num_frames, *shape], scale=1.0,
+                companion="gray" if companion_scale is not None else None
+            ))
+        return directory
+
+
+def companion_image(frame, scale):
+    """
+    Grayscale frame downscaled by `scale`, as CameraMovementEstimator
+    expects it at flow_scale == scale.
+    """
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    if scale == 1:
+        return gray
+    return cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+
+def source_signature(video_path):
+    stat = os.stat(video_path)
+    return {"path": os.path.abspath(video_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def store_directory(video_path, store_root="frame_store"):
+    """
+    <store_root>/<video name>-<hash of its absolute path>.
+    """
+    stem = os.path.splitext(os.path.basename(video_path))[0]
+    digest = hashlib.sha1(os.path.abspath(video_path).encode()).hexdigest()[:10]
+    return os.path.join(store_root, f"{stem}-{digest}")
+
+
+def _write_header(directory, name, meta):
+    tmp_path = os.path.join(directory, f"{name}.json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, os.path.join(directory, f"{name}.json"))
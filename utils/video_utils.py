@@ -1,3 +1,8 @@
+import os
+import shutil
+import subprocess
+import tempfile
+
 import cv2
 
 def read_video(video_path):
@@ -10,9 +15,123 @@ def read_video(video_path):
         frames.append(frame)
     return frames
 
-def save_video(ouput_video_frames,output_video_path):
-    fourcc = cv2.VideoWriter_fourcc(*'XVID')
-    out = cv2.VideoWriter(output_video_path, fourcc, 24, (ouput_video_frames[0].shape[1], ouput_video_frames[0].shape[0]))
-    for frame in ouput_video_frames:
-        out.write(frame)
-    out.release()
+def iter_video_frames(video_path, start_frame=0, num_frames=None):
+    """
+    Yields decoded BGR frames one at a time instead of holding the whole video in memory.
+    Frames before `start_frame` are skipped with grab() (decoded, never converted),
+    which stays frame-accurate where container seeking is not; at most
+    `num_frames` frames are yielded.
+    """
+    cap = cv2.VideoCapture(video_path)
+    try:
+        for _ in range(start_frame):
+            if not cap.grab():
+                return
+        yielded = 0
+        while num_frames is None or yielded < num_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yielded += 1
+            yield frame
+    finally:
+        cap.release()
+
+def read_first_frame(video_path):
+    """
+    First frame of the video, or None if nothing can be decoded.
+    """
+    cap = cv2.VideoCapture(video_path)
+    ret, frame = cap.read()
+    cap.release()
+    return frame if ret else None
+
+def iter_video_chunks(video_path, chunk_size, start_frame=0):
+    """
+    Yields lists of at most `chunk_size` consecutive frames, starting at `start_frame`.
+    Peak memory is bounded by the chunk size, not by the video length.
+    """
+    chunk = []
+    for frame in iter_video_frames(video_path, start_frame=start_frame):
+        chunk.append(frame)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def get_video_fps(video_path, default_fps=24):
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+    return fps if fps and fps > 0 else default_fps
+
+class VideoStreamWriter:
+    """
+    Writes frames to disk as they are produced.
+    The underlying cv2.VideoWriter is opened lazily from the first frame's size.
+    """
+    def __init__(self, output_video_path, fps=24, fourcc='XVID'):
+        self.output_video_path = output_video_path
+        self.fps = fps
+        self.fourcc = fourcc
+        self.writer = None
+
+    def write(self, frame):
+        if self.writer is None:
+            self.writer = cv2.VideoWriter(
+                self.output_video_path,
+                cv2.VideoWriter_fourcc(*self.fourcc),
+                self.fps,
+                (frame.shape[1], frame.shape[0])
+            )
+            if not self.writer.isOpened():
+                self.writer = None
+                raise RuntimeError(f"OpenCV cannot write {self.output_video_path} with codec {self.fourcc}")
+        self.writer.write(frame)
+
+    def write_frames(self, frames):
+        for frame in frames:
+            self.write(frame)
+
+    def release(self):
+        if self.writer is not None:
+            self.writer.release()
+            self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+def save_video(ouput_video_frames,output_video_path,fps=24,fourcc='XVID'):
+    with VideoStreamWriter(output_video_path, fps=fps, fourcc=fourcc) as out:
+        out.write_frames(ouput_video_frames)
+
+
+def concat_videos(video_paths, output_video_path, fps=24, fourcc='XVID'):
+    """
+    Joins video segments into one file. Uses the ffmpeg concat demuxer
+    (stream copy, no re-encode) when ffmpeg is on PATH, otherwise decodes
+    and re-encodes the segments with OpenCV.
+    """
+    if shutil.which("ffmpeg"):
+        fd, list_path = tempfile.mkstemp(suffix=".txt")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                for path in video_paths:
+                    escaped = os.path.abspath(path).replace("'", "'\\''")
+                    f.write(f"file '{escaped}'\n")
+            subprocess.run(
+                ["ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
+                 "-i", list_path, "-c", "copy", output_video_path],
+                check=True
+            )
+        finally:
+            os.remove(list_path)
+        return
+
+    with VideoStreamWriter(output_video_path, fps=fps, fourcc=fourcc) as out:
+        for path in video_paths:
+            out.write_frames(iter_video_frames(path))
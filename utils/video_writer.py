@@ -0,0 +1,226 @@
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+
+import numpy as np
+
+from .video_utils import VideoStreamWriter
+
+# OpenCV fourcc -> container it is written into
+OPENCV_CODECS = {
+    "XVID": ".avi",
+    "MJPG": ".avi",
+    "mp4v": ".mp4",
+}
+
+# ffmpeg encoder -> (container, pixel format, encoder options)
+FFMPEG_CODECS = {
+    "libx264": (".mp4", "yuv420p", ("-preset", "veryfast", "-crf", "23")),
+    "h264_nvenc": (".mp4", "yuv420p", ("-preset", "p4")),
+    "mpeg4": (".mp4", "yuv420p", ("-q:v", "5")),
+    "mjpeg": (".avi", "yuvj420p", ("-q:v", "3")),
+}
+
+VIDEO_BACKENDS = ("opencv", "ffmpeg")
+
+_END = object()
+
+
+class FFmpegPipeWriter:
+    """
+    Same interface as VideoStreamWriter, but raw BGR frames are piped to
+    a local ffmpeg process that does the encoding (any encoder ffmpeg
+    has, e.g. libx264 or a hardware encoder such as h264_nvenc).
+    The process is started lazily from the first frame's size.
+    """
+
+    def __init__(self, output_video_path, fps=24, codec="libx264", pix_fmt=None, codec_args=None):
+        if shutil.which("ffmpeg") is None:
+            raise RuntimeError("ffmpeg was not found on PATH")
+
+        _, default_pix_fmt, default_args = FFMPEG_CODECS.get(codec, (None, "yuv420p", ()))
+        self.output_video_path = output_video_path
+        self.fps = fps
+        self.codec = codec
+        self.pix_fmt = pix_fmt or default_pix_fmt
+        self.codec_args = tuple(default_args if codec_args is None else codec_args)
+        self.process = None
+
+    def command(self, width, height):
+        return [
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", str(self.fps), "-i", "-",
+            "-an", "-c:v", self.codec, *self.codec_args, "-pix_fmt", self.pix_fmt,
+            self.output_video_path,
+        ]
+
+    def write(self, frame):
+        if self.process is None:
+            self.process = subprocess.Popen(
+                self.command(frame.shape[1], frame.shape[0]),
+                stdin=subprocess.PIPE, stderr=subprocess.PIPE
+            )
+        try:
+            self.process.stdin.write(np.ascontiguousarray(frame, dtype=np.uint8).data)
+        except BrokenPipeError:
+            self._wait()
+            raise RuntimeError(f"ffmpeg exited before all frames of {self.output_video_path} were written")
+
+    def write_frames(self, frames):
+        for frame in frames:
+            self.write(frame)
+
+    def release(self):
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        self._wait()
+
+    def _wait(self):
+        process, self.process = self.process, None
+        stderr = process.stderr.read().decode(errors="replace")
+        process.stderr.close()
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed writing {self.output_video_path}: {stderr.strip()}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class ThreadedVideoWriter:
+    """
+    Runs a writer's encoding on a background thread.
+
+    write() only queues the frame; a full queue (`queue_size` frames)
+    blocks the caller, so memory stays bounded and a slow encoder slows
+    the producer down instead of piling up frames. Frames must not be
+    modified after they are written. An encoder error is re-raised from
+    the next write() or from release().
+
+    encode_seconds is the time the thread spent encoding and
+    blocked_seconds the time callers waited on a full queue;
+    `on_encoded(seconds)` is called from the thread after every frame.
+    """
+
+    def __init__(self, writer, queue_size=32, on_encoded=None):
+        self.writer = writer
+        self.on_encoded = on_encoded
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.error = None
+        self.frames_written = 0
+        self.encode_seconds = 0.0
+        self.blocked_seconds = 0.0
+        self.closed = False
+
+        self.thread = threading.Thread(target=self._run, name="video-writer", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            frame = self.queue.get()
+            if frame is _END:
+                return
+            started = time.perf_counter()
+            try:
+                self.writer.write(frame)
+            except BaseException as e:
+                self.error = e
+                return
+            elapsed = time.perf_counter() - started
+            self.encode_seconds += elapsed
+            self.frames_written += 1
+            if self.on_encoded is not None:
+                self.on_encoded(elapsed)
+
+    def _put(self, item):
+        waited = time.perf_counter()
+        try:
+            while True:
+                if self.error is not None:
+                    raise self.error
+                if not self.thread.is_alive():
+                    raise RuntimeError("Video writer thread is not running")
+                try:
+                    self.queue.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+        finally:
+            self.blocked_seconds += time.perf_counter() - waited
+
+    def write(self, frame):
+        if self.closed:
+            raise ValueError("write() on a released ThreadedVideoWriter")
+        self._put(frame)
+
+    def write_frames(self, frames):
+        for frame in frames:
+            self.write(frame)
+
+    def release(self):
+        """
+        Waits for the queued frames to be encoded, then closes the file.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if self.error is None and self.thread.is_alive():
+                self._put(_END)
+            self.thread.join()
+        finally:
+            self.writer.release()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+def video_extension(codec=None, backend="opencv"):
+    """
+    Container extension for a codec, e.g. ".mp4" for mp4v; ".avi" by default.
+    """
+    if backend == "ffmpeg":
+        return FFMPEG_CODECS.get(codec or "libx264", (".mp4",))[0]
+    return OPENCV_CODECS.get(codec or "XVID", ".avi")
+
+
+def open_video_writer(output_video_path, fps=24, codec=None, backend="opencv", threaded=True, queue_size=32,
+                      on_encoded=None):
+    """
+    Writer for `output_video_path`, encoding on a background thread unless
+    `threaded` is False.
+
+    backend="opencv" uses cv2.VideoWriter with a fourcc (XVID, MJPG,
+    mp4v, ...); backend="ffmpeg" pipes frames to ffmpeg with an encoder
+    name (libx264, mpeg4, mjpeg, h264_nvenc, ...). Without a codec, the
+    default for the file's container is used. `on_encoded` is passed to
+    ThreadedVideoWriter.
+    """
+    if backend not in VIDEO_BACKENDS:
+        raise ValueError(f"Unknown video backend '{backend}', expected one of {VIDEO_BACKENDS}")
+
+    extension = os.path.splitext(output_video_path)[1].lower()
+    if backend == "ffmpeg":
+        codec = codec or ("mjpeg" if extension == ".avi" else "libx264")
+        writer = FFmpegPipeWriter(output_video_path, fps=fps, codec=codec)
+    else:
+        codec = codec or ("mp4v" if extension == ".mp4" else "XVID")
+        writer = VideoStreamWriter(output_video_path, fps=fps, fourcc=codec)
+
+    if not threaded:
+        return writer
+    return ThreadedVideoWriter(writer, queue_size=queue_size, on_encoded=on_encoded)
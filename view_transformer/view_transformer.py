@@ -23,6 +23,13 @@ class ViewTransformer():
 
         self.persepctive_trasnformer = cv2.getPerspectiveTransform(self.pixel_vertices, self.target_vertices)
 
+    def cache_config(self):
+        return {
+            "version": 1,
+            "pixel_vertices": self.pixel_vertices,
+            "target_vertices": self.target_vertices,
+        }
+
     def transform_point(self,point):
         p = (int(point[0]),int(point[1]))
         is_inside = cv2.pointPolygonTest(self.pixel_vertices,p,False) >= 0 
@@ -33,13 +40,67 @@ class ViewTransformer():
         tranform_point = cv2.perspectiveTransform(reshaped_point,self.persepctive_trasnformer)
         return tranform_point.reshape(-1,2)
 
+    def points_inside_polygon(self,points):
+        """
+        Vectorized cv2.pointPolygonTest(..., False) >= 0 for an (N,2) array.
+        Points are truncated to int like transform_point does; points on an
+        edge count as inside. NaN points are outside.
+        """
+        points = np.asarray(points,dtype=np.float64).reshape(-1,2)
+        valid = ~np.isnan(points).any(axis=1)
+        px = np.trunc(np.where(valid,points[:,0],0))[:,None]
+        py = np.trunc(np.where(valid,points[:,1],0))[:,None]
+
+        xi = self.pixel_vertices[:,0].astype(np.float64)[None,:]
+        yi = self.pixel_vertices[:,1].astype(np.float64)[None,:]
+        xj = np.roll(xi,-1,axis=1)
+        yj = np.roll(yi,-1,axis=1)
+
+        # on an edge: collinear with the segment and inside its bounding box
+        cross = (xj-xi)*(py-yi) - (yj-yi)*(px-xi)
+        on_edge = (cross == 0) \
+            & (px >= np.minimum(xi,xj)) & (px <= np.maximum(xi,xj)) \
+            & (py >= np.minimum(yi,yj)) & (py <= np.maximum(yi,yj))
+
+        # even-odd ray casting
+        straddles = (yi > py) != (yj > py)
+        with np.errstate(divide='ignore',invalid='ignore'):
+            x_cross = (xj-xi)*(py-yi)/(yj-yi) + xi
+        crossings = (straddles & (px < x_cross)).sum(axis=1)
+
+        return valid & ((crossings % 2 == 1) | on_edge.any(axis=1))
+
+    def transform_points(self,points):
+        """
+        Batch version of transform_point for an (N,2) array of positions.
+
+        Returns (transformed, is_valid): transformed is an (N,2) float32 array
+        with NaN rows where is_valid is False (point outside the court polygon).
+        """
+        is_valid = self.points_inside_polygon(points)
+        points = np.asarray(points,dtype=np.float32).reshape(-1,2)
+
+        transformed = np.full(points.shape,np.nan,dtype=np.float32)
+        if is_valid.any():
+            valid_points = points[is_valid].reshape(-1,1,2)
+            transformed[is_valid] = cv2.perspectiveTransform(valid_points,self.persepctive_trasnformer).reshape(-1,2)
+
+        return transformed, is_valid
+
     def add_transformed_position_to_tracks(self,tracks):
+        track_infos = []
+        positions = []
         for object, object_tracks in tracks.items():
             for frame_num, track in enumerate(object_tracks):
                 for track_id, track_info in track.items():
-                    position = track_info['position_adjusted']
-                    position = np.array(position)
-                    position_trasnformed = self.transform_point(position)
-                    if position_trasnformed is not None:
-                        position_trasnformed = position_trasnformed.squeeze().tolist()
-                    tracks[object][frame_num][track_id]['position_transformed'] = position_trasnformed
\ No newline at end of file
+                    track_infos.append(track_info)
+                    positions.append(track_info['position_adjusted'])
+
+        if not track_infos:
+            return
+
+        transformed, is_valid = self.transform_points(np.array(positions,dtype=np.float64))
+        transformed = transformed.tolist()
+
+        for track_info, position_transformed, valid in zip(track_infos,transformed,is_valid):
+            track_info['position_transformed'] = position_transformed if valid else None